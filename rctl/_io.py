@@ -1,29 +1,27 @@
 import json
 
-try:
-    import yaml
-except Exception:
-    ...
-
-try:
-    import hcl2
-except Exception:
-    ...
+# yaml, hcl2 はインポートが重いので、読み込む時にインポートする
 
 
 def from_json(path: str):
+    import yaml
+
     with open(path) as f:
         data = yaml.safe_load(f)
     return data
 
 
 def from_yml(path: str):
+    import yaml
+
     with open(path) as f:
         data = yaml.safe_load(f)
     return data
 
 
 def from_hcl(path: str):
+    import hcl2
+
     with open(path) as f:
         data = hcl2.load(f)
     return data
@@ -1,5 +1,9 @@
 def version():
-    from importlib.metadata import version
+    from importlib.metadata import PackageNotFoundError, version
 
     assert __package__ == "rctl"
-    return version(__package__)
+    try:
+        return version(__package__)
+    except PackageNotFoundError:
+        # インストールせずにソースツリーから実行している
+        return "0.0.0+unknown"
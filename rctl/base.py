@@ -29,12 +29,28 @@ class HasOperator:
 
 
 class Operator(HasOperator):
+    # True の場合、エンジンは同じコネクタ・状態の連続するステップを execute_batch にまとめて渡す
+    supports_batch = False
+
     def to_executor(self):
         return Executable(self)
 
+    def execute_batch(
+        self, state: str, params_list: list[dict]
+    ) -> list[tuple[bool, str]]:
+        """複数のステップを適用し、ステップごとの結果を返す（既定では一つずつ実行する）"""
+        return [execute(self, state, params) for params in params_list]
+
     def get_default_wait_time(self):
         return 0
 
+    def get_waiter(self, state: str):
+        """状態への遷移を待つ関数 (params を受け取り (ok, msg) を返す) を返す
+
+        None の場合、エンジンは wait_time 秒待ってから確認する。
+        """
+        return None
+
     def create(self, **kwargs) -> tuple[bool, str]:
         return False, ERROR_NOT_SUPPORT
 
@@ -60,7 +76,7 @@ class ResourceController:
         if ok:
             return
         ok, err = yield self._resource.create
-        sleep(self._wait_time)
+        ok, err = yield from self.wait("created")
         ok, err = yield self._resource.exists
 
     def deleted(self, **kwargs):
@@ -68,9 +84,17 @@ class ResourceController:
         if ok:
             return
         ok, err = yield self._resource.delete
-        sleep(self._wait_time)
+        ok, err = yield from self.wait("deleted")
         ok, err = yield self._resource.absent
 
+    def wait(self, state: str):
+        # オペレーターに待ち方（waiter）があればそれを使い、無ければ一定時間待つ
+        waiter = self._resource.get_waiter(state)
+        if waiter is None:
+            sleep(self._wait_time)
+            return None, ""
+        return (yield waiter)
+
     def exists(self, **kwargs):
         ok, err = yield self._resource.exists
 
@@ -1,8 +1,20 @@
-import yaml
-
-from .base import HasOperator, Operator, StepData, execute
+from .base import HasOperator, Operator, StepData, execute, hook
+from .connectors import make_key
 from .registry import _registry
 
+# リソースを識別するパラメーター（内容を表すパラメーターはロックのキーに含めない）
+IDENTITY_PARAMS = (
+    "bucket",
+    "bucket_name",
+    "path",
+    "key",
+    "schema",
+    "schemas",
+    "table",
+    "kind",
+    "name",
+)
+
 
 class StepDataExtension:
     def __init__(self, step: StepData):
@@ -15,6 +27,8 @@ class StepDataExtension:
 
     @classmethod
     def _load_from_stream(cls, stream):
+        import yaml
+
         data = yaml.safe_load(stream)
 
         if not isinstance(data, dict):
@@ -49,21 +63,82 @@ class StepDataExtension:
         new_value = {**self._step, "state": state}
         return self.__class__(new_value)
 
-    def apply(self, massage: str = " must be {state} but: {str(err)}"):
+    def get_operator_cls(self):
         step = self._step
-        state = step["state"]
-        connector = step.get("connector", {})
         step["module"] = Module.validate(step["module"])
 
         res_cls: HasOperator = _registry.get_cls(step["module"]["type"])
         if not res_cls:
             raise RuntimeError()
 
-        operator_cls = res_cls.get_operator(step["module"]["subtype"])
-        operator: Operator = operator_cls(**connector)
+        return res_cls.get_operator(step["module"]["subtype"])
+
+    def get_operator(self) -> Operator:
+        return self.get_operator_cls()(**self._step.get("connector", {}))
+
+    def batch_key(self):
+        """まとめて適用できるステップは同じキーを返す（できない場合は None）"""
+        if not getattr(self.get_operator_cls(), "supports_batch", False):
+            return None
+
+        step = self._step
+        module = step["module"]
+        return (
+            module["type"],
+            module["subtype"],
+            make_key(**step.get("connector", {})),
+            step["state"],
+        )
+
+    def resource_key(self) -> str:
+        """操作するリソースを識別するキー（対象が同じステップは同じキーを返す）
+
+        識別するパラメーターが無いモジュールでは、パラメーター全体で識別する。
+        """
+        step = self._step
+        module = Module.validate(step["module"])
+        params = module["params"]
+        identity = {x: params[x] for x in IDENTITY_PARAMS if x in params} or params
+        return make_key(
+            module["type"],
+            module["subtype"],
+            make_key(**step.get("connector", {})),
+            **identity,
+        )
+
+    def apply(self, massage: str = " must be {state} but: {str(err)}"):
+        step = self._step
+        state = step["state"]
+        operator = self.get_operator()
         executor = CliExecutor()
         return executor.execute(operator, state, step["module"]["params"])
 
+    @classmethod
+    def apply_batch(
+        cls,
+        steps: list["StepDataExtension"],
+        massage: str = " must be {state} but: {err}",
+    ):
+        """batch_key が同じステップをオペレーターに一度に渡して適用する"""
+        if len(steps) == 1:
+            return steps[0].apply()
+
+        operator = steps[0].get_operator()
+        state = steps[0]._step["state"]
+        results = operator.execute_batch(
+            state, [x._step["module"]["params"] for x in steps]
+        )
+
+        errors = []
+        for step, (ok, msg) in zip(steps, results):
+            step_id = step._step.get("id", "")
+            hook(1, operator.execute_batch, ok, f"{step_id}: {msg}")
+            if not ok:
+                errors.append(f"{step_id}: {msg}")
+
+        if errors:
+            raise Exception(massage.format(state=state, err="\n".join(errors)))
+
 
 class Module:
     @classmethod
@@ -0,0 +1,145 @@
+"""疑似オペレーター (synthetic) のステップでエンジンのスループットと遅延を測る
+
+実行方法（serial / thread）と並列数ごとに、N 個のステップを適用して
+steps/s と、ステップごとの所要時間の p50/p95/p99 を出す。
+"""
+
+import os
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from time import monotonic
+
+from .base2 import StepDataExtension
+from .connectors import run_scope
+
+EXECUTORS = ("serial", "thread")
+
+
+def parse_latency(text: str):
+    """ "fixed:0.01" / "normal:0.01,0.002" / "longtail:0.01,1.5" を分布の辞書にする"""
+    dist, _, args = text.partition(":")
+    if not args:
+        # 秒数だけなら固定
+        return {"dist": "fixed", "mean": float(dist)}
+
+    values = [float(x) for x in args.split(",")]
+    spec = {"dist": dist, "mean": values[0]}
+    if dist == "normal" and len(values) > 1:
+        spec["stddev"] = values[1]
+    elif dist == "longtail" and len(values) > 1:
+        spec["alpha"] = values[1]
+    return spec
+
+
+def parse_per_method(items: list[str], parse=str):
+    """ "create=値" または "値"（全メソッド共通）のリストをメソッドごとの辞書にする"""
+    result = {}
+    for item in items:
+        method, sep, value = item.rpartition("=")
+        result[method if sep else "default"] = parse(value)
+    return result or None
+
+
+def make_steps(
+    count: int,
+    latency=None,
+    failure_rate=None,
+    seed: int = None,
+    state: str = "created",
+):
+    connector = {"latency": latency, "failure_rate": failure_rate, "seed": seed}
+    return [
+        StepDataExtension.from_dict(
+            {
+                "id": f"bench-{i}",
+                "state": state,
+                "connector": connector,
+                "module": {"type": "synthetic", "params": {"name": f"bench-{i}"}},
+            }
+        )
+        for i in range(count)
+    ]
+
+
+def timed_apply(step: StepDataExtension):
+    """ステップを適用し (成功したか, 所要時間) を返す"""
+    start = monotonic()
+    try:
+        step.apply()
+        ok = True
+    except Exception:
+        ok = False
+    return ok, monotonic() - start
+
+
+def run(steps: list[StepDataExtension], executor: str = "serial", concurrency=1):
+    if executor not in EXECUTORS:
+        raise ValueError(f"executor must be one of {EXECUTORS}: {executor}")
+
+    # 実行ログの出力は測定から外す
+    with run_scope(), open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        start = monotonic()
+        if executor == "serial":
+            results = [timed_apply(x) for x in steps]
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                results = list(pool.map(timed_apply, steps))
+        elapsed = monotonic() - start
+
+    return summarize(results, elapsed, executor, concurrency)
+
+
+def summarize(results, elapsed: float, executor: str = "", concurrency: int = 1):
+    latencies = sorted(x[1] for x in results)
+    return {
+        "executor": executor,
+        "concurrency": concurrency,
+        "steps": len(results),
+        "failed": sum(1 for ok, _ in results if not ok),
+        "elapsed": elapsed,
+        "throughput": len(results) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+
+def percentile(latencies: list[float], p: int) -> float:
+    if not latencies:
+        return 0.0
+    if len(latencies) == 1:
+        return latencies[0]
+    return statistics.quantiles(latencies, n=100, method="inclusive")[p - 1]
+
+
+def bench(
+    steps: int = 1000,
+    executors: list[str] = EXECUTORS,
+    concurrency: list[int] = (1, 8, 32),
+    latency=None,
+    failure_rate=None,
+    seed: int = None,
+):
+    """実行方法と並列数の組み合わせごとに測定した結果を返す（serial は並列数 1 のみ）"""
+    reports = []
+    for executor in executors:
+        for n in [1] if executor == "serial" else concurrency:
+            reports.append(
+                run(make_steps(steps, latency, failure_rate, seed), executor, n)
+            )
+    return reports
+
+
+def show_reports(reports: list[dict]):
+    print(
+        f"{'executor':<8} {'conc':>5} {'steps':>7} {'failed':>6} {'elapsed':>8}"
+        f" {'steps/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    for r in reports:
+        print(
+            f"{r['executor']:<8} {r['concurrency']:>5} {r['steps']:>7}"
+            f" {r['failed']:>6} {r['elapsed']:>8.2f} {r['throughput']:>9.1f}"
+            f" {r['p50'] * 1000:>8.1f} {r['p95'] * 1000:>8.1f}"
+            f" {r['p99'] * 1000:>8.1f}"
+        )
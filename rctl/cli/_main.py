@@ -1,14 +1,24 @@
 import typer
 
-from rctl.api import version as _get_version
+from .core import lazy_group
 
-from . import resource
+app = typer.Typer(
+    no_args_is_help=True,
+    cls=lazy_group(
+        resource="rctl.cli.resource:app",
+        bench="rctl.cli.bench:app",
+    ),
+)
 
-app = typer.Typer(no_args_is_help=True)
-app.add_typer(resource.app, name="resource")
+
+@app.callback()
+def main():
+    """rctl"""
 
 
 @app.command(no_args_is_help=False)
 def version():
+    from rctl.api import version as _get_version
+
     v = _get_version()
     print(v)
@@ -0,0 +1,30 @@
+from .core import AppTyper
+
+app = AppTyper()
+
+
+@app.command(no_args_is_help=False)
+def bench(
+    steps: int = 1000,
+    executor: list[str] = ["serial", "thread"],
+    concurrency: list[int] = [1, 8, 32],
+    latency: list[str] = ["fixed:0.01"],
+    failure_rate: list[str] = [],
+    seed: int = None,
+):
+    """疑似オペレーターのステップを適用し、スループットと p50/p95/p99 を表示する
+
+    --latency は fixed:SEC | normal:MEAN,STDDEV | longtail:MEAN,ALPHA、
+    --failure-rate は RATE で、METHOD=値 とするとメソッドごとに指定できる（複数指定可）。
+    """
+    from rctl.bench import bench, parse_latency, parse_per_method, show_reports
+
+    reports = bench(
+        steps,
+        executors=executor,
+        concurrency=concurrency,
+        latency=parse_per_method(latency, parse_latency),
+        failure_rate=parse_per_method(failure_rate, float),
+        seed=seed,
+    )
+    show_reports(reports)
@@ -1,6 +1,7 @@
 from typing import TYPE_CHECKING
 
 import typer
+from typer.core import TyperGroup
 
 if TYPE_CHECKING:
     AppTyper = typer.Typer
@@ -12,3 +13,33 @@ else:
 
         def command(self, name=None, no_args_is_help: bool = True, **kwargs):
             return super().command(name, no_args_is_help=no_args_is_help, **kwargs)
+
+
+class LazyTyperGroup(TyperGroup):
+    """サブコマンドを実行（またはヘルプ表示）する時に初めてインポートするグループ
+
+    lazy_subcommands にはサブコマンド名と "module:attr" 形式の Typer アプリのパスを指定する。
+    """
+
+    lazy_subcommands: dict[str, str] = {}
+
+    def list_commands(self, ctx):
+        commands = super().list_commands(ctx)
+        return commands + [x for x in self.lazy_subcommands if x not in commands]
+
+    def get_command(self, ctx, cmd_name: str):
+        if cmd_name in self.lazy_subcommands and cmd_name not in self.commands:
+            self.add_command(self._load(cmd_name), cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def _load(self, cmd_name: str):
+        from rctl.registry import load_object
+
+        sub_app: typer.Typer = load_object(self.lazy_subcommands[cmd_name])
+        command = typer.main.get_command(sub_app)
+        command.name = cmd_name
+        return command
+
+
+def lazy_group(**subcommands: str) -> type[LazyTyperGroup]:
+    return type("LazyTyperGroup", (LazyTyperGroup,), {"lazy_subcommands": subcommands})
@@ -3,9 +3,11 @@ from rctl.core import (
     apply_resource,
     create_resource,
     delete_resource,
+    enqueue_resource,
     exists_resource,
     recreate_resource,
     scan_resource,
+    work_resource,
 )
 
 from .core import AppTyper
@@ -20,3 +22,5 @@ app.command("absent")(absent_resource)
 app.command("delete")(delete_resource)
 app.command("recreate")(recreate_resource)
 app.command("scan")(scan_resource)
+app.command("enqueue")(enqueue_resource)
+app.command("work", no_args_is_help=False)(work_resource)
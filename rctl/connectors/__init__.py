@@ -0,0 +1,11 @@
+from ._boto3 import clients, get_client, lease_client, sessions
+from ._cache import ConnectorCache, close_all, make_key, run_scope
+from ._fsspec import DirListing, filesystems, lease_url, listings, open_url
+from ._psycopg import (
+    DEFAULT_ASYNC_POOL_SIZE,
+    async_pools,
+    get_async_pool,
+    lease_async_pool,
+    run_async,
+)
+from ._psycopg2 import DEFAULT_POOL_SIZE, ConnectionPool, connect, pools
@@ -0,0 +1,71 @@
+import threading
+from contextlib import contextmanager
+
+from ._cache import ConnectorCache
+
+# boto3.client の引数のうち、セッション（認証情報の解決と更新）に渡すもの
+SESSION_KEYS = (
+    "aws_access_key_id",
+    "aws_secret_access_key",
+    "aws_session_token",
+    "region_name",
+    "profile_name",
+)
+
+
+def split_kwargs(kwargs: dict):
+    """boto3.client の引数をセッションの引数とクライアントの引数に分ける"""
+    session_kwargs = {k: v for k, v in kwargs.items() if k in SESSION_KEYS}
+    client_kwargs = {k: v for k, v in kwargs.items() if k not in SESSION_KEYS}
+    return session_kwargs, client_kwargs
+
+
+def open_session(**session_kwargs):
+    import boto3.session
+
+    return boto3.session.Session(**session_kwargs)
+
+
+def open_client(**kwargs):
+    """キャッシュしたセッションからクライアントを作る
+
+    認証情報の更新（AssumeRole など）はセッションの認証情報が行うので、
+    同じセッションのクライアントを使い続けてよい。
+    """
+    session_kwargs, client_kwargs = split_kwargs(kwargs)
+    config = client_kwargs.get("config", None)
+    if isinstance(config, dict):
+        from botocore.config import Config
+
+        client_kwargs["config"] = Config(**config)
+
+    session = sessions.get(**session_kwargs)
+    # Session.client はスレッドセーフでないので、同時に生成しない
+    with _client_lock:
+        return session.client(**client_kwargs)
+
+
+def close_client(client):
+    # 古い botocore のクライアントには close が無い
+    close = getattr(client, "close", None)
+    if close:
+        close()
+
+
+_client_lock = threading.Lock()
+
+# プロセス全体で共有する
+sessions = ConnectorCache(open_session)
+clients = ConnectorCache(open_client, close=close_client)
+
+
+def get_client(**kwargs):
+    """boto3.client(**kwargs) と同じクライアントを、接続情報ごとに一つだけ作って返す"""
+    return clients.get(**kwargs)
+
+
+@contextmanager
+def lease_client(**kwargs):
+    """get_client と同じクライアントを、転送など長い操作の間破棄されないように借りる"""
+    with clients.lease(**kwargs) as client:
+        yield client
@@ -0,0 +1,161 @@
+import atexit
+import json
+import threading
+import weakref
+from contextlib import contextmanager
+from time import monotonic
+from typing import Any, Callable, Hashable
+
+_caches: "weakref.WeakSet[ConnectorCache]" = weakref.WeakSet()
+
+
+def make_key(*args, **kwargs) -> Hashable:
+    """接続情報を正規化してキーにする（キーワード引数の順序に依存しない）"""
+    return json.dumps([args, kwargs], sort_keys=True, default=repr)
+
+
+class _Entry:
+    __slots__ = ("value", "last_used", "refs", "ready", "error")
+
+    def __init__(self):
+        self.value = None
+        self.last_used = monotonic()
+        self.refs = 0
+        self.ready = threading.Event()
+        self.error: BaseException | None = None
+
+
+class ConnectorCache:
+    """接続情報をキーにインスタンス（ファイルシステム、コネクションプールなど）を共有する
+
+    スレッドセーフで、同じキーのインスタンスは一度だけ生成する。生成はロックの外で行うので、
+    時間のかかる接続が他のキーの取得を待たせない（同じキーの取得は生成を待つ）。
+    idle_timeout 秒使われていないインスタンスは次に取得する時に破棄 (close) する。
+    lease で借りている間は破棄しない。
+    """
+
+    def __init__(
+        self,
+        factory: Callable[..., Any],
+        close: Callable[[Any], None] | None = None,
+        idle_timeout: float | None = 300,
+    ):
+        self._factory = factory
+        self._close = close
+        self._idle_timeout = idle_timeout
+        self._entries: dict[Hashable, _Entry] = {}
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, *args, **kwargs):
+        """インスタンスを返す。長い操作の間使い続ける場合は、破棄されないよう lease を使う"""
+        return self._acquire(args, kwargs, 0).value
+
+    @contextmanager
+    def lease(self, *args, **kwargs):
+        entry = self._acquire(args, kwargs, 1)
+        try:
+            yield entry.value
+        finally:
+            with self._lock:
+                entry.refs -= 1
+                entry.last_used = monotonic()
+
+    def _acquire(self, args, kwargs, refs: int) -> _Entry:
+        key = make_key(*args, **kwargs)
+        with self._lock:
+            expired = self._pop_idle()
+            entry = self._entries.get(key, None)
+            creating = entry is None
+            if creating:
+                entry = _Entry()
+                self._entries[key] = entry
+            entry.last_used = monotonic()
+            # 生成を待っている間も破棄されないように借りておく
+            entry.refs += refs + 1
+
+        self._close_all(expired)
+        try:
+            if creating:
+                self._create(key, entry, args, kwargs)
+            else:
+                entry.ready.wait()
+            if entry.error is not None:
+                raise entry.error
+        except BaseException:
+            with self._lock:
+                entry.refs -= refs + 1
+            raise
+
+        with self._lock:
+            entry.refs -= 1
+        return entry
+
+    def _create(self, key: Hashable, entry: _Entry, args, kwargs):
+        try:
+            entry.value = self._factory(*args, **kwargs)
+        except BaseException as e:
+            # 失敗は待っているスレッドにも伝え、次の取得で作り直す
+            entry.error = e
+            with self._lock:
+                if self._entries.get(key, None) is entry:
+                    del self._entries[key]
+        finally:
+            entry.ready.set()
+
+    def _pop_idle(self) -> list:
+        if self._idle_timeout is None:
+            return []
+
+        deadline = monotonic() - self._idle_timeout
+        expired = [
+            k
+            for k, v in self._entries.items()
+            if v.refs == 0 and v.last_used <= deadline
+        ]
+        return [self._entries.pop(k).value for k in expired]
+
+    def evict_idle(self):
+        with self._lock:
+            expired = self._pop_idle()
+        self._close_all(expired)
+
+    def close(self):
+        with self._lock:
+            values = [
+                x.value
+                for x in self._entries.values()
+                if x.ready.is_set() and x.error is None
+            ]
+            self._entries.clear()
+        self._close_all(values)
+
+    def _close_all(self, values: list):
+        if not self._close:
+            return
+        for value in values:
+            try:
+                self._close(value)
+            except Exception:
+                ...
+
+
+def close_all():
+    """全てのキャッシュを閉じる"""
+    for cache in list(_caches):
+        cache.close()
+
+
+@contextmanager
+def run_scope():
+    """一回の実行 (apply など) の間だけ接続を共有し、終了時に閉じる"""
+    try:
+        yield
+    finally:
+        close_all()
+
+
+atexit.register(close_all)
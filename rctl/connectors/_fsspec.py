@@ -0,0 +1,145 @@
+import threading
+from contextlib import contextmanager
+
+from ._cache import ConnectorCache
+
+
+def open_filesystem(protocol: str, **kwargs):
+    import fsspec
+
+    # インスタンスの寿命はこちらで管理するので、fsspec のインスタンスキャッシュは使わない
+    return fsspec.filesystem(protocol, skip_instance_cache=True, **kwargs)
+
+
+def close_filesystem(fs):
+    fs.invalidate_cache()
+
+    # s3fs, http などの非同期実装はセッションを明示的に閉じる
+    close_session = getattr(fs, "close_session", None)
+    session = getattr(fs, "_s3", None) or getattr(fs, "_session", None)
+    if fs.async_impl and close_session and session is not None:
+        close_session(fs.loop, session)
+
+
+class DirListing:
+    """ディレクトリの一覧 (ls detail=True) をキャッシュして exists/isfile/isdir に答える
+
+    同じディレクトリ配下のパスの確認は、最初の一回の ls だけで済む。
+    自分で作成・削除したパスは invalidate で一覧を破棄すること。
+    """
+
+    def __init__(self, protocol: str, **kwargs):
+        self._protocol = protocol
+        self._kwargs = kwargs
+        self._dirs: dict[str, dict[str, dict]] = {}
+        self._digests: dict[tuple[str, int], str] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def _fs(self):
+        # ファイルシステムは保持せず毎回キャッシュから取り出す。一覧だけが使われ続けても
+        # ファイルシステムがアイドルとして破棄されず、破棄されていれば作り直される
+        return filesystems.get(self._protocol, **self._kwargs)
+
+    def _normalize(self, path: str) -> str:
+        path = self._fs._strip_protocol(path)
+        return path.rstrip("/") or path
+
+    def listdir(self, path: str) -> dict[str, dict]:
+        path = self._normalize(path)
+        with self._lock:
+            entries = self._dirs.get(path, None)
+        if entries is not None:
+            return entries
+
+        try:
+            infos = self._fs.ls(path, detail=True)
+        except (FileNotFoundError, NotADirectoryError):
+            infos = []
+
+        entries = {self._normalize(x["name"]): x for x in infos}
+        with self._lock:
+            self._dirs[path] = entries
+        return entries
+
+    def info(self, path: str) -> dict | None:
+        path = self._normalize(path)
+        parent = self._normalize(self._fs._parent(path))
+        if parent == path:
+            # ルートは親の一覧がないので直接確認する
+            return (
+                {"name": path, "type": "directory"} if self._fs.exists(path) else None
+            )
+        return self.listdir(parent).get(path, None)
+
+    def exists(self, path: str) -> bool:
+        return self.info(path) is not None
+
+    def isfile(self, path: str) -> bool:
+        info = self.info(path)
+        return info is not None and info["type"] == "file"
+
+    def isdir(self, path: str) -> bool:
+        info = self.info(path)
+        return info is not None and info["type"] in ("directory", "dir")
+
+    def get_digest(self, path: str, size: int) -> str | None:
+        """確認済み（または自分で書き込んだ）ファイル内容のダイジェストを返す"""
+        return self._digests.get((self._normalize(path), size), None)
+
+    def set_digest(self, path: str, size: int, digest: str):
+        with self._lock:
+            self._digests[(self._normalize(path), size)] = digest
+
+    def invalidate(self, path: str, recursive: bool = False):
+        """path とその祖先の一覧を破棄する（mkdirs で途中のディレクトリも変わるため）"""
+        path = self._normalize(path)
+        with self._lock:
+            prefix = path + "/"
+            for k in [
+                k for k in self._digests if k[0] == path or k[0].startswith(prefix)
+            ]:
+                del self._digests[k]
+
+            if recursive:
+                for k in [k for k in self._dirs if k.startswith(prefix)]:
+                    del self._dirs[k]
+
+            while True:
+                self._dirs.pop(path, None)
+                parent = self._normalize(self._fs._parent(path))
+                if parent == path:
+                    break
+                path = parent
+
+
+def parse_url(url: str, **storage_options):
+    """URL を (プロトコル, ファイルシステムの引数, パス) にする"""
+    import fsspec
+
+    protocol = fsspec.utils.get_protocol(url)
+    cls = fsspec.get_filesystem_class(protocol)
+    options = {**cls._get_kwargs_from_urls(url), **storage_options}
+    return protocol, options, cls._strip_protocol(url)
+
+
+def open_url(url: str, **storage_options):
+    """URL からキャッシュされたファイルシステムとパスを返す"""
+    protocol, options, path = parse_url(url, **storage_options)
+    return filesystems.get(protocol, **options), path
+
+
+@contextmanager
+def lease_url(url: str, **storage_options):
+    """open_url と同じだが、コピーなど長い操作の間ファイルシステムが破棄されないように借りる"""
+    protocol, options, path = parse_url(url, **storage_options)
+    with filesystems.lease(protocol, **options) as fs:
+        yield fs, path
+
+
+def open_listing(protocol: str, **kwargs):
+    return DirListing(protocol, **kwargs)
+
+
+filesystems = ConnectorCache(open_filesystem, close=close_filesystem)
+listings = ConnectorCache(open_listing)
@@ -0,0 +1,64 @@
+import asyncio
+import threading
+
+from ._cache import ConnectorCache
+
+# 非同期接続は軽いので、スレッドより多くの接続を重ねられる
+DEFAULT_ASYNC_POOL_SIZE = 16
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """非同期接続を動かすバックグラウンドのイベントループを返す（最初の呼び出しで起動する）"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=_loop.run_forever, name="rctl-psycopg", daemon=True
+            )
+            thread.start()
+        return _loop
+
+
+def run_async(coro):
+    """バックグラウンドのイベントループでコルーチンを実行し、結果を待つ
+
+    イベントループ上のコルーチンから呼ぶとデッドロックするので、同期コードからだけ呼ぶ。
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result()
+
+
+def open_async_pool(pool_size: int = DEFAULT_ASYNC_POOL_SIZE, **dbparams):
+    from psycopg.conninfo import make_conninfo
+    from psycopg_pool import AsyncConnectionPool
+
+    async def open_pool():
+        # プールはイベントループ上で生成する
+        pool = AsyncConnectionPool(
+            make_conninfo(**dbparams), min_size=1, max_size=pool_size, open=False
+        )
+        await pool.open()
+        return pool
+
+    return run_async(open_pool())
+
+
+def close_async_pool(pool):
+    run_async(pool.close())
+
+
+# プロセス全体で共有する。接続情報とプールサイズごとに一つ
+async_pools = ConnectorCache(open_async_pool, close=close_async_pool)
+
+
+def get_async_pool(pool_size: int = DEFAULT_ASYNC_POOL_SIZE, **dbparams):
+    """非同期接続プールを返す（イベントループの外で呼ぶ）"""
+    return async_pools.get(pool_size=pool_size, **dbparams)
+
+
+def lease_async_pool(pool_size: int = DEFAULT_ASYNC_POOL_SIZE, **dbparams):
+    """非同期接続プールを、使っている間破棄されないように借りる（イベントループの外で呼ぶ）"""
+    return async_pools.lease(pool_size=pool_size, **dbparams)
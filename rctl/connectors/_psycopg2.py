@@ -0,0 +1,104 @@
+import threading
+from contextlib import contextmanager
+from time import monotonic
+
+from ._cache import ConnectorCache
+
+DEFAULT_POOL_SIZE = 4
+
+
+class ConnectionPool:
+    """ThreadedConnectionPool に、取り出し時のヘルスチェックとアイドル接続の破棄を加える
+
+    接続は必要になった時に作り、返却された接続は maxconn まで保持して再利用する。
+    maxconn 本すべて使用中の場合は、空くまで timeout 秒待つ。
+    """
+
+    def __init__(
+        self,
+        maxconn: int = DEFAULT_POOL_SIZE,
+        idle_timeout: float = 300,
+        health_check_after: float = 30,
+        timeout: float = 60,
+        **dbparams,
+    ):
+        from psycopg2.pool import ThreadedConnectionPool
+
+        self._pool = ThreadedConnectionPool(0, maxconn, **dbparams)
+        # minconn 本までしかプールに戻らないので、生成後に引き上げる（生成時に接続しないため）
+        self._pool.minconn = maxconn
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used: dict[int, float] = {}
+        self._idle_timeout = idle_timeout
+        self._health_check_after = health_check_after
+        self._timeout = timeout
+
+    @contextmanager
+    def connection(self):
+        """接続を借りる。正常終了でコミット、例外でロールバックして返却する"""
+        from psycopg2 import InterfaceError, OperationalError
+        from psycopg2.pool import PoolError
+
+        if not self._slots.acquire(timeout=self._timeout):
+            raise PoolError("connection pool exhausted")
+
+        try:
+            conn = self._checkout()
+            broken = False
+            try:
+                with conn:
+                    yield conn
+            except (InterfaceError, OperationalError):
+                broken = True
+                raise
+            finally:
+                self._checkin(conn, broken)
+        finally:
+            self._slots.release()
+
+    def _checkout(self):
+        while True:
+            conn = self._pool.getconn()
+            last_used = self._last_used.pop(id(conn), None)
+            if last_used is None or self._is_healthy(conn, monotonic() - last_used):
+                return conn
+            self._pool.putconn(conn, close=True)
+
+    def _is_healthy(self, conn, idle: float):
+        if conn.closed or idle > self._idle_timeout:
+            return False
+        if idle < self._health_check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _checkin(self, conn, broken: bool):
+        close = broken or bool(conn.closed)
+        self._pool.putconn(conn, close=close)
+        if not close and not conn.closed:
+            self._last_used[id(conn)] = monotonic()
+
+    def closeall(self):
+        self._pool.closeall()
+        self._last_used.clear()
+
+
+def open_pool(pool_size: int = DEFAULT_POOL_SIZE, **dbparams):
+    return ConnectionPool(maxconn=pool_size, **dbparams)
+
+
+# プロセス全体で共有する。接続情報 (_dbparams) とプールサイズごとに一つ
+pools = ConnectorCache(open_pool, close=ConnectionPool.closeall)
+
+
+@contextmanager
+def connect(pool_size: int = DEFAULT_POOL_SIZE, **dbparams):
+    """プールから接続を借りる"""
+    with pools.lease(pool_size=pool_size, **dbparams) as pool:
+        with pool.connection() as conn:
+            yield conn
@@ -1,11 +1,18 @@
+import hashlib
+from collections import Counter
+from itertools import groupby
+
 from rctl.base2 import StepDataExtension
 
-from .scanner import scan_files
+from .connectors import run_scope
+from .scanner import read_files, scan_files
 
 
-def scan(from_file: str = None, from_dir: str = None):
+def scan(from_file: str = None, from_dir: str = None, storage_options: dict = None):
     if from_dir:
-        return scan_files(from_dir, include=["*.yml", "*.yaml"])
+        return scan_files(
+            from_dir, include=["*.yml", "*.yaml"], storage_options=storage_options
+        )
 
     if from_file:
         return [from_file]
@@ -13,40 +20,168 @@ def scan(from_file: str = None, from_dir: str = None):
     raise Exception()
 
 
-def apply_resource(from_file: str = None, from_dir: str = None):
-    for f in scan(from_file, from_dir):
-        step = StepDataExtension.from_file(f)
-        step.apply()
+def load_steps(
+    from_file: str = None,
+    from_dir: str = None,
+    shard: str = None,
+    storage_options: dict = None,
+):
+    """スキャンしたマニフェストを読み込む。URL は内容をまとめて取得する
 
+    shard に "i/N" を指定すると、N 個に分けたうちの i 番目 (1 始まり) のステップだけを返す。
+    storage_options は URL のファイルシステムへ渡す（スキャンと読み込みの両方で使う）。
+    """
+    index, count = parse_shard(shard) if shard else (None, None)
+    paths = scan(from_file, from_dir, storage_options)
+    for _, content in read_files(paths, storage_options=storage_options):
+        step = StepDataExtension.from_stream(content)
+        if index is None or shard_of(step._step["id"], count) == index:
+            yield step
 
-def create_resource(from_file: str = None, from_dir: str = None):
-    for f in scan(from_file, from_dir):
-        step = StepDataExtension.from_file(f).override(state="created")
-        step.apply()
 
+def parse_shard(shard: str):
+    """ "i/N" を (i, N) にする"""
+    try:
+        index, count = (int(x) for x in shard.split("/"))
+    except ValueError:
+        raise ValueError(f"shard must be i/N: {shard}") from None
 
-def exists_resource(from_file: str = None, from_dir: str = None):
-    for f in scan(from_file, from_dir):
-        step = StepDataExtension.from_file(f).override(state="exists")
-        step.apply()
+    if not 1 <= index <= count:
+        raise ValueError(f"shard must be 1 <= i <= N: {shard}")
+    return index, count
 
 
-def absent_resource(from_file: str = None, from_dir: str = None):
-    for f in scan(from_file, from_dir):
-        step = StepDataExtension.from_file(f).override(state="absent")
-        step.apply()
+def shard_of(step_id: str, count: int) -> int:
+    """ステップ id を 1..count のシャードに割り当てる
+
+    ランデブーハッシュ（最大のスコアを持つシャードを選ぶ）なので、実行する環境によらず同じで、
+    シャード数を変えても移動するステップは一部で済む。
+    """
+
+    def score(i: int):
+        key = f"{i}:{step_id}".encode()
+        return hashlib.blake2b(key, digest_size=8).digest()
+
+    return max(range(1, count + 1), key=score)
 
 
-def delete_resource(from_file: str = None, from_dir: str = None):
-    for f in scan(from_file, from_dir):
-        step = StepDataExtension.from_file(f).override(state="deleted")
-        step.apply()
-
-
-def recreate_resource(from_file: str = None, from_dir: str = None):
-    for f in scan(from_file, from_dir):
-        step = StepDataExtension.from_file(f).override(state="recreated")
-        step.apply()
+def show_shard_report(
+    from_file: str = None,
+    from_dir: str = None,
+    shard: str = None,
+    storage_options: dict = None,
+):
+    """ステップが shard ("i/N") の N 個のシャードにどれだけ均等に分かれるかを表示する"""
+    if not shard:
+        raise ValueError("shard (i/N) is required for the shard report.")
+
+    _, count = parse_shard(shard)
+    steps = load_steps(from_file, from_dir, storage_options=storage_options)
+    counts = Counter(shard_of(x._step["id"], count) for x in steps)
+    total = sum(counts.values())
+    mean = total / count
+    for i in range(1, count + 1):
+        print(f"{i}/{count}: {counts[i]}")
+    if total:
+        print(f"total: {total} max/mean: {max(counts.values()) / mean:.2f}")
+
+
+def apply_steps(steps):
+    """連続するステップのうち、まとめて適用できるものはオペレーターに一度に渡す"""
+    for _, group in groupby(steps, key=lambda x: x.batch_key() or object()):
+        StepDataExtension.apply_batch(list(group))
+
+
+def apply_resource(
+    from_file: str = None,
+    from_dir: str = None,
+    shard: str = None,
+    shard_report: bool = False,
+):
+    if shard_report:
+        return show_shard_report(from_file, from_dir, shard)
+
+    with run_scope():
+        apply_steps(load_steps(from_file, from_dir, shard))
+
+
+def create_resource(from_file: str = None, from_dir: str = None, shard: str = None):
+    with run_scope():
+        steps = load_steps(from_file, from_dir, shard)
+        apply_steps(x.override(state="created") for x in steps)
+
+
+def exists_resource(from_file: str = None, from_dir: str = None, shard: str = None):
+    with run_scope():
+        steps = load_steps(from_file, from_dir, shard)
+        apply_steps(x.override(state="exists") for x in steps)
+
+
+def absent_resource(from_file: str = None, from_dir: str = None, shard: str = None):
+    with run_scope():
+        steps = load_steps(from_file, from_dir, shard)
+        apply_steps(x.override(state="absent") for x in steps)
+
+
+def delete_resource(from_file: str = None, from_dir: str = None, shard: str = None):
+    with run_scope():
+        steps = load_steps(from_file, from_dir, shard)
+        apply_steps(x.override(state="deleted") for x in steps)
+
+
+def recreate_resource(from_file: str = None, from_dir: str = None, shard: str = None):
+    with run_scope():
+        steps = load_steps(from_file, from_dir, shard)
+        apply_steps(x.override(state="recreated") for x in steps)
+
+
+def enqueue_resource(
+    from_file: str = None,
+    from_dir: str = None,
+    run_id: str = "default",
+    state: str = None,
+    dsn: str = None,
+):
+    """ステップを Postgres の作業キューに投入する（ワーカーは work で適用する）"""
+    from . import queue
+
+    manifests = read_files(scan(from_file, from_dir))
+    count = queue.enqueue(queue.get_dsn(dsn), manifests, run_id=run_id, state=state)
+    print(f"enqueued: {count}")
+
+
+def work_resource(
+    run_id: str = "default",
+    dsn: str = None,
+    batch_size: int = 10,
+    follow: bool = False,
+    worker: str = None,
+    lease: float = 3600.0,
+    max_attempts: int = 3,
+):
+    """作業キューからステップを取り出して適用する。複数のマシンで同時に実行できる
+
+    実行中のまま lease 秒経った行は、ワーカーが落ちたとみなして max_attempts 回まで取り出し直す。
+    """
+    from . import queue
+
+    counts, elapsed = queue.work(
+        queue.get_dsn(dsn),
+        run_id=run_id,
+        worker=worker,
+        batch_size=batch_size,
+        follow=follow,
+        lease=lease,
+        max_attempts=max_attempts,
+    )
+    steps = counts["done"] + counts["failed"]
+    print(
+        f"done: {counts['done']} failed: {counts['failed']}"
+        f" requeued: {counts['requeued']}"
+        f" ({steps / elapsed if elapsed else 0:.1f} steps/s)"
+    )
+    if counts["failed"]:
+        raise Exception(f" {counts['failed']} steps failed.")
 
 
 def scan_resource(from_file: str = None, from_dir: str = "."):
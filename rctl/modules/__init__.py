@@ -1,4 +1,33 @@
-from ._boto3 import Boto3Controller
-from ._fsspec import FsspecRootOperator
-from ._psycopg2 import Psycopg2SchemaOperator
-from .mock import FalseOperator, TrueOperator
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ._boto3 import Boto3Controller
+    from ._fsspec import FsspecRootOperator
+    from ._psycopg2 import (
+        Psycopg2Operator,
+        Psycopg2SchemaOperator,
+        Psycopg2TableDataOperator,
+    )
+    from .mock import FalseOperator, SyntheticOperator, TrueOperator
+
+# 各モジュールは重い依存 (boto3, psycopg2, fsspec) を持つので、参照された時にインポートする
+_exports = {
+    "Boto3Controller": "._boto3",
+    "FsspecRootOperator": "._fsspec",
+    "Psycopg2Operator": "._psycopg2",
+    "Psycopg2SchemaOperator": "._psycopg2",
+    "Psycopg2TableDataOperator": "._psycopg2",
+    "FalseOperator": ".mock",
+    "TrueOperator": ".mock",
+    "SyntheticOperator": ".mock",
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name: str):
+    module = _exports.get(name, None)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module(module, __name__), name)
@@ -1,47 +1,132 @@
+import hashlib
+import json
+import os
 import string
+from functools import lru_cache
+from time import monotonic
 
-import boto3
 from botocore.exceptions import ClientError
 
 from ..base import Operator
+from ..connectors import get_client, lease_client
 
 
 class Boto3Controller(Operator):
-    def __init__(self, **kwargs):
+    # 状態への遷移を待つ botocore の waiter 名（サブクラスで指定する）
+    waiters: dict[str, str] = {}
+
+    def __init__(
+        self,
+        waiter_delay: int | None = None,
+        waiter_max_attempts: int | None = None,
+        **kwargs,
+    ):
         self._kwargs = kwargs
+        # 指定が無ければ waiter ごとに AWS が推奨する間隔と回数を使う
+        self._waiter_config = {
+            k: v
+            for k, v in {
+                "Delay": waiter_delay,
+                "MaxAttempts": waiter_max_attempts,
+            }.items()
+            if v is not None
+        }
 
     def get_instance(self):
-        return boto3.client(**self._kwargs)
+        """接続情報ごとにキャッシュしたクライアントを返す"""
+        return get_client(**self._kwargs)
 
     def get_service_name(self):
         return self._kwargs["service_name"]
 
+    def get_waiter(self, state: str):
+        name = self.waiters.get(state, None)
+        if name is None:
+            return None
+
+        def wait(**params):
+            waiter = self.get_instance().get_waiter(name)
+            waiter.wait(
+                **self.get_waiter_args(**params), WaiterConfig=self._waiter_config
+            )
+            return True, ""
+
+        wait.__qualname__ = f"{type(self).__qualname__}.wait[{name}]"
+        return wait
+
+    def get_waiter_args(self, **params) -> dict:
+        """waiter.wait に渡す引数を返す"""
+        return {}
+
     @staticmethod
     def get_operator(type: str):
         if type == "policy":
             return PolicyController
+        elif type == "bucket":
+            return BucketController
+        elif type == "objects":
+            return ObjectsController
         else:
             raise TypeError()
 
 
+class BucketController(Boto3Controller):
+    waiters = {"created": "bucket_exists", "deleted": "bucket_not_exists"}
+
+    def get_waiter_args(self, bucket_name: str, **params):
+        return {"Bucket": bucket_name}
+
+    def create(self, bucket_name: str, **params):
+        client = self.get_instance()
+        region = client.meta.region_name
+        kwargs = {"Bucket": bucket_name}
+        if region and region != "us-east-1":
+            # us-east-1 以外はリージョンの指定が必要
+            kwargs["CreateBucketConfiguration"] = {"LocationConstraint": region}
+        res: dict = client.create_bucket(**kwargs)
+        return True, res
+
+    def delete(self, bucket_name: str, **params):
+        client = self.get_instance()
+        res: dict = client.delete_bucket(Bucket=bucket_name)
+        return True, res
+
+    def exists(self, bucket_name: str, **params):
+        client = self.get_instance()
+        try:
+            client.head_bucket(Bucket=bucket_name)
+        except ClientError as e:
+            ok, err_code = safe_get(e.response, "Error", "Code")
+            if not ok:
+                raise
+            return False, err_code
+        return True, ""
+
+    def absent(self, bucket_name: str, **params):
+        ok, msg = self.exists(bucket_name)
+        if ok:
+            return False, "Exists bucket"
+        else:
+            return True, None
+
+
 class PolicyController(Boto3Controller):
+    """バケットポリシーを管理する。ポリシーは正規化して比較し、違う場合だけ書き込む"""
+
     def create(
         self, bucket_name: str, policy_name: str, custom_policy: str = None, **params
     ):
         if policy_name and custom_policy:
             raise ValueError()
 
-        _policy = (
-            policies[self.get_service_name()][policy_name]
-            if policy_name
-            else custom_policy
-        )
-        policy_string = build_template(_policy, bucket_name=bucket_name)
-
-        client = self.get_instance()
         assert (
             self.get_service_name() == "s3"
         )  # boto3 からサービス名が取れるのでservice_name 引数はコネクション側に
+        policy_string = desired_policy(
+            self.get_service_name(), bucket_name, policy_name, custom_policy
+        )
+
+        client = self.get_instance()
         res: dict = client.put_bucket_policy(Bucket=bucket_name, Policy=policy_string)
         return True, res
 
@@ -52,9 +137,8 @@ class PolicyController(Boto3Controller):
         res: dict = client.delete_bucket_policy(Bucket=bucket_name)
         return True, res
 
-    def exists(
-        self, bucket_name: str, policy_name: str, custom_policy: str = None, **params
-    ):
+    def get_policy(self, bucket_name: str):
+        """現在のポリシーを返す。無ければ (False, エラーコード)"""
         client = self.get_instance()
         try:
             res: dict = client.get_bucket_policy(Bucket=bucket_name)
@@ -65,23 +149,230 @@ class PolicyController(Boto3Controller):
             return False, err_code
         return True, res["Policy"]
 
+    def exists(
+        self, bucket_name: str, policy_name: str, custom_policy: str = None, **params
+    ):
+        ok, current = self.get_policy(bucket_name)
+        if not ok:
+            return ok, current
+
+        desired = desired_policy(
+            self.get_service_name(), bucket_name, policy_name, custom_policy
+        )
+        if normalize_policy(current) == desired:
+            return True, current
+        else:
+            return False, "Bucket policy differs"
+
     def absent(
         self, bucket_name: str, policy_name: str, custom_policy: str = None, **params
     ):
-        ok, msg = self.exists(bucket_name=bucket_name)
+        ok, msg = self.get_policy(bucket_name)
         if ok:
             return False, "Exists bucket policy"
         else:
             return True, None
 
 
+MiB = 1024 * 1024
+
+
+class ObjectsController(Boto3Controller):
+    """ローカルのディレクトリをバケットの prefix 以下に s3transfer で転送する
+
+    サイズと ETag（マルチパートの場合は同じパートサイズで計算した値）が一致する
+    オブジェクトは転送しない。帯域を使い切るには max_concurrency に合わせて
+    コネクタの config.max_pool_connections も増やす。
+    """
+
+    def create(
+        self,
+        bucket_name: str,
+        source: str,
+        prefix: str = "",
+        multipart_threshold: int = 8 * MiB,
+        multipart_chunksize: int = 8 * MiB,
+        max_concurrency: int = 10,
+        **params,
+    ):
+        from s3transfer.manager import TransferConfig, TransferManager
+
+        uploads, skipped = self.plan(
+            bucket_name, source, prefix, multipart_threshold, multipart_chunksize
+        )
+        config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize,
+            max_request_concurrency=max_concurrency,
+        )
+
+        start = monotonic()
+        # 転送の間クライアントが破棄されないように借りておく
+        with (
+            lease_client(**self._kwargs) as client,
+            TransferManager(client, config) as manager,
+        ):
+            futures = [
+                manager.upload(path, bucket_name, key) for key, path, _ in uploads
+            ]
+            for future in futures:
+                future.result()
+        elapsed = monotonic() - start
+
+        size = sum(x[2] for x in uploads)
+        rate = size / elapsed / MiB if elapsed else 0
+        return True, (
+            f"uploaded {len(uploads)} objects ({size / MiB:.1f} MiB) in {elapsed:.2f}s"
+            f" ({rate:.1f} MiB/s), skipped {skipped}"
+        )
+
+    def delete(self, bucket_name: str, source: str, prefix: str = "", **params):
+        client = self.get_instance()
+        keys = [key for key, _, _ in list_local(source, prefix)]
+        # delete_objects は一度に 1000 件まで
+        for i in range(0, len(keys), 1000):
+            objects = [{"Key": x} for x in keys[i : i + 1000]]
+            client.delete_objects(
+                Bucket=bucket_name, Delete={"Objects": objects, "Quiet": True}
+            )
+        return True, f"deleted {len(keys)} objects"
+
+    def exists(
+        self,
+        bucket_name: str,
+        source: str,
+        prefix: str = "",
+        multipart_threshold: int = 8 * MiB,
+        multipart_chunksize: int = 8 * MiB,
+        **params,
+    ):
+        uploads, _ = self.plan(
+            bucket_name, source, prefix, multipart_threshold, multipart_chunksize
+        )
+        if uploads:
+            return False, f"{len(uploads)} objects differ"
+        return True, ""
+
+    def absent(self, bucket_name: str, source: str, prefix: str = "", **params):
+        remote = self.list_remote(bucket_name, prefix)
+        found = [key for key, _, _ in list_local(source, prefix) if key in remote]
+        if found:
+            return False, f"{len(found)} objects exist"
+        return True, None
+
+    def list_remote(self, bucket_name: str, prefix: str = ""):
+        """prefix 以下のオブジェクトの {key: (size, ETag)} を返す"""
+        paginator = self.get_instance().get_paginator("list_objects_v2")
+        result = {}
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                result[obj["Key"]] = obj["Size"], obj["ETag"].strip('"')
+        return result
+
+    def plan(self, bucket_name, source, prefix, threshold, chunksize):
+        """転送が必要な (key, path, size) と、転送しない件数を返す"""
+        remote = self.list_remote(bucket_name, prefix)
+        uploads = []
+        skipped = 0
+        for key, path, size in list_local(source, prefix):
+            current = remote.get(key, None)
+            # サイズが違えば内容を読まずに転送する
+            if (
+                current
+                and current[0] == size
+                and current[1] == file_etag(path, size, threshold, chunksize)
+            ):
+                skipped += 1
+            else:
+                uploads.append((key, path, size))
+        return uploads, skipped
+
+
+def list_local(source: str, prefix: str = ""):
+    """source 以下のファイルの (key, path, size) を返す"""
+    for root, dirs, files in os.walk(source):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, source).replace(os.sep, "/")
+            yield prefix + rel, path, os.path.getsize(path)
+
+
+def file_etag(path: str, size: int, threshold: int, chunksize: int) -> str:
+    """s3transfer で転送した場合の ETag を計算する
+
+    threshold 未満は md5、それ以上はパートごとの md5 を連結した md5 に "-パート数" を付ける。
+    """
+    from s3transfer.utils import ChunksizeAdjuster
+
+    if size < threshold:
+        digest = hashlib.md5()
+        with open(path, "rb") as f:
+            while chunk := f.read(chunksize):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    chunksize = ChunksizeAdjuster().adjust_chunksize(chunksize, size)
+    parts = []
+    with open(path, "rb") as f:
+        while chunk := f.read(chunksize):
+            parts.append(hashlib.md5(chunk).digest())
+    return f"{hashlib.md5(b''.join(parts)).hexdigest()}-{len(parts)}"
+
+
+@lru_cache(maxsize=4096)
+def desired_policy(
+    service_name: str, bucket_name: str, policy_name: str, custom_policy: str = None
+):
+    """テンプレートにバケット名を埋め込み、正規化したポリシーを返す"""
+    _policy = policies[service_name][policy_name] if policy_name else custom_policy
+    return normalize_policy(build_template(_policy, bucket_name=bucket_name))
+
+
+def normalize_policy(policy: str | dict) -> str:
+    """意味が同じポリシーが同じ文字列になるように正規化する
+
+    一要素のリストと文字列、{"AWS": "*"} と "*" を同一視し、
+    ステートメントや値のリストを並べ替えて、キーを整列した JSON にする。
+    """
+    if isinstance(policy, str):
+        policy = json.loads(policy)
+
+    doc = dict(policy)
+    statements = doc.get("Statement", [])
+    if isinstance(statements, dict):
+        statements = [statements]
+    statements = [normalize_value(x) for x in statements]
+    for x in statements:
+        if x.get("Principal", None) == {"AWS": "*"}:
+            x["Principal"] = "*"
+    doc["Statement"] = sorted(statements, key=canonical_json)
+    return canonical_json(doc)
+
+
+def normalize_value(value):
+    if isinstance(value, dict):
+        return {k: normalize_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        items = [normalize_value(x) for x in value]
+        if len(items) == 1 and isinstance(items[0], str):
+            return items[0]
+        return sorted(items, key=canonical_json)
+    return value
+
+
+def canonical_json(value) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+
 def safe_get(obj: dict, *keys):
     undefined = object()
     if len(keys) == 0:
         raise ValueError()
 
+    result = obj
     for k in keys:
-        result = obj.get(k, undefined)
+        result = result.get(k, undefined)
         if result is undefined:
             return False, f"Key not founc{k}"
 
@@ -1,9 +1,30 @@
+import asyncio
+import hashlib
+import math
+import os
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 from os import path as pathutil
 
-import fsspec
 from fsspec import AbstractFileSystem
+from fsspec.implementations.local import LocalFileSystem
 
 from ..base import Operator
+from ..connectors import DirListing, filesystems, lease_url, listings, open_url
+
+CHUNK_SIZE = 8 * 2**20
+# マルチパートアップロードのパート（最後以外）の最小サイズ
+MIN_PART_SIZE = 5 * 2**20
+# s3fs の put_file のパートの既定サイズと、パート数の上限
+S3FS_PART_SIZE = 50 * 2**20
+MAX_PARTS = 10000
+MAX_CONCURRENCY = 256
+
+# PUT が置き換えとして原子的に行われる（リネームがコピーになる）オブジェクトストレージ
+OBJECT_STORE_PROTOCOLS = {"s3", "s3a", "gs", "gcs", "az", "abfs", "abfss", "oss"}
 
 unsafes = {"~", "..", "*", "{", "}"}
 bucket_unsafes = {"/"}
@@ -22,7 +43,15 @@ class FsspecRootOperator(Operator):
         self._kwargs = kwargs
 
     def get_filesystem(self) -> AbstractFileSystem:
-        return fsspec.filesystem(self._protocol, **self._kwargs)
+        return filesystems.get(self._protocol, **self._kwargs)
+
+    def lease_filesystem(self):
+        """コピーなど長い操作の間、ファイルシステムが破棄されないように借りる"""
+        return filesystems.lease(self._protocol, **self._kwargs)
+
+    def get_listing(self) -> DirListing:
+        """実行中に共有するディレクトリ一覧のキャッシュ"""
+        return listings.get(self._protocol, **self._kwargs)
 
     @staticmethod
     def get_operator(type: str):
@@ -32,43 +61,120 @@ class FsspecRootOperator(Operator):
             return FsspecDirOperator
         elif type == "bucket":
             return FsspecBucketOperator
+        elif type == "tree":
+            return FsspecTreeOperator
+        elif type == "files":
+            return FsspecFilesOperator
         else:
             raise TypeError()
 
 
 class FsspecFileOperator(FsspecRootOperator):
-    def create(self, path: str, bucket: str = "", content: str = "", *args, **kwargs):
-        fs = self.get_filesystem()
-        p = safe_join(bucket, path)
-        directory = "/".join(p.split("/")[:-1])
-        if not fs.exists(directory):
-            fs.mkdirs(directory, exist_ok=True)
+    def create(
+        self,
+        path: str,
+        bucket: str = "",
+        content: str | None = None,
+        source: str | None = None,
+        source_options: dict = None,
+        chunk_size: int = CHUNK_SIZE,
+        *args,
+        **kwargs,
+    ):
+        """content の文字列か、source (fsspec の URL) の内容をストリーミングで書き込む"""
+        if content is not None and source:
+            raise ValueError()
 
-        with fs.open(p, "x") as f:
-            f.write(content)
-        return True, ""
+        with self.lease_filesystem() as fs:
+            if source:
+                check_chunk_size(fs, chunk_size)
+
+            listing = self.get_listing()
+            p = safe_join(bucket, path)
+            directory = "/".join(p.split("/")[:-1])
+            if not listing.exists(directory):
+                fs.mkdirs(directory, exist_ok=True)
+
+            if source:
+                options = source_options or {}
+                with (
+                    lease_url(source, **options) as (src_fs, src_path),
+                    atomic_path(fs, p) as target,
+                ):
+                    copy_file(src_fs, src_path, fs, target, chunk_size)
+                listing.invalidate(p)
+                return True, ""
+
+            data = (content or "").encode()
+            write_atomic(fs, p, data)
+            listing.invalidate(p)
+            listing.set_digest(p, len(data), text_md5(content or ""))
+            return True, ""
 
     def delete(self, path: str, bucket: str = "", *args, **kwargs):
         fs = self.get_filesystem()
         p = safe_join(bucket, path)
         fs.delete(p, recursive=True)
+        self.get_listing().invalidate(p, recursive=True)
         return True, ""
 
-    def exists(self, path: str, bucket: str = "", *args, **kwargs):
-        fs = self.get_filesystem()
+    def exists(
+        self,
+        path: str,
+        bucket: str = "",
+        content: str | None = None,
+        source: str | None = None,
+        source_options: dict = None,
+        checksum: bool = False,
+        chunk_size: int = CHUNK_SIZE,
+        *args,
+        **kwargs,
+    ):
+        """content か source を指定した場合は、内容が一致するかどうかも確認する
+
+        source との比較はサイズと ETag で行い、ETag が無い場合や checksum を指定した場合は
+        md5 も比較する（マルチパートの ETag は chunk_size のパートから計算して比べる）。
+        """
         p = safe_join(bucket, path)
-        if fs.exists(p):
-            if fs.isfile(p):
-                return True, ""
-            else:
+        info = self.get_listing().info(p)
+        if info:
+            if info["type"] != "file":
                 return False, "Not File."
+            elif content is not None and not self._same_content(info, content):
+                return False, f"Content differs {str(p)}"
+            elif source and not self._same_source(
+                info, source, source_options, checksum, chunk_size
+            ):
+                return False, f"Content differs {str(p)}"
+            else:
+                return True, ""
         else:
             return False, f"Not Exists {str(p)}"
 
-    def absent(self, path: str, bucket: str = "", *args, **kwargs):
+    def _same_content(self, info: dict, content: str):
+        data = content.encode()
+        if info.get("size", None) != len(data):
+            return False
+
+        listing = self.get_listing()
+        digest = listing.get_digest(info["name"], len(data))
+        if digest is None:
+            digest = file_md5(self.get_filesystem(), info)
+            listing.set_digest(info["name"], len(data), digest)
+
+        return digest == text_md5(content)
+
+    def _same_source(
+        self, info: dict, source: str, source_options, checksum: bool, chunk_size: int
+    ):
+        src_fs, src_path = open_url(source, **(source_options or {}))
+        src_info = src_fs.info(src_path)
         fs = self.get_filesystem()
+        return same_file(src_fs, src_info, fs, info, checksum, chunk_size)
+
+    def absent(self, path: str, bucket: str = "", *args, **kwargs):
         p = safe_join(bucket, path)
-        if fs.exists(p):
+        if self.get_listing().exists(p):
             return False, f"Exists {str(p)}"
         else:
             return True, ""
@@ -77,9 +183,11 @@ class FsspecFileOperator(FsspecRootOperator):
 class FsspecDirOperator(FsspecRootOperator):
     def create(self, path: str, bucket: str = "", *args, **kwargs):
         fs = self.get_filesystem()
+        listing = self.get_listing()
         p = safe_join(bucket, path)
-        if not fs.exists(p):
+        if not listing.exists(p):
             fs.mkdirs(p, exist_ok=True)
+            listing.invalidate(p)
         return True, ""
 
     def delete(self, path: str, bucket: str = "", *args, **kwargs):
@@ -89,13 +197,14 @@ class FsspecDirOperator(FsspecRootOperator):
         fs = self.get_filesystem()
         p = safe_join(bucket, path)
         fs.rmdir(p)
+        self.get_listing().invalidate(p, recursive=True)
         return True, ""
 
     def exists(self, path: str, bucket: str = "", *args, **kwargs):
-        fs = self.get_filesystem()
         p = safe_join(bucket, path)
-        if fs.exists(p):
-            if fs.isdir(p):
+        info = self.get_listing().info(p)
+        if info:
+            if info["type"] in ("directory", "dir"):
                 return True, ""
             else:
                 return False, "Not directory."
@@ -103,9 +212,8 @@ class FsspecDirOperator(FsspecRootOperator):
             return False, f"Not Exists {str(p)}"
 
     def absent(self, path: str, bucket: str = "", *args, **kwargs):
-        fs = self.get_filesystem()
         p = safe_join(bucket, path)
-        if fs.exists(p):
+        if self.get_listing().exists(p):
             return False, f"Exists {str(p)}"
         else:
             return True, ""
@@ -114,23 +222,27 @@ class FsspecDirOperator(FsspecRootOperator):
 class FsspecBucketOperator(FsspecRootOperator):
     def create(self, bucket: str, *args, **kwargs):
         fs = self.get_filesystem()
+        listing = self.get_listing()
         p = safe_join(bucket)
         fs.mkdir(p)
-        if not fs.exists(p):
+        listing.invalidate(p)
+        if not listing.exists(p):
             fs.mkdirs(p, exist_ok=True)
+            listing.invalidate(p)
         return True, ""
 
     def delete(self, bucket: str, *args, **kwargs):
         fs = self.get_filesystem()
         p = safe_join(bucket)
         fs.rmdir(p)
+        self.get_listing().invalidate(p, recursive=True)
         return True, ""
 
     def exists(self, bucket: str, *args, **kwargs):
-        fs = self.get_filesystem()
         p = safe_join(bucket)
-        if fs.exists(p):
-            if fs.isdir(p):
+        info = self.get_listing().info(p)
+        if info:
+            if info["type"] in ("directory", "dir"):
                 return True, ""
             else:
                 return False, "Not directory."
@@ -138,9 +250,480 @@ class FsspecBucketOperator(FsspecRootOperator):
             return False, f"Not Exists {str(p)}"
 
     def absent(self, bucket: str, *args, **kwargs):
-        fs = self.get_filesystem()
         p = safe_join(bucket)
-        if fs.exists(p):
+        if self.get_listing().exists(p):
+            return False, f"Exists {str(p)}"
+        else:
+            return True, ""
+
+
+class FsspecTreeOperator(FsspecRootOperator):
+    """source (fsspec の URL) のディレクトリツリーを path に rsync のように同期する
+
+    サイズと ETag / チェックサムで変更のないファイルをスキップする。両側の一覧に
+    ETag などがあれば、変更のないツリーの再適用は一覧取得だけで済む。
+    """
+
+    def _plan(self, source, path, bucket, checksum, source_options):
+        src_fs, src_root = open_url(source, **(source_options or {}))
+        dst_fs = self.get_filesystem()
+        dst_root = safe_join(bucket, path)
+        copies, extras = plan_sync(src_fs, src_root, dst_fs, dst_root, checksum)
+        return src_fs, src_root, dst_fs, dst_root, copies, extras
+
+    def create(
+        self,
+        source: str,
+        path: str,
+        bucket: str = "",
+        prune: bool = False,
+        checksum: bool = False,
+        max_workers: int = 16,
+        max_concurrency: int = MAX_CONCURRENCY,
+        source_options: dict = None,
+        *args,
+        **kwargs,
+    ):
+        """max_workers はコピーのスレッド数、max_concurrency は非同期ファイルシステム
+        (s3 など) へローカルからアップロードする場合の同時リクエスト数"""
+        # コピーの間、両側のファイルシステムが破棄されないように借りておく
+        with self.lease_filesystem(), lease_url(source, **(source_options or {})):
+            src_fs, src_root, dst_fs, dst_root, copies, extras = self._plan(
+                source, path, bucket, checksum, source_options
+            )
+
+            if not is_object_store(dst_fs):
+                for directory in sorted({pathutil.dirname(x) for x in copies}):
+                    dst_fs.makedirs(join_path(dst_root, directory), exist_ok=True)
+
+            pairs = [(join_path(src_root, x), join_path(dst_root, x)) for x in copies]
+            if dst_fs.async_impl and isinstance(src_fs, LocalFileSystem):
+                bulk_put(dst_fs, pairs, max_concurrency)
+            else:
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    list(
+                        executor.map(
+                            lambda x: copy_file(src_fs, x[0], dst_fs, x[1]), pairs
+                        )
+                    )
+
+            if prune and extras:
+                dst_fs.rm([join_path(dst_root, x) for x in extras])
+
+            self.get_listing().invalidate(dst_root, recursive=True)
+            return True, f"{len(copies)} copied, {len(extras) if prune else 0} deleted."
+
+    def delete(self, path: str, bucket: str = "", *args, **kwargs):
+        if not path:
+            raise RuntimeError()
+
+        fs = self.get_filesystem()
+        p = safe_join(bucket, path)
+        fs.rm(p, recursive=True)
+        self.get_listing().invalidate(p, recursive=True)
+        return True, ""
+
+    def exists(
+        self,
+        source: str,
+        path: str,
+        bucket: str = "",
+        prune: bool = False,
+        checksum: bool = False,
+        source_options: dict = None,
+        *args,
+        **kwargs,
+    ):
+        *_, copies, extras = self._plan(source, path, bucket, checksum, source_options)
+        if copies:
+            return False, f"{len(copies)} files differ."
+        if prune and extras:
+            return False, f"{len(extras)} extra files."
+        return True, ""
+
+    def absent(self, path: str, bucket: str = "", *args, **kwargs):
+        p = safe_join(bucket, path)
+        if self.get_listing().exists(p):
             return False, f"Exists {str(p)}"
         else:
             return True, ""
+
+
+class FsspecFilesOperator(FsspecRootOperator):
+    """多数のファイル (files: パスと内容の辞書) をまとめて確認・作成する
+
+    非同期ファイルシステム (s3 など) では、確認と書き込みを一つのイベントループ上で
+    max_concurrency 件ずつ並行に行う。
+    """
+
+    def _diff(self, bucket: str, files: dict[str, str], max_concurrency: int):
+        """内容が異なる（または存在しない）ファイルのパスと内容を返す"""
+        fs = self.get_filesystem()
+        desired = {safe_join(bucket, k): v.encode() for k, v in files.items()}
+        infos = bulk_info(fs, list(desired), max_concurrency)
+
+        differ, unknown = [], []
+        for (p, data), info in zip(desired.items(), infos):
+            if info is None or info.get("type", "file") != "file":
+                differ.append(p)
+            elif info.get("size", None) != len(data):
+                differ.append(p)
+            elif (token := content_token(info)) and "-" not in token:
+                if token != hashlib.md5(data).hexdigest():
+                    differ.append(p)
+            else:
+                unknown.append(p)
+
+        # ETag などが無い場合は内容を読み込んで比較する
+        contents = bulk_cat(fs, unknown, max_concurrency)
+        differ += [p for p, data in zip(unknown, contents) if data != desired[p]]
+        return {p: desired[p] for p in sorted(differ)}
+
+    def create(
+        self,
+        bucket: str,
+        files: dict[str, str],
+        max_concurrency: int = MAX_CONCURRENCY,
+        *args,
+        **kwargs,
+    ):
+        with self.lease_filesystem() as fs:
+            differ = self._diff(bucket, files, max_concurrency)
+
+            if not is_object_store(fs):
+                for directory in sorted({pathutil.dirname(x) for x in differ}):
+                    fs.makedirs(directory, exist_ok=True)
+
+            bulk_pipe(fs, list(differ.items()), max_concurrency)
+            self.get_listing().invalidate(safe_join(bucket), recursive=True)
+            return True, f"{len(differ)} written."
+
+    def delete(self, bucket: str, files: dict[str, str], *args, **kwargs):
+        fs = self.get_filesystem()
+        paths = [safe_join(bucket, x) for x in files]
+        exists = bulk_exists(fs, paths)
+        fs.rm([p for p, ok in zip(paths, exists) if ok])
+        self.get_listing().invalidate(safe_join(bucket), recursive=True)
+        return True, ""
+
+    def exists(
+        self,
+        bucket: str,
+        files: dict[str, str],
+        max_concurrency: int = MAX_CONCURRENCY,
+        *args,
+        **kwargs,
+    ):
+        differ = self._diff(bucket, files, max_concurrency)
+        if differ:
+            return False, f"{len(differ)} files differ."
+        return True, ""
+
+    def absent(
+        self,
+        bucket: str,
+        files: dict[str, str],
+        max_concurrency: int = MAX_CONCURRENCY,
+        *args,
+        **kwargs,
+    ):
+        paths = [safe_join(bucket, x) for x in files]
+        exists = bulk_exists(self.get_filesystem(), paths, max_concurrency)
+        if any(exists):
+            return False, f"{sum(exists)} files exist."
+        return True, ""
+
+
+def join_path(root: str, rel: str):
+    return "/".join(x for x in (root.rstrip("/"), rel) if x)
+
+
+def list_tree(fs: AbstractFileSystem, root: str) -> dict[str, dict]:
+    """root 配下のファイルを相対パスをキーにして返す（一覧取得一回）"""
+    root = root.rstrip("/")
+    result = {}
+    for name, info in fs.find(root, detail=True).items():
+        if info.get("type", "file") != "file":
+            continue
+        rel = name[len(root) :].lstrip("/") if name.startswith(root) else name
+        result[rel] = info
+    return result
+
+
+def plan_sync(src_fs, src_root, dst_fs, dst_root, checksum: bool = False):
+    """コピーが必要なファイルと、コピー先にだけあるファイルの相対パスを返す"""
+    src = list_tree(src_fs, src_root)
+    dst = list_tree(dst_fs, dst_root)
+
+    copies = [
+        rel
+        for rel, info in src.items()
+        if rel not in dst or not same_file(src_fs, info, dst_fs, dst[rel], checksum)
+    ]
+    extras = [rel for rel in dst if rel not in src]
+    return sorted(copies), sorted(extras)
+
+
+def same_file(
+    src_fs,
+    src_info: dict,
+    dst_fs,
+    dst_info: dict,
+    checksum: bool,
+    chunk_size: int = CHUNK_SIZE,
+):
+    """サイズと内容の識別子 (ETag, md5) を比べる
+
+    どちらかに識別子が無い場合（ローカル、メモリなど）は md5 を計算して比べる。ただし相手が
+    マルチパートの ETag なら、識別子の無い側から同じパートの分け方で ETag を計算して比べる。
+    パートの分け方が分からない場合は、checksum を指定した時だけ相手を読み込んで確かめ、
+    指定しなければ異なるとみなす（コピーし直せば分け方が分かる ETag になる）。
+    checksum を指定すると、識別子が違う場合（マルチパートの ETag など）も md5 で確かめる。
+    """
+    if src_info.get("size", None) != dst_info.get("size", None):
+        return False
+
+    a, b = content_token(src_info), content_token(dst_info)
+    if a and b and (a == b or not checksum):
+        return a == b
+
+    if bool(a) != bool(b) and "-" in (a or b):
+        # 大きいファイルを読み込み直さないように、読むのは識別子の無い側だけにする
+        fs, info = (dst_fs, dst_info) if a else (src_fs, src_info)
+        etags = multipart_etags(fs, info, a or b, chunk_size)
+        if (a or b) in etags:
+            return True
+        if etags or not checksum:
+            return False
+
+    return file_md5(src_fs, src_info) == file_md5(dst_fs, dst_info)
+
+
+def part_sizes(size: int, parts: int, chunk_size: int = CHUNK_SIZE) -> list[int]:
+    """size のファイルを parts 個に分けたマルチパートアップロードのパートの大きさの候補
+
+    copy_file は chunk_size、s3fs の put_file は 50 MiB（パート数の上限を超える場合は広げる）。
+    """
+    s3fs_size = S3FS_PART_SIZE
+    if math.ceil(size / s3fs_size) > MAX_PARTS:
+        s3fs_size = math.ceil(size / MAX_PARTS)
+    candidates = dict.fromkeys([chunk_size, CHUNK_SIZE, s3fs_size])
+    return [x for x in candidates if x and math.ceil(size / x) == parts]
+
+
+def multipart_etags(fs, info: dict, etag: str, chunk_size: int = CHUNK_SIZE):
+    """etag と同じパート数になる分け方それぞれで、マルチパートアップロードの ETag を計算する"""
+    _, _, parts = etag.rpartition("-")
+    if not parts.isdigit():
+        return []
+    return [
+        multipart_etag(fs, info["name"], x)
+        for x in part_sizes(info.get("size", 0), int(parts), chunk_size)
+    ]
+
+
+def multipart_etag(fs, path: str, part_size: int) -> str:
+    """パートごとの md5 を連結した md5 に "-パート数" を付ける"""
+    digests = []
+    with fs.open(path, "rb") as f:
+        while chunk := f.read(part_size):
+            digests.append(hashlib.md5(chunk).digest())
+    return f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
+
+
+def content_token(info: dict) -> str | None:
+    """一覧に含まれる内容の識別子 (ETag, md5) を返す"""
+    for key in ("ETag", "etag", "md5"):
+        value = info.get(key, None)
+        if value:
+            return str(value).strip('"')
+    return None
+
+
+def file_md5(fs: AbstractFileSystem, info: dict) -> str:
+    """md5 を返す。シングルパートの ETag は md5 なので読み込まずに済ませる"""
+    token = content_token(info)
+    if token and "-" not in token:
+        return token
+
+    digest = hashlib.md5()
+    with fs.open(info["name"], "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=1024)
+def text_md5(content: str) -> str:
+    return hashlib.md5(content.encode()).hexdigest()
+
+
+def write_atomic(fs: AbstractFileSystem, path: str, data: bytes):
+    with atomic_path(fs, path) as target:
+        fs.pipe_file(target, data)
+
+
+def is_object_store(fs: AbstractFileSystem):
+    protocols = {fs.protocol} if isinstance(fs.protocol, str) else set(fs.protocol)
+    return bool(protocols & OBJECT_STORE_PROTOCOLS)
+
+
+@contextmanager
+def atomic_path(fs: AbstractFileSystem, path: str):
+    """読み手が書きかけの内容を見ないように、書き込み先のパスを返す
+
+    オブジェクトストレージの PUT はそれ自体が原子的なので path をそのまま返し、
+    それ以外は一時ファイルのパスを返して、書き込み後に path へリネームする。
+    """
+    if is_object_store(fs):
+        yield path
+        return
+
+    directory, name = pathutil.split(path)
+    tmp = join_path(directory, f".{name}.{uuid.uuid4().hex}.rctl-tmp")
+    try:
+        yield tmp
+        fs.mv(tmp, path)
+    except BaseException:
+        if fs.exists(tmp):
+            fs.rm(tmp)
+        raise
+
+
+def check_chunk_size(fs: AbstractFileSystem, chunk_size: int):
+    """オブジェクトストレージへの書き込みはパートの最小サイズ未満にできない"""
+    if is_object_store(fs) and chunk_size < MIN_PART_SIZE:
+        raise ValueError(
+            f"chunk_size must be >= {MIN_PART_SIZE} for object stores: {chunk_size}"
+        )
+
+
+def copy_file(src_fs, src_path: str, dst_fs, dst_path: str, chunk_size=CHUNK_SIZE):
+    """メモリ使用量がファイルサイズに依存しないようにコピーする
+
+    - ローカル同士はカーネル内でコピーする (copy_file_range / sendfile)
+    - 同じファイルシステム内はサーバー側でコピーする
+    - それ以外は chunk_size ごとに読み書きする（s3 はマルチパートアップロードになる）
+    """
+    if isinstance(src_fs, LocalFileSystem) and isinstance(dst_fs, LocalFileSystem):
+        copy_local_file(src_path, dst_path, chunk_size)
+        return
+
+    if src_fs is dst_fs:
+        src_fs.cp_file(src_path, dst_path)
+        return
+
+    with (
+        src_fs.open(src_path, "rb", block_size=chunk_size) as src,
+        dst_fs.open(dst_path, "wb", block_size=chunk_size) as dst,
+    ):
+        while chunk := src.read(chunk_size):
+            dst.write(chunk)
+
+
+def copy_local_file(src_path: str, dst_path: str, chunk_size=CHUNK_SIZE):
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        size = os.fstat(src.fileno()).st_size
+        for kernel_copy in (_copy_file_range, _sendfile):
+            try:
+                kernel_copy(src.fileno(), dst.fileno(), size, chunk_size)
+                return
+            except (AttributeError, OSError):
+                # 未対応の OS やファイルシステム。書き込んだ分は巻き戻して次の方法を試す
+                src.seek(0)
+                dst.seek(0)
+                dst.truncate()
+
+        shutil.copyfileobj(src, dst, chunk_size)
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, size: int, chunk_size: int):
+    copied = 0
+    while copied < size:
+        n = os.copy_file_range(src_fd, dst_fd, min(chunk_size, size - copied))
+        if n == 0:
+            break
+        copied += n
+
+
+def _sendfile(src_fd: int, dst_fd: int, size: int, chunk_size: int):
+    offset = 0
+    while offset < size:
+        n = os.sendfile(dst_fd, src_fd, offset, min(chunk_size, size - offset))
+        if n == 0:
+            break
+        offset += n
+
+
+def bulk_info(fs, paths: list[str], max_concurrency=MAX_CONCURRENCY):
+    """各パスの info を返す（存在しない場合は None）"""
+
+    async def ainfo(path):
+        try:
+            return await fs._info(path)
+        except FileNotFoundError:
+            return None
+
+    def info(path):
+        try:
+            return fs.info(path)
+        except FileNotFoundError:
+            return None
+
+    return run_bulk(fs, ainfo, info, paths, max_concurrency)
+
+
+def bulk_exists(fs, paths: list[str], max_concurrency=MAX_CONCURRENCY):
+    return run_bulk(fs, lambda p: fs._exists(p), fs.exists, paths, max_concurrency)
+
+
+def bulk_cat(fs, paths: list[str], max_concurrency=MAX_CONCURRENCY):
+    return run_bulk(fs, lambda p: fs._cat_file(p), fs.cat_file, paths, max_concurrency)
+
+
+def bulk_pipe(fs, items: list[tuple[str, bytes]], max_concurrency=MAX_CONCURRENCY):
+    return run_bulk(
+        fs,
+        lambda x: fs._pipe_file(*x),
+        lambda x: write_atomic(fs, *x),
+        items,
+        max_concurrency,
+    )
+
+
+def bulk_put(fs, pairs: list[tuple[str, str]], max_concurrency=MAX_CONCURRENCY):
+    """ローカルファイルをアップロードする (大きいファイルはマルチパートになる)"""
+    return run_bulk(
+        fs,
+        lambda x: fs._put_file(*x),
+        lambda x: fs.put_file(*x),
+        pairs,
+        max_concurrency,
+    )
+
+
+def run_bulk(fs, async_func, sync_func, items: list, max_concurrency: int) -> list:
+    """items それぞれに関数を適用した結果を返す
+
+    非同期ファイルシステムは fs のイベントループ上でコルーチンを gather し、
+    最大 max_concurrency 件のリクエストを同時に実行する。それ以外はスレッドで実行する。
+    """
+    if not items:
+        return []
+
+    if fs.async_impl:
+        from fsspec.asyn import sync
+
+        async def gather():
+            semaphore = asyncio.Semaphore(max_concurrency)
+
+            async def run(item):
+                async with semaphore:
+                    return await async_func(item)
+
+            return await asyncio.gather(*(run(x) for x in items))
+
+        return sync(fs.loop, gather)
+
+    with ThreadPoolExecutor(max_workers=min(32, max_concurrency)) as executor:
+        return list(executor.map(sync_func, items))
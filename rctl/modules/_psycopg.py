@@ -0,0 +1,179 @@
+import asyncio
+import traceback
+
+from ..base import Operator
+from ..connectors import (
+    DEFAULT_ASYNC_POOL_SIZE,
+    get_async_pool,
+    lease_async_pool,
+    run_async,
+)
+from ._schema import plan_schemas, schema_result
+
+
+class PsycopgOperator(Operator):
+    """psycopg 3 の非同期接続で操作する（psycopg2 型と併存し、マニフェストごとに移行できる）
+
+    コルーチンはバックグラウンドのイベントループで実行するので、同期のエンジンからも使える。
+    a で始まる非同期メソッドを、そのループ上で asyncio.gather で重ねることもできる。
+    """
+
+    @staticmethod
+    def get_operator(type: str):
+        if type == "schema":
+            return PsycopgSchemaOperator
+        else:
+            raise TypeError()
+
+    def __init__(
+        self,
+        host,
+        dbname,
+        user,
+        password: str = "",
+        port: int = 5432,
+        pool_size: int = DEFAULT_ASYNC_POOL_SIZE,
+    ):
+        self._dbparams = {
+            "host": host,
+            "dbname": dbname,
+            "user": user,
+            "password": password,
+            "port": port,
+        }
+        self._pool_size = pool_size
+        self._pool = None
+
+    def get_pool(self):
+        """非同期接続プールを返す（イベントループの外で呼ぶ）"""
+        return get_async_pool(self._pool_size, **self._dbparams)
+
+    async def aget_pool(self):
+        """イベントループ上でプールを返す。run の外では get_pool を別スレッドで呼ぶ"""
+        if self._pool is not None:
+            return self._pool
+        return await asyncio.to_thread(self.get_pool)
+
+    def run(self, coro_func, *args, **kwargs):
+        """非同期メソッドをバックグラウンドのイベントループで実行して結果を返す
+
+        実行中はプールが破棄されないように借りておく。
+        """
+        with lease_async_pool(self._pool_size, **self._dbparams) as pool:
+            self._pool = pool
+            try:
+                return run_async(coro_func(*args, **kwargs))
+            finally:
+                self._pool = None
+
+    async def fetch_all(self, stmt, params: tuple | dict = None):
+        pool = await self.aget_pool()
+        async with pool.connection() as conn:
+            cur = await conn.execute(stmt, params)
+            return await cur.fetchall()
+
+    async def execute_pipeline(self, stmts: list, probe=None, params=None):
+        """一つのトランザクションでパイプラインモードを使い、まとめて送信する
+
+        probe を指定すると、最後に実行した結果の行を返す。
+        """
+        pool = await self.aget_pool()
+        async with pool.connection() as conn:
+            async with conn.transaction():
+                async with conn.pipeline():
+                    for stmt in stmts:
+                        await conn.execute(stmt)
+                    cur = await conn.execute(probe, params) if probe else None
+            return await cur.fetchall() if cur else []
+
+
+class PsycopgSchemaOperator(PsycopgOperator):
+    supports_batch = True
+
+    async def afetch_schemas(self, schemas: list[str]):
+        rows = await self.fetch_all(compile_probe(), (list(schemas),))
+        return {row[0] for row in rows}
+
+    async def aexists(self, schema, *args, **kwargs):
+        try:
+            existing = await self.afetch_schemas([schema])
+        except Exception as e:
+            return False, f"{str(e)}\n{traceback.format_exc()}"
+        return schema_result("exists", schema, schema in existing)
+
+    async def aabsent(self, schema, *args, **kwargs):
+        try:
+            existing = await self.afetch_schemas([schema])
+        except Exception as e:
+            return False, f"{str(e)}\n{traceback.format_exc()}"
+        return schema_result("absent", schema, schema in existing)
+
+    async def acreate(self, schema, *args, **kwargs):
+        try:
+            await self.execute_pipeline([compile_create(schema)])
+        except Exception as e:
+            return False, f"{str(e)}\n{traceback.format_exc()}"
+        return True, "Schema created."
+
+    async def adelete(self, schema, *args, **kwargs):
+        try:
+            await self.execute_pipeline([compile_drop(schema)])
+        except Exception as e:
+            return False, f"{str(e)}\n{traceback.format_exc()}"
+        return True, "Schema deleted."
+
+    def exists(self, schema, *args, **kwargs):
+        return self.run(self.aexists, schema)
+
+    def absent(self, schema, *args, **kwargs):
+        return self.run(self.aabsent, schema)
+
+    def create(self, schema, *args, **kwargs):
+        return self.run(self.acreate, schema)
+
+    def delete(self, schema, *args, **kwargs):
+        return self.run(self.adelete, schema)
+
+    def execute_batch(self, state: str, params_list: list[dict]):
+        if state not in ("created", "deleted", "recreated", "exists", "absent"):
+            return super().execute_batch(state, params_list)
+        return self.run(self.aexecute_batch, state, [x["schema"] for x in params_list])
+
+    async def aexecute_batch(self, state: str, schemas: list[str]):
+        """存在確認を一回行い、必要な DDL と再確認をパイプラインで一度に送る"""
+        try:
+            existing = await self.afetch_schemas(schemas)
+            stmts = plan_schemas(state, schemas, existing, compile_create, compile_drop)
+            if stmts:
+                rows = await self.execute_pipeline(
+                    stmts, compile_probe(), (list(schemas),)
+                )
+                existing = {row[0] for row in rows}
+        except Exception as e:
+            return [(False, f"{str(e)}\n{traceback.format_exc()}")] * len(schemas)
+
+        return [schema_result(state, x, x in existing) for x in schemas]
+
+
+def compile_probe():
+    from psycopg import sql
+
+    return sql.SQL(
+        "SELECT schema_name FROM information_schema.schemata WHERE schema_name = ANY(%s);"
+    )
+
+
+def compile_create(schema):
+    from psycopg import sql
+
+    return sql.SQL("CREATE SCHEMA IF NOT EXISTS {SCHEMA_NAME};").format(
+        SCHEMA_NAME=sql.Identifier(schema)
+    )
+
+
+def compile_drop(schema):
+    from psycopg import sql
+
+    return sql.SQL("DROP SCHEMA IF EXISTS {SCHEMA_NAME};").format(
+        SCHEMA_NAME=sql.Identifier(schema)
+    )
@@ -1,21 +1,35 @@
+import io
+import json
 import traceback
+from contextlib import ExitStack, contextmanager
 
-import psycopg2
 from psycopg2 import sql
 
 from ..base import Operator
+from ..connectors import DEFAULT_POOL_SIZE, connect, lease_url, open_url
 from ..exceptions import NoRecordError
+from ._schema import plan_schemas, schema_result
 
 
-class Psycopg2SchemaOperator(Operator):
+class Psycopg2Operator(Operator):
     @staticmethod
     def get_operator(type: str):
         if type == "schema":
             return Psycopg2SchemaOperator
+        elif type == "table_data":
+            return Psycopg2TableDataOperator
         else:
             raise TypeError()
 
-    def __init__(self, host, dbname, user, password: str = "", port: int = 5432):
+    def __init__(
+        self,
+        host,
+        dbname,
+        user,
+        password: str = "",
+        port: int = 5432,
+        pool_size: int = DEFAULT_POOL_SIZE,
+    ):
         self._dbparams = {
             "host": host,
             "dbname": dbname,
@@ -23,9 +37,14 @@ class Psycopg2SchemaOperator(Operator):
             "password": password,
             "port": port,
         }
+        self._pool_size = pool_size
+
+
+class Psycopg2SchemaOperator(Psycopg2Operator):
+    supports_batch = True
 
     def exists(self, schema, *args, **kwargs):
-        ok, result = get_conn(self._dbparams)
+        ok, result = get_conn(self._dbparams, self._pool_size)
         if not ok:
             return ok, result
 
@@ -53,13 +72,11 @@ class Psycopg2SchemaOperator(Operator):
             return True, msg
 
     def create(self, schema, *args, **kwargs):
-        ok, result = get_conn(self._dbparams)
+        ok, result = get_conn(self._dbparams, self._pool_size)
         if not ok:
             return ok, result
 
-        stmt = sql.SQL("CREATE SCHEMA IF NOT EXISTS {SCHEMA_NAME};").format(
-            SCHEMA_NAME=sql.Identifier(schema)
-        )
+        stmt = compile_create(schema)
 
         with result as conn:
             ok, msg = execute(
@@ -72,13 +89,11 @@ class Psycopg2SchemaOperator(Operator):
             return False, msg
 
     def delete(self, schema, *args, **kwargs):
-        ok, result = get_conn(self._dbparams)
+        ok, result = get_conn(self._dbparams, self._pool_size)
         if not ok:
             return ok, result
 
-        stmt = sql.SQL("DROP SCHEMA IF EXISTS {SCHEMA_NAME};").format(
-            SCHEMA_NAME=sql.Identifier(schema)
-        )
+        stmt = compile_drop(schema)
 
         with result as conn:
             ok, msg = execute(
@@ -90,13 +105,317 @@ class Psycopg2SchemaOperator(Operator):
         else:
             return False, msg
 
+    def execute_batch(self, state: str, params_list: list[dict]):
+        """同じ状態のスキーマを一つのトランザクションで適用する
+
+        存在確認は `= ANY(%s)` の一回の問い合わせで行い、必要な DDL だけをまとめて実行する。
+        """
+        schemas = [x["schema"] for x in params_list]
+        if state not in ("created", "deleted", "recreated", "exists", "absent"):
+            return super().execute_batch(state, params_list)
+
+        ok, result = get_conn(self._dbparams, self._pool_size)
+        if not ok:
+            return [(ok, result)] * len(schemas)
+
+        try:
+            with result as conn:
+                ok, result = apply_schemas(conn, state, schemas)
+                if not ok:
+                    # 接続を返す前にトランザクションを取り消す
+                    conn.rollback()
+        except Exception as e:
+            ok, result = False, f"{str(e)}\n{traceback.format_exc()}"
+
+        if not ok:
+            return [(False, result)] * len(schemas)
+
+        return [schema_result(state, schema, schema in result) for schema in schemas]
 
-def get_conn(dbparams):
+
+# シードした内容の識別子をテーブルコメントに記録する
+SEED_MARKER = "rctl:seed:"
+
+SEED_FORMATS = ("csv", "ndjson")
+
+# COPY で一度に送る大きさ
+COPY_CHUNK_SIZE = 1 << 20
+
+
+class Psycopg2TableDataOperator(Psycopg2Operator):
+    """fsspec の URL にある CSV / NDJSON を COPY FROM STDIN でテーブルに投入する
+
+    投入した内容の識別子をテーブルコメントに記録し、変わっていなければ投入しない。
+    staging=True なら一時テーブルに COPY してから、一つのトランザクションで
+    TRUNCATE と INSERT を行うので、読み手は入れ替え前か後の内容しか見ない。
+    """
+
+    def exists(self, table, source, *args, **kwargs):
+        ok, result = self.fetch_marker(table)
+        if not ok:
+            return ok, result
+
+        token = seed_token(source, **kwargs)
+        if result == token:
+            return True, ""
+        else:
+            return False, f"Not seeded {table} from {source}"
+
+    def absent(self, table, *args, **kwargs):
+        ok, result = self.fetch_marker(table)
+        if not ok:
+            return ok, result
+
+        if result is None:
+            return True, ""
+        else:
+            return False, "Not absent."
+
+    def create(
+        self,
+        table,
+        source,
+        format: str = "csv",
+        columns: list[str] = None,
+        header: bool = True,
+        staging: bool = True,
+        storage_options: dict = None,
+        chunk_size: int = COPY_CHUNK_SIZE,
+        *args,
+        **kwargs,
+    ):
+        if format not in SEED_FORMATS:
+            raise ValueError(f"format must be one of {SEED_FORMATS}: {format}")
+        if format == "ndjson" and not columns:
+            raise ValueError("columns is required for ndjson.")
+
+        token = seed_token(source, format, columns, header, storage_options)
+        target = compile_table(table)
+        cols = sql.SQL("")
+        if columns:
+            cols = sql.SQL("({})").format(
+                sql.SQL(", ").join(sql.Identifier(x) for x in columns)
+            )
+        copy = sql.SQL(
+            "COPY {TABLE} {COLUMNS} FROM STDIN WITH (FORMAT csv, HEADER {HEADER})"
+        )
+        header = header and format == "csv"
+
+        ok, result = get_conn(self._dbparams, self._pool_size)
+        if not ok:
+            return ok, result
+
+        # 借りた接続は必ず with で返却する（ソースを開けない場合も）
+        with (
+            result as conn,
+            lease_url(source, **(storage_options or {})) as (fs, path),
+            conn.cursor() as cur,
+        ):
+            if staging:
+                dest = sql.Identifier("rctl_seed_stage")
+                cur.execute(
+                    sql.SQL(
+                        "CREATE TEMP TABLE {STAGE} (LIKE {TABLE} INCLUDING DEFAULTS) ON COMMIT DROP;"
+                    ).format(STAGE=dest, TABLE=target)
+                )
+            else:
+                dest = target
+                cur.execute(sql.SQL("TRUNCATE {TABLE};").format(TABLE=target))
+
+            # copy_expert は chunk_size ずつ読みながら送るので、ソース全体をメモリに載せない
+            with fs.open(path, "rb", compression="infer") as f:
+                stream = f if format == "csv" else NdjsonCsvStream(f, columns)
+                stmt = copy.format(
+                    TABLE=dest, COLUMNS=cols, HEADER=sql.SQL(str(header))
+                )
+                cur.copy_expert(stmt.as_string(conn), stream, size=chunk_size)
+
+            if staging:
+                cur.execute(
+                    sql.SQL(
+                        "TRUNCATE {TABLE}; INSERT INTO {TABLE} SELECT * FROM {STAGE};"
+                    ).format(TABLE=target, STAGE=dest)
+                )
+
+            cur.execute(
+                sql.SQL("COMMENT ON TABLE {TABLE} IS %s;").format(TABLE=target),
+                (token,),
+            )
+
+        return True, f"Table seeded from {source}."
+
+    def delete(self, table, *args, **kwargs):
+        ok, result = get_conn(self._dbparams, self._pool_size)
+        if not ok:
+            return ok, result
+
+        target = compile_table(table)
+        stmt = sql.SQL("TRUNCATE {TABLE}; COMMENT ON TABLE {TABLE} IS NULL;").format(
+            TABLE=target
+        )
+        with result as conn:
+            ok, msg = execute(conn, stmt)
+        if ok:
+            return True, "Table truncated."
+        else:
+            return False, msg
+
+    def fetch_marker(self, table):
+        """テーブルコメントに記録した識別子を返す（テーブルが無い、記録が無い場合は None）"""
+        ok, result = get_conn(self._dbparams, self._pool_size)
+        if not ok:
+            return ok, result
+
+        schema, name = split_table(table)
+        stmt = sql.SQL(
+            "SELECT obj_description(c.oid, 'pg_class') FROM pg_catalog.pg_class c"
+            " JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace"
+            " WHERE n.nspname = %s AND c.relname = %s;"
+        )
+        with result as conn:
+            ok, result = fetch_scalar(conn, stmt, (schema, name))
+
+        if ok:
+            if result and result.startswith(SEED_MARKER):
+                return True, result
+            return True, None
+        elif isinstance(result, NoRecordError):
+            return True, None
+        else:
+            return ok, result
+
+
+class NdjsonCsvStream(io.RawIOBase):
+    """NDJSON を読みながら CSV に変換するファイルオブジェクト（copy_expert に渡す）"""
+
+    def __init__(self, f, columns: list[str]):
+        self._lines = iter(f)
+        self._columns = columns
+        self._buffer = bytearray()
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        # bytes の連結と切り出しは読むたびに全体をコピーするので bytearray で持つ
+        while len(self._buffer) < len(b):
+            line = next(self._lines, None)
+            if line is None:
+                break
+            if not line.strip():
+                continue
+            self._buffer += ndjson_to_csv(line, self._columns)
+
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        del self._buffer[:n]
+        return n
+
+
+def ndjson_to_csv(line: bytes, columns: list[str]) -> bytes:
+    record = json.loads(line)
+    fields = [quote_csv_value(record.get(x, None)) for x in columns]
+    return (",".join(fields) + "\r\n").encode()
+
+
+def quote_csv_value(value) -> str:
+    """COPY の CSV 形式では引用符の無い空文字が NULL になるので、None 以外は引用符で囲む"""
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    elif isinstance(value, bool):
+        value = "true" if value else "false"
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def split_table(table: str):
+    """schema.table を (schema, table) にする（スキーマを省略すると public）"""
+    schema, _, name = table.rpartition(".")
+    return schema or "public", name
+
+
+def compile_table(table: str):
+    return sql.Identifier(*split_table(table))
+
+
+def seed_token(
+    source,
+    format: str = "csv",
+    columns: list[str] = None,
+    header: bool = True,
+    storage_options: dict = None,
+    *args,
+    **kwargs,
+):
+    """ソースの内容と読み込み方の識別子を返す（ETag などがあればソースを読まない）"""
+    from ._fsspec import file_md5, text_md5
+
+    fs, path = open_url(source, **(storage_options or {}))
+    md5 = file_md5(fs, fs.info(path))
+    return SEED_MARKER + text_md5(json.dumps([md5, format, columns, header]))
+
+
+def apply_schemas(conn, state: str, schemas: list[str]):
+    """必要な DDL を実行し、実行後に存在するスキーマの集合を返す"""
+    ok, existing = fetch_schemas(conn, schemas)
+    if not ok or state in ("exists", "absent"):
+        return ok, existing
+
+    stmts = plan_schemas(state, schemas, existing, compile_create, compile_drop)
+    if not stmts:
+        return True, existing
+
+    ok, msg = execute(conn, sql.SQL(" ").join(stmts))
+    if not ok:
+        return ok, msg
+
+    return fetch_schemas(conn, schemas)
+
+
+def compile_create(schema: str):
+    return sql.SQL("CREATE SCHEMA IF NOT EXISTS {SCHEMA_NAME};").format(
+        SCHEMA_NAME=sql.Identifier(schema)
+    )
+
+
+def compile_drop(schema: str):
+    return sql.SQL("DROP SCHEMA IF EXISTS {SCHEMA_NAME};").format(
+        SCHEMA_NAME=sql.Identifier(schema)
+    )
+
+
+def fetch_schemas(conn, schemas: list[str]):
+    """指定したスキーマのうち存在するものの集合を返す"""
+    stmt = sql.SQL(
+        "SELECT schema_name FROM information_schema.schemata WHERE schema_name = ANY(%s);"
+    )
+    with conn.cursor() as cur:
+        try:
+            cur.execute(stmt, (list(schemas),))
+            rows = cur.fetchall()
+        except Exception as e:
+            return False, f"{str(e)}\n{traceback.format_exc()}"
+    return True, {row[0] for row in rows}
+
+
+def get_conn(dbparams, pool_size: int = DEFAULT_POOL_SIZE):
+    """プールから接続を借りる。接続できなければ (False, メッセージ) を返す
+
+    借りられた場合は、接続を返すコンテキストマネージャーを返す（with を抜けると返却する）。
+    """
+    stack = ExitStack()
     try:
-        conn = psycopg2.connect(**dbparams)
+        conn = stack.enter_context(connect(pool_size=pool_size, **dbparams))
     except Exception as e:
         return False, f"{str(e)}\n{traceback.format_exc()}"
-    return True, conn
+    return True, borrowed(stack, conn)
+
+
+@contextmanager
+def borrowed(stack: ExitStack, conn):
+    with stack:
+        yield conn
 
 
 def fetch_scalar(conn, stmt, params: tuple = tuple()):
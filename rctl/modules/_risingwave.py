@@ -1,12 +1,30 @@
+import asyncio
+import json
+import re
+import threading
 import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import count
+from time import monotonic, sleep
 
-import psycopg2
+import networkx
 import psycopg2.extras
 from psycopg2 import sql
 
-from ..base import Operator
+from ..base import Operator, execute, hook
+from ..connectors import DEFAULT_POOL_SIZE, ConnectorCache, connect, open_url
 from ..exceptions import NoRecordError
 
+# サーバーサイドカーソルが一度に取得する行数（psycopg2 の既定値と同じ）
+DEFAULT_ITERSIZE = 2000
+
+_cursor_ids = count()
+
+
+def cursor_name():
+    """接続内で一意なサーバーサイドカーソル名を返す"""
+    return f"rctl_cursor_{next(_cursor_ids)}"
+
 
 def format_value(value):
     if isinstance(value, str):
@@ -35,6 +53,33 @@ def compile_create_source(name, with_option):
     return source_stmt + with_stmt
 
 
+def compile_create_view(name, query, materialized: bool = False):
+    view = "MATERIALIZED VIEW" if materialized else "VIEW"
+    return sql.SQL("CREATE {} IF NOT EXISTS {} AS {}".format(view, name, query))
+
+
+def compile_create_table(name, definition):
+    """definition: テーブル名以降の定義（列定義や FROM source TABLE '...' など）"""
+    return sql.SQL("CREATE TABLE IF NOT EXISTS {} {}".format(name, definition))
+
+
+def compile_ddl_progress():
+    return sql.SQL(
+        "SELECT p.progress FROM rw_catalog.rw_ddl_progress p"
+        " JOIN rw_catalog.rw_relations r ON p.ddl_id = r.id"
+        " JOIN rw_catalog.rw_schemas s ON r.schema_id = s.id"
+        " WHERE LOWER(s.name) = %(SCHEMA_NAME)s AND LOWER(r.name) = %(TARGET_NAME)s"
+    )
+
+
+def backoff(initial: float = 0.5, maximum: float = 10, factor: float = 2):
+    """待ち時間を指数的に増やしながら返す"""
+    delay = initial
+    while True:
+        yield delay
+        delay = min(delay * factor, maximum)
+
+
 def compile_create_subscription(name, _from, with_option):
     with_stmt = compile_with(with_option)
     ddl = (
@@ -46,51 +91,83 @@ def compile_create_subscription(name, _from, with_option):
 
 def compile_drop(type, name):
     """type: SYNC, SOURCE, SUBSCRIPTION, TABLE, VIEW, MATERIALIZED VIEW ... any"""
-    ddl = sql.SQL(
-        "DROP IF EXISTS {}".format(
-            type,
-        )
-    )
+    type = str.upper(type)
+    type = {"SYNC": "SINK", "MATERIALIZED_VIEW": "MATERIALIZED VIEW"}.get(type, type)
+    ddl = sql.SQL("DROP {} IF EXISTS {}".format(type, name))
     return ddl
 
 
-def compile_exists(target: str, target_name: str, schema_name="public"):
-    if target == "schema" or target == "db":
-        raise NotImplementedError()
+# rw_catalog の種類ごとのテーブル
+CATALOG_TABLES = {
+    "table": "rw_tables",
+    "view": "rw_views",
+    "materialized_view": "rw_materialized_views",
+    "source": "rw_sources",
+    "subscription": "rw_subscriptions",
+    "sink": "rw_sinks",
+}
+
+
+def compile_catalog():
+    """rw_catalog のオブジェクトを (kind, schema_name, name) の一つの結果にまとめる"""
+    stmts = [
+        sql.SQL(
+            "SELECT {KIND} AS kind, s.name AS schema_name, t.name AS name"
+            " FROM rw_catalog.{TABLE} t"
+            " JOIN rw_catalog.rw_schemas s ON t.schema_id = s.id"
+        ).format(KIND=sql.Literal(kind), TABLE=sql.Identifier(table))
+        for kind, table in CATALOG_TABLES.items()
+    ]
+    stmts.append(
+        sql.SQL(
+            "SELECT 'schema' AS kind, name AS schema_name, name FROM rw_catalog.rw_schemas"
+        )
+    )
+    return sql.SQL(" UNION ALL ").join(stmts)
 
-    table = {
-        "table": "rw_catalog.rw_tables",
-        "view": "rw_catalog.rw_views",
-        "materialized_view": "rw_catalog.rw_materialized_views",
-        "source": "rw_catalog.rw_sources",
-        "subscription": "rw_catalog.rw_subscriptions",
-        "sink": "rw_catalog.rw_sinks",
-        "schema": "rw_catalog.rw_schemas",
-    }.get(str.lower(target), None)
 
-    if target is None:
-        raise NotImplementedError()
+class RwCatalog:
+    """rw_catalog のスナップショット。(schema, name) を小文字にして種類ごとに索引する
 
-    return sql.SQL(
-        """
-    SELECT
-        s.name AS schema_name
-        t.name AS target_name,
-    FROM
-        {TALBLE} t
-    JOIN
-        rw_catalog.rw_schemas s 
-    ON
-        t.schema_id = s.id
-    WHERE
-        LOWER(s.name) = %(SCHEMA_NAME)s
-        AND LOWER(t.name) = %(TARGET_NAME)s
+    最初の問い合わせで一度だけ読み込み、以降は自分の DDL で差分を反映する。
     """
-    ).format(
-        TABLE=sql.Identifier(table),
-        SCHEMA_NAME=sql.Literal(str.lower(schema_name)),
-        TARGET_NAME=sql.Literal(str.lower(target_name)),
-    )
+
+    def __init__(self):
+        self._objects: dict[str, set[tuple[str, str]]] | None = None
+        self._lock = threading.Lock()
+
+    def load(self, operator: "RisingwaveOperator"):
+        with self._lock:
+            if self._objects is not None:
+                return
+
+            objects = {kind: set() for kind in [*CATALOG_TABLES, "schema"]}
+            for row in operator.all(compile_catalog()):
+                objects[row["kind"]].add(
+                    make_catalog_key(row["schema_name"], row["name"])
+                )
+            self._objects = objects
+
+    def exists(self, kind: str, name: str, schema: str = "public"):
+        return make_catalog_key(schema, name) in self._objects[kind]
+
+    def add(self, kind: str, name: str, schema: str = "public"):
+        with self._lock:
+            if self._objects is not None:
+                self._objects[kind].add(make_catalog_key(schema, name))
+
+    def discard(self, kind: str, name: str, schema: str = "public"):
+        with self._lock:
+            if self._objects is not None:
+                self._objects[kind].discard(make_catalog_key(schema, name))
+
+
+def make_catalog_key(schema: str, name: str):
+    return str.lower(schema), str.lower(name)
+
+
+# 実行 (run_scope) の間、接続先ごとにスナップショットを共有する
+catalogs = ConnectorCache(lambda **dbparams: RwCatalog(), idle_timeout=None)
 
 
 def _compile_exists(type, name):
@@ -175,6 +252,9 @@ def _compile_exists(type, name):
 
 
 class RisingwaveOperator(Operator):
+    # rw_catalog 上の種類（サブクラスで指定する）
+    kind: str = ""
+
     @staticmethod
     def get_operator(type: str):
         if type == "sync":
@@ -184,11 +264,26 @@ class RisingwaveOperator(Operator):
         elif type == "subscription":
             return RisingwaveSubscriptionOperator
         elif type == "view":
-            return NotImplementedError()
+            return RisingwaveViewOperator
+        elif type == "materialized_view":
+            return RisingwaveMaterializedViewOperator
+        elif type == "table":
+            return RisingwaveTableOperator
+        elif type == "pipeline":
+            return RisingwavePipelineOperator
         else:
             raise TypeError()
 
-    def __init__(self, host, dbname, user, password: str = "", port: int = 5432):
+    def __init__(
+        self,
+        host,
+        dbname,
+        user,
+        password: str = "",
+        port: int = 5432,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        itersize: int = DEFAULT_ITERSIZE,
+    ):
         self._dbparams = {
             "host": host,
             "dbname": dbname,
@@ -196,10 +291,30 @@ class RisingwaveOperator(Operator):
             "password": password,
             "port": port,
         }
+        self._pool_size = pool_size
+        self._itersize = itersize
+
+    def connect(self):
+        """プールから接続を借りる"""
+        return connect(pool_size=self._pool_size, **self._dbparams)
+
+    def get_sibling(self, type: str, pool_size: int = None) -> "RisingwaveOperator":
+        """同じ接続先で別の種類のオペレーターを返す（pool_size を省略すると同じプール）"""
+        return self.get_operator(type)(
+            **self._dbparams,
+            pool_size=pool_size or self._pool_size,
+            itersize=self._itersize,
+        )
+
+    def get_catalog(self) -> RwCatalog:
+        """rw_catalog のスナップショットを返す（実行中に一度だけ読み込む）"""
+        catalog = catalogs.get(**self._dbparams)
+        catalog.load(self)
+        return catalog
 
     def execute(self, stmt, params: tuple | dict = {}):
         # プレースホルダーの埋め込みはタプルと辞書のどっちか（位置とキーワードを混在できない）
-        with psycopg2.connect(**self._dbparams) as conn:
+        with self.connect() as conn:
             with conn.cursor() as cur:
                 try:
                     cur.execute(stmt, params)
@@ -209,7 +324,7 @@ class RisingwaveOperator(Operator):
                 return True, ""
 
     def scalar(self, stmt, params: tuple | dict = {}):
-        with psycopg2.connect(**self._dbparams) as conn:
+        with self.connect() as conn:
             with conn.cursor() as cur:
                 try:
                     cur.execute(stmt, params)
@@ -229,35 +344,34 @@ class RisingwaveOperator(Operator):
                 result = row[0]
                 return result
 
-    def all(self, stmt, params: tuple | dict = {}):
-        with psycopg2.connect(**self._dbparams) as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                try:
-                    cur.execute(stmt, params)
-                except Exception:
-                    raise
-                    # return False, f"{str(e)}\n{traceback.format_exc()}"
-
-                try:
-                    rows = cur.fetchall()
-                except Exception:
-                    raise
-                    # return False, f"{str(e)}\n{traceback.format_exc()}"
-
-                yield from rows
+    def all(self, stmt, params: tuple | dict = {}, itersize: int = None):
+        """サーバーサイドカーソルで itersize 行ずつ取得しながら返す（メモリ使用量は一定）"""
+        with self.connect() as conn:
+            with conn.cursor(
+                name=cursor_name(), cursor_factory=psycopg2.extras.RealDictCursor
+            ) as cur:
+                cur.itersize = itersize or self._itersize
+                cur.execute(stmt, params)
+                yield from cur
+
+    def fetchmany(self, stmt, params: tuple | dict = {}, size: int = 1):
+        """先頭から size 行だけを取得する（残りの行はサーバーから転送しない）"""
+        with self.connect() as conn:
+            with conn.cursor(
+                name=cursor_name(), cursor_factory=psycopg2.extras.RealDictCursor
+            ) as cur:
+                cur.execute(stmt, params)
+                return cur.fetchmany(size)
 
     def first_or_none(self, stmt, params: tuple | dict = {}):
-        row = None
-        for i, row in enumerate(self.all(stmt, params)):
-            return row
-        return row
+        rows = self.fetchmany(stmt, params, 1)
+        return rows[0] if rows else None
 
     def one_or_none(self, stmt, params: tuple | dict = {}):
-        row = None
-        for i, row in enumerate(self.all(stmt, params)):
-            if i > 1:
-                raise Exception()
-        return row
+        rows = self.fetchmany(stmt, params, 2)
+        if len(rows) > 1:
+            raise Exception("multiple rows were found.")
+        return rows[0] if rows else None
 
     def last_or_none(self, stmt, params: tuple | dict = {}):
         row = None
@@ -265,78 +379,518 @@ class RisingwaveOperator(Operator):
             ...
         return row
 
-    def exists(self, stmt, params: tuple | dict = {}):
-        result = self.first_or_none(stmt, params)
-        if result:
-            return True
+    def row_exists(self, stmt, params: tuple | dict = {}):
+        """一行でも存在すれば True"""
+        return self.first_or_none(stmt, params) is not None
+
+    def consume(self, subscription: str, **kwargs):
+        """サブスクリプションの変更を読み出すコンシューマーを返す"""
+        return SubscriptionConsumer(self, subscription, **kwargs)
+
+    def exists(self, name, schema: str = "public", *args, **kwargs):
+        if self.get_catalog().exists(self.kind, name, schema):
+            return True, ""
         else:
-            return None
+            return False, f"Not exists {schema}.{name}"
+
+    def absent(self, name, schema: str = "public", *args, **kwargs):
+        if self.get_catalog().exists(self.kind, name, schema):
+            return False, "Not absent."
+        else:
+            return True, ""
+
+    def delete(self, name, schema: str = "public", *args, **kwargs):
+        ok, msg = self.execute(compile_drop(self.kind, name))
+        if ok:
+            self.get_catalog().discard(self.kind, name, schema)
+        return ok, msg
 
 
 class RisingwaveSyncOperator(RisingwaveOperator):
+    kind = "sink"
+
     def create(self, name, _from, with_option: dict, schema: str = "public"):
         stmt = compile_create_sync(name, _from, with_option)
         ok, msg = self.execute(stmt)
+        if ok:
+            self.get_catalog().add(self.kind, name, schema)
         return ok, msg
 
-    def delete(self, name, schema: str = "public", *args, **kwargs):
-        stmt = compile_drop("SYNC", name)
+
+class RisingwaveSourceOperator(RisingwaveOperator):
+    kind = "source"
+
+    def create(self, name, with_option: dict, schema: str = "public"):
+        stmt = compile_create_source(name, with_option)
         ok, msg = self.execute(stmt)
+        if ok:
+            self.get_catalog().add(self.kind, name, schema)
         return ok, msg
 
-    def exists(self, name, schema: str = "public", *args, **kwargs):
-        stmt = compile_exists("SYNC", name, schema)
-        result = self.exists(stmt)
-        return result, None
-
-    def absent(self, name, schema: str = "public", *args, **kwargs):
-        stmt = compile_exists("SYNC", name, schema)
-        result = not self.exists(stmt)
-        return result, None
 
+class RisingwaveSubscriptionOperator(RisingwaveOperator):
+    kind = "subscription"
 
-class RisingwaveSourceOperator(RisingwaveOperator):
-    def create(self, name, with_option: dict):
-        stmt = compile_create_source(name, with_option)
+    def create(self, name, _from, with_option: dict, schema: str = "public"):
+        stmt = compile_create_subscription(name, _from, with_option)
         ok, msg = self.execute(stmt)
+        if ok:
+            self.get_catalog().add(self.kind, name, schema)
         return ok, msg
 
-    def delete(self, name, schema: str = "public", *args, **kwargs):
-        stmt = compile_drop("SOURCE", name)
-        ok, msg = self.execute(stmt)
+
+class RisingwaveViewOperator(RisingwaveOperator):
+    kind = "view"
+
+    def create(self, name, query: str, schema: str = "public"):
+        ok, msg = self.execute(compile_create_view(name, query))
+        if ok:
+            self.get_catalog().add(self.kind, name, schema)
         return ok, msg
 
-    def exists(self, name, schema: str = "public", *args, **kwargs):
-        stmt = compile_exists("SOURCE", name, schema)
-        result = self.exists(stmt)
-        return result, None
 
-    def absent(self, name, schema: str = "public", *args, **kwargs):
-        stmt = compile_exists("SOURCE", name, schema)
-        result = not self.exists(stmt)
-        return result, None
+class RisingwaveBackgroundDdlOperator(RisingwaveOperator):
+    """バックフィルを伴う DDL をバックグラウンドで実行する
 
+    wait=True なら rw_ddl_progress をバックオフしながら確認し、進捗を表示して完了を待つ。
+    wait=False なら DDL を発行した時点で戻り、バックフィル中も存在するとみなすので
+    後続の独立したステップは待たずに進める。
+    """
 
-class RisingwaveSubscriptionOperator(RisingwaveOperator):
-    def create(self, name, _from, with_option: dict):
-        stmt = compile_create_subscription(name, _from, with_option)
-        ok, msg = self.execute(stmt)
-        return ok, msg
+    def create_in_background(self, stmt, name, schema, wait, timeout):
+        with self.connect() as conn:
+            # セッション変数と autocommit はプールに返す前に元に戻す
+            autocommit = conn.autocommit
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                try:
+                    cur.execute("SET BACKGROUND_DDL = true")
+                    cur.execute(stmt)
+                finally:
+                    cur.execute("SET BACKGROUND_DDL = false")
+                    conn.autocommit = autocommit
+
+        self.get_catalog().add(self.kind, name, schema)
+        if not wait:
+            return True, "Creating in background."
+
+        return self.wait_ddl(name, schema, timeout)
+
+    def get_progress(self, name, schema: str = "public"):
+        """バックフィル中なら進捗（例: "35.20%"）を、それ以外は None を返す"""
+        row = self.first_or_none(
+            compile_ddl_progress(),
+            {"SCHEMA_NAME": str.lower(schema), "TARGET_NAME": str.lower(name)},
+        )
+        return row["progress"] if row else None
+
+    def wait_ddl(self, name, schema: str = "public", timeout: float = None):
+        deadline = None if timeout is None else monotonic() + timeout
+        for delay in backoff():
+            progress = self.get_progress(name, schema)
+            if progress is None:
+                return True, "Created."
+
+            hook(2, self.wait_ddl, None, f"{schema}.{name}: {progress}")
+            if deadline is not None and monotonic() + delay > deadline:
+                return False, f"Timeout while creating {schema}.{name}: {progress}"
+            sleep(delay)
+
+    def exists(self, name, schema: str = "public", wait: bool = True, **kwargs):
+        ok, msg = super().exists(name, schema)
+        if not ok:
+            return ok, msg
+
+        progress = self.get_progress(name, schema)
+        if progress is None:
+            return True, ""
+        elif wait:
+            return False, f"Backfilling {schema}.{name}: {progress}"
+        else:
+            return True, f"Backfilling {schema}.{name}: {progress}"
+
+
+class RisingwaveMaterializedViewOperator(RisingwaveBackgroundDdlOperator):
+    kind = "materialized_view"
+
+    def create(
+        self,
+        name,
+        query: str,
+        schema: str = "public",
+        wait: bool = True,
+        timeout: float = None,
+    ):
+        stmt = compile_create_view(name, query, materialized=True)
+        return self.create_in_background(stmt, name, schema, wait, timeout)
+
+
+class RisingwaveTableOperator(RisingwaveBackgroundDdlOperator):
+    kind = "table"
+
+    def create(
+        self,
+        name,
+        definition: str,
+        schema: str = "public",
+        wait: bool = True,
+        timeout: float = None,
+    ):
+        stmt = compile_create_table(name, definition)
+        return self.create_in_background(stmt, name, schema, wait, timeout)
+
+
+class SubscriptionConsumer:
+    """サブスクリプションカーソルで変更を batch_size 行ずつ取得する
+
+    次のバッチは呼び出し側が前のバッチを読み終えてから取得する（背圧）。
+    checkpoint に fsspec の URL を指定すると、読み終えたバッチの位置
+    （rw_timestamp と同じ時刻の行数）を保存し、再起動後はその続きから読む。
+    保存はバッチを読み終えた後なので、中断した場合は最後のバッチが再送される。
+    """
 
-    def delete(self, name, schema: str = "public", *args, **kwargs):
-        stmt = compile_drop("SUBSCRIPTION", name)
-        ok, msg = self.execute(stmt)
-        return ok, msg
+    def __init__(
+        self,
+        operator: RisingwaveOperator,
+        subscription: str,
+        batch_size: int = 100,
+        checkpoint: str = None,
+        storage_options: dict = None,
+        follow: bool = False,
+        poll_interval: float = 1.0,
+        since: int | str = None,
+    ):
+        self._operator = operator
+        self._subscription = subscription
+        self._batch_size = batch_size
+        self._checkpoint = checkpoint
+        self._storage_options = storage_options or {}
+        self._follow = follow
+        self._poll_interval = poll_interval
+        self._since = since
+
+    def __iter__(self):
+        for rows in self.batches():
+            yield from rows
+
+    async def __aiter__(self):
+        batches = self.batches()
+        try:
+            while True:
+                rows = await asyncio.to_thread(next, batches, None)
+                if rows is None:
+                    return
+                for row in rows:
+                    yield row
+        finally:
+            await asyncio.to_thread(batches.close)
+
+    def batches(self):
+        """FETCH で取得した行のリストを返す。follow=False なら新しい行が無くなった時点で終わる"""
+        ts, done = self.load_checkpoint()
+        name = cursor_name()
+
+        with self._operator.connect() as conn:
+            # サブスクリプションカーソルはトランザクションの外で使う
+            autocommit = conn.autocommit
+            conn.autocommit = True
+            try:
+                with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                    since = self._since if ts is None else ts
+                    cur.execute(
+                        compile_declare_subscription_cursor(
+                            name, self._subscription, since
+                        )
+                    )
+                    try:
+                        yield from self._fetch(cur, name, ts, done)
+                    finally:
+                        cur.execute(sql.SQL("CLOSE {}").format(sql.Identifier(name)))
+            finally:
+                conn.autocommit = autocommit
+
+    def _fetch(self, cur, name, ts, done):
+        stmt = sql.SQL("FETCH {} FROM {}").format(
+            sql.Literal(self._batch_size), sql.Identifier(name)
+        )
+        skip = done
+        while True:
+            cur.execute(stmt)
+            rows = cur.fetchall()
+            if not rows:
+                if not self._follow:
+                    return
+                sleep(self._poll_interval)
+                continue
+
+            if skip:
+                # 前回読み終えた行（同じ時刻の先頭 done 行）を読み飛ばす
+                n = 0
+                while n < len(rows) and n < skip and rows[n]["rw_timestamp"] == ts:
+                    n += 1
+                skip = skip - n if n == len(rows) else 0
+                rows = rows[n:]
+                if not rows:
+                    continue
+
+            yield rows
+
+            # 呼び出し側がバッチを読み終えたので位置を保存する
+            for row in rows:
+                if row["rw_timestamp"] == ts:
+                    done += 1
+                else:
+                    ts, done = row["rw_timestamp"], 1
+            self.save_checkpoint(ts, done)
+
+    def load_checkpoint(self):
+        """保存した (rw_timestamp, 同じ時刻の読み終えた行数) を返す"""
+        if not self._checkpoint:
+            return None, 0
+
+        fs, path = open_url(self._checkpoint, **self._storage_options)
+        if not fs.exists(path):
+            return None, 0
+
+        data = json.loads(fs.cat_file(path))
+        return data["rw_timestamp"], data["count"]
+
+    def save_checkpoint(self, ts, count: int):
+        if not self._checkpoint:
+            return
+
+        from ._fsspec import write_atomic
+
+        fs, path = open_url(self._checkpoint, **self._storage_options)
+        data = {"subscription": self._subscription, "rw_timestamp": ts, "count": count}
+        write_atomic(fs, path, json.dumps(data).encode())
+
+
+def compile_declare_subscription_cursor(name, subscription, since=None):
+    """since: 再開する rw_timestamp（ミリ秒）、"full"、None（現在以降）"""
+    stmt = sql.SQL("DECLARE {} SUBSCRIPTION CURSOR FOR {}").format(
+        sql.Identifier(name), sql.Identifier(*subscription.split("."))
+    )
+    if since is None:
+        return stmt
+    elif since == "full":
+        return stmt + sql.SQL(" FULL")
+    else:
+        return stmt + sql.SQL(" SINCE {}").format(sql.Literal(int(since)))
+
+
+# 定義を字句に分ける（文字列、引用符付きの識別子、語、記号）
+TOKEN_PATTERN = re.compile(r"'(?:[^']|'')*'|\"[^\"]+\"|[\w$]+|\S")
+WORD_PATTERN = re.compile(r"[A-Za-z_][\w$]*")
+# 直後の括弧が関数の引数ではないキーワード（FROM (a JOIN b) など）
+NOT_FUNCTIONS = {
+    "FROM",
+    "JOIN",
+    "IN",
+    "EXISTS",
+    "AS",
+    "ON",
+    "LATERAL",
+    "ANY",
+    "ALL",
+    "SOME",
+    "AND",
+    "OR",
+    "NOT",
+    "WHERE",
+    "USING",
+}
+SUBQUERY_STARTS = {"SELECT", "WITH", "VALUES"}
+
+
+def find_references(text: str):
+    """定義の FROM/JOIN 句から参照しているオブジェクト名（小文字、スキーマなし）を返す
+
+    EXTRACT(YEAR FROM col) や SUBSTRING(s FROM 1) のように、関数の引数の中の FROM は飛ばす
+    （引数の中のサブクエリは参照として扱う）。
+    """
+    tokens = TOKEN_PATTERN.findall(text or "")
+    # 開いている括弧ごとに、関数の引数かどうか
+    calls = []
+    for i, token in enumerate(tokens):
+        if token == "(":
+            prev = tokens[i - 1] if i else ""
+            following = tokens[i + 1].upper() if i + 1 < len(tokens) else ""
+            calls.append(
+                bool(WORD_PATTERN.fullmatch(prev))
+                and prev.upper() not in NOT_FUNCTIONS
+                and following not in SUBQUERY_STARTS
+            )
+        elif token == ")":
+            if calls:
+                calls.pop()
+        elif token.upper() in ("FROM", "JOIN") and not (calls and calls[-1]):
+            name = reference_at(tokens, i + 1)
+            if name:
+                yield name
+
+
+def reference_at(tokens: list[str], i: int):
+    """tokens[i] から始まる name または schema.name の name を返す"""
+    while i < len(tokens) and tokens[i] == "(":
+        i += 1
+    if i + 2 < len(tokens) and tokens[i + 1] == ".":
+        i += 2
+    if i >= len(tokens):
+        return None
+
+    name = tokens[i]
+    if name.startswith('"'):
+        return name.strip('"')
+    elif WORD_PATTERN.fullmatch(name) and name.upper() not in SUBQUERY_STARTS:
+        return str.lower(name)
+    return None
+
+
+def make_pipeline_dag(objects: list[dict]):
+    """パイプラインのオブジェクトから依存関係（参照先 -> 参照元）の DAG を構築する"""
+    dag = networkx.DiGraph()
+    for obj in objects:
+        key = str.lower(obj["name"])
+        if key in dag:
+            raise ValueError(f"Duplicate object: {obj['name']}")
+        dag.add_node(key, obj=obj)
+
+    for obj in objects:
+        key = str.lower(obj["name"])
+        text = " ".join(
+            [
+                obj.get("query", ""),
+                obj.get("definition", ""),
+                f"FROM {obj.get('_from', '')}",
+            ]
+        )
+        for ref in find_references(text):
+            if ref in dag and ref != key:
+                dag.add_edge(ref, key)
 
-    def exists(self, name, schema: str = "public", *args, **kwargs):
-        stmt = compile_exists("SUBSCRIPTION", name, schema)
-        result = self.exists(stmt)
-        return result, None
+    if not networkx.is_directed_acyclic_graph(dag):
+        raise ValueError(f"Circular reference: {networkx.find_cycle(dag)}")
+    return dag
 
-    def absent(self, name, schema: str = "public", *args, **kwargs):
-        stmt = compile_exists("SUBSCRIPTION", name, schema)
-        result = not self.exists(stmt)
-        return result, None
 
+def dag_width(dag: networkx.DiGraph) -> int:
+    """同時に実行できるノードの最大数（最大反鎖の大きさ）を返す
+
+    Dilworth の定理により、ノード数から推移閉包の二部グラフの最大マッチングを引いた数になる。
+    """
+    from networkx.algorithms import bipartite
+
+    closure = networkx.transitive_closure_dag(dag)
+    graph = networkx.Graph()
+    sources = [("out", x) for x in closure]
+    graph.add_nodes_from(sources)
+    graph.add_nodes_from(("in", x) for x in closure)
+    graph.add_edges_from((("out", u), ("in", v)) for u, v in closure.edges)
+    matching = bipartite.hopcroft_karp_matching(graph, top_nodes=sources)
+    return len(closure) - len(matching) // 2
+
+
+def run_dag(dag: networkx.DiGraph, func, max_workers: int):
+    """先行ノードが全て成功したノードから並行して func(key) を実行する
+
+    失敗したノードがあれば新しいノードは開始せず、実行中のノードの完了を待つ。
+    ノードごとの (ok, msg) を返す。
+    """
+    results = {}
+    waiting = {key: dag.in_degree(key) for key in dag}
+    ready = [key for key, n in waiting.items() if n == 0]
+    failed = False
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        while ready or running:
+            while ready and not failed:
+                key = ready.pop(0)
+                running[executor.submit(func, key)] = key
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = running.pop(future)
+                try:
+                    ok, msg = future.result()
+                except Exception as e:
+                    ok, msg = False, f"{str(e)}\n{traceback.format_exc()}"
+                results[key] = ok, msg
+                if not ok:
+                    failed = True
+                    continue
+
+                for successor in dag.successors(key):
+                    waiting[successor] -= 1
+                    if waiting[successor] == 0:
+                        ready.append(successor)
+
+    return results
+
+
+class RisingwavePipelineOperator(RisingwaveOperator):
+    """source -> table/materialized_view -> sink/subscription のパイプラインをまとめて管理する
+
+    objects の各要素は kind（サブタイプ名）と、そのオペレーターの create の引数を持つ。
+    依存関係は定義の FROM/JOIN 句から推論し、独立した枝は並行して作成する。
+    削除は逆のトポロジカル順で行う。
+    max_workers を省略すると DAG の幅（同時に実行できる最大数）だけ並行し、
+    接続プールもその大きさにする。
+    """
 
-class RisingwaveViewOperator(RisingwaveOperator): ...
+    def get_object(self, obj: dict, pool_size: int = None):
+        """オブジェクトの定義から (オペレーター, create などの引数) を返す"""
+        params = {k: v for k, v in obj.items() if k != "kind"}
+        return self.get_sibling(obj["kind"], pool_size=pool_size), params
+
+    def apply_dag(self, objects, state, max_workers, reverse: bool = False):
+        dag = make_pipeline_dag(objects)
+        if reverse:
+            dag = dag.reverse()
+
+        workers = max(1, max_workers or dag_width(dag))
+        pool_size = max(self._pool_size, workers)
+
+        def apply(key):
+            operator, params = self.get_object(dag.nodes[key]["obj"], pool_size)
+            return execute(operator, state, params)
+
+        results = run_dag(dag, apply, workers)
+        return summarize(objects, results)
+
+    def create(self, objects: list[dict], max_workers: int = None):
+        return self.apply_dag(objects, "created", max_workers)
+
+    def delete(self, objects: list[dict], max_workers: int = None):
+        return self.apply_dag(objects, "deleted", max_workers, reverse=True)
+
+    def exists(self, objects: list[dict], *args, **kwargs):
+        results = {}
+        for obj in objects:
+            operator, params = self.get_object(obj)
+            results[str.lower(obj["name"])] = operator.exists(**params)
+        return summarize(objects, results)
+
+    def absent(self, objects: list[dict], *args, **kwargs):
+        results = {}
+        for obj in objects:
+            operator, params = self.get_object(obj)
+            results[str.lower(obj["name"])] = operator.absent(**params)
+        return summarize(objects, results)
+
+
+def summarize(objects: list[dict], results: dict):
+    """オブジェクトごとの結果を一つの (ok, msg) にまとめる（未実行のものも失敗とする）"""
+    errors = []
+    for obj in objects:
+        ok, msg = results.get(str.lower(obj["name"]), (False, "Skipped."))
+        if not ok:
+            errors.append(f"{obj['name']}: {msg}")
+
+    if errors:
+        return False, "\n".join(errors)
+    return True, ""
@@ -0,0 +1,31 @@
+"""psycopg2 型と psycopg 型のスキーマ操作で共通する処理（ドライバーに依存しない）"""
+
+
+def plan_schemas(state: str, schemas: list[str], existing: set[str], create, drop):
+    """状態にするために必要な DDL を返す
+
+    create / drop はスキーマ名から DDL を作る関数（ドライバーごとの sql で組み立てる）。
+    """
+    stmts = []
+    if state in ("deleted", "recreated"):
+        stmts += [drop(x) for x in dict.fromkeys(schemas) if x in existing]
+    if state in ("created", "recreated"):
+        stmts += [
+            create(x)
+            for x in dict.fromkeys(schemas)
+            if state == "recreated" or x not in existing
+        ]
+    return stmts
+
+
+def schema_result(state: str, schema: str, exists: bool):
+    if state in ("created", "recreated", "exists"):
+        if exists:
+            return True, ""
+        else:
+            return False, f"Not exists {schema}"
+    else:
+        if exists:
+            return False, "Not absent."
+        else:
+            return True, ""
@@ -1,4 +1,10 @@
+import random
+from time import sleep
+
 from ..base import Operator
+from ..connectors import ConnectorCache
+
+METHODS = ("create", "delete", "exists", "absent")
 
 
 class TrueOperator(Operator):
@@ -27,3 +33,114 @@ class FalseOperator(Operator):
 
     def absent(self):
         return False, "a resource not absent(absolutely False)."
+
+
+class SyntheticOperator(Operator):
+    """遅延と失敗を注入する疑似オペレーター（遅いバックエンドに対するエンジンの測定用）
+
+    コネクタの latency / failure_rate は全メソッド共通の値か、メソッドごとの辞書で指定する。
+
+        connector:
+          latency:
+            default: {dist: fixed, mean: 0.01}
+            create: {dist: longtail, mean: 0.05, alpha: 1.5}
+            exists: {dist: normal, mean: 0.01, stddev: 0.002}
+          failure_rate: {create: 0.01}
+          seed: 1
+
+    作成したリソースは同じコネクタの間で共有し、run_scope の終了時に消える。
+    """
+
+    def __init__(self, latency=None, failure_rate=None, seed: int = None):
+        self._latency = latency
+        self._failure_rate = failure_rate
+        self._seed = seed
+        self._connector = {
+            "latency": latency,
+            "failure_rate": failure_rate,
+            "seed": seed,
+        }
+        self._randoms: dict[str, random.Random] = {}
+
+    def get_random(self, name: str):
+        # seed を指定した場合はリソースごとに再現できる乱数を使う
+        if self._seed is None:
+            return random
+        if name not in self._randoms:
+            self._randoms[name] = random.Random(f"{self._seed}:{name}")
+        return self._randoms[name]
+
+    def simulate(self, method: str, name: str):
+        """遅延を入れ、失敗する場合はメッセージを返す"""
+        rng = self.get_random(name)
+        sleep(sample_latency(per_method(self._latency, method), rng))
+        if rng.random() < float(per_method(self._failure_rate, method) or 0):
+            return f"{name}: injected failure ({method})."
+        return None
+
+    def get_store(self) -> set:
+        return stores.get(**self._connector)
+
+    def create(self, name: str):
+        if err := self.simulate("create", name):
+            return False, err
+        self.get_store().add(name)
+        return True, f"{name} created."
+
+    def delete(self, name: str):
+        if err := self.simulate("delete", name):
+            return False, err
+        self.get_store().discard(name)
+        return True, f"{name} deleted."
+
+    def exists(self, name: str):
+        if err := self.simulate("exists", name):
+            return False, err
+        if name in self.get_store():
+            return True, ""
+        return False, f"{name} not exists."
+
+    def absent(self, name: str):
+        if err := self.simulate("absent", name):
+            return False, err
+        if name in self.get_store():
+            return False, f"{name} exists."
+        return True, ""
+
+
+def per_method(value, method: str):
+    """メソッドごとの辞書ならメソッド（無ければ default）の値を、そうでなければ値をそのまま返す"""
+    if isinstance(value, dict) and set(value) & {*METHODS, "default"}:
+        return value.get(method, value.get("default", None))
+    return value
+
+
+def sample_latency(spec, rng=random) -> float:
+    """遅延（秒）を分布から一つ取り出す
+
+    spec は秒数か {dist, mean, ...} の辞書。dist は次のいずれか。
+      fixed: 常に mean
+      normal: 平均 mean、標準偏差 stddev の正規分布（負の値は 0）
+      longtail: 平均が mean になるパレート分布。alpha (> 1) が小さいほど裾が重い
+    """
+    if not spec:
+        return 0.0
+    if isinstance(spec, int | float):
+        return float(spec)
+
+    dist = spec.get("dist", "fixed")
+    mean = float(spec.get("mean", 0))
+    if dist == "fixed":
+        return mean
+    elif dist == "normal":
+        return max(0.0, rng.gauss(mean, float(spec.get("stddev", mean / 10))))
+    elif dist == "longtail":
+        alpha = float(spec.get("alpha", 2.0))
+        if alpha <= 1:
+            raise ValueError(f"alpha must be > 1: {alpha}")
+        return mean * (alpha - 1) / alpha * rng.paretovariate(alpha)
+    else:
+        raise ValueError(f"unknown latency dist: {dist}")
+
+
+stores = ConnectorCache(lambda **connector: set(), idle_timeout=None)
@@ -0,0 +1,324 @@
+"""Postgres のテーブルを使ったステップの作業キュー
+
+一つのプロセスがステップを投入し (enqueue)、複数のワーカー (work) が
+SELECT ... FOR UPDATE SKIP LOCKED で重ならないように取り出して適用する。
+同じリソース（モジュールの種類、接続先、対象を識別するパラメーター）を操作するステップは、
+勧告的ロックで同時に一つのワーカーしか適用しない。
+実行中のままリース (lease 秒) が切れた行は、ワーカーが落ちたとみなして取り出し直す
+（max_attempts 回まで。超えたら失敗にする）。
+"""
+
+import hashlib
+import os
+import socket
+import traceback
+from contextlib import closing, contextmanager
+from time import monotonic, sleep
+
+from .base2 import StepDataExtension
+from .connectors import connect, run_scope
+
+DEFAULT_TABLE = "rctl_queue"
+DSN_ENV = "RCTL_QUEUE_DSN"
+DEFAULT_LEASE = 3600.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def get_dsn(dsn: str = None):
+    dsn = dsn or os.environ.get(DSN_ENV, "")
+    if not dsn:
+        raise ValueError(f"dsn is required (or set {DSN_ENV}).")
+    return dsn
+
+
+def compile_table(table: str):
+    from psycopg2 import sql
+
+    return sql.Identifier(*table.split("."))
+
+
+def init_queue(conn, table: str = DEFAULT_TABLE):
+    from psycopg2 import sql
+
+    stmt = sql.SQL(
+        """
+    CREATE TABLE IF NOT EXISTS {TABLE} (
+        run_id text NOT NULL,
+        step_id text NOT NULL,
+        manifest text NOT NULL,
+        state text,
+        status text NOT NULL DEFAULT 'pending',
+        worker text,
+        message text,
+        attempts integer NOT NULL DEFAULT 0,
+        enqueued_at timestamptz NOT NULL DEFAULT now(),
+        started_at timestamptz,
+        finished_at timestamptz,
+        PRIMARY KEY (run_id, step_id)
+    );
+    CREATE INDEX IF NOT EXISTS {INDEX} ON {TABLE} (run_id, status, enqueued_at);
+    """
+    ).format(
+        TABLE=compile_table(table),
+        INDEX=sql.Identifier(f"{table.split('.')[-1]}_pending_idx"),
+    )
+    with conn.cursor() as cur:
+        cur.execute(stmt)
+
+
+def enqueue(
+    dsn: str,
+    manifests,
+    run_id: str = "default",
+    state: str = None,
+    table: str = DEFAULT_TABLE,
+    page_size: int = 1000,
+):
+    """マニフェストの内容をキューに投入する。投入済みのステップは無視する
+
+    manifests には (path, 内容) を渡す。ワーカーは投入した内容をそのまま適用するので、
+    ワーカーからマニフェストのファイルが見えなくてもよい。
+    """
+    from psycopg2 import sql
+    from psycopg2.extras import execute_values
+
+    stmt = sql.SQL(
+        "INSERT INTO {TABLE} (run_id, step_id, manifest, state) VALUES %s"
+        " ON CONFLICT (run_id, step_id) DO NOTHING"
+    ).format(TABLE=compile_table(table))
+
+    count = 0
+    with connect(dsn=dsn) as conn:
+        init_queue(conn, table)
+        with conn.cursor() as cur:
+            rows = []
+            for _, content in manifests:
+                if isinstance(content, bytes):
+                    content = content.decode()
+                step_id = StepDataExtension.from_stream(content)._step["id"]
+                rows.append((run_id, step_id, content, state))
+                if len(rows) >= page_size:
+                    execute_values(cur, stmt.as_string(conn), rows, page_size=page_size)
+                    count += len(rows)
+                    rows = []
+            if rows:
+                execute_values(cur, stmt.as_string(conn), rows, page_size=page_size)
+                count += len(rows)
+    return count
+
+
+def claim(
+    conn,
+    run_id: str,
+    worker: str,
+    limit: int,
+    table: str = DEFAULT_TABLE,
+    lease: float = DEFAULT_LEASE,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+):
+    """未着手のステップを limit 件取り出して実行中にする（他のワーカーが取り出し中の行は飛ばす）
+
+    リースが切れた実行中の行も取り出し直す。conn は work が開いた専用の接続で、操作ごとにコミットする。
+    """
+    from psycopg2 import sql
+
+    expire(conn, run_id, table, lease, max_attempts)
+    stmt = sql.SQL(
+        """
+    UPDATE {TABLE} q
+    SET status = 'running', worker = %(worker)s, started_at = now(),
+        attempts = q.attempts + 1
+    FROM (
+        SELECT run_id, step_id FROM {TABLE}
+        WHERE run_id = %(run_id)s AND (
+            status = 'pending'
+            OR (status = 'running'
+                AND started_at < now() - make_interval(secs => %(lease)s)
+                AND attempts < %(max_attempts)s)
+        )
+        ORDER BY enqueued_at, step_id
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    ) AS c
+    WHERE q.run_id = c.run_id AND q.step_id = c.step_id
+    RETURNING q.step_id, q.manifest, q.state
+    """
+    ).format(TABLE=compile_table(table))
+    params = {
+        "run_id": run_id,
+        "worker": worker,
+        "limit": limit,
+        "lease": lease,
+        "max_attempts": max_attempts,
+    }
+    with conn.cursor() as cur:
+        cur.execute(stmt, params)
+        rows = cur.fetchall()
+    conn.commit()
+    return rows
+
+
+def expire(
+    conn,
+    run_id: str,
+    table: str = DEFAULT_TABLE,
+    lease: float = DEFAULT_LEASE,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+):
+    """リースが切れたまま試行回数の上限に達した行を失敗にする"""
+    from psycopg2 import sql
+
+    stmt = sql.SQL(
+        "UPDATE {TABLE} SET status = 'failed', finished_at = now(),"
+        " message = 'abandoned after ' || attempts || ' attempts'"
+        " WHERE run_id = %(run_id)s AND status = 'running'"
+        " AND started_at < now() - make_interval(secs => %(lease)s)"
+        " AND attempts >= %(max_attempts)s"
+    ).format(TABLE=compile_table(table))
+    params = {"run_id": run_id, "lease": lease, "max_attempts": max_attempts}
+    with conn.cursor() as cur:
+        cur.execute(stmt, params)
+    conn.commit()
+
+
+def finish(
+    conn,
+    run_id: str,
+    step_id: str,
+    worker: str,
+    status: str,
+    message: str,
+    table=DEFAULT_TABLE,
+):
+    """結果を記録する（リースが切れて他のワーカーが取り出し直した行は更新しない）"""
+    from psycopg2 import sql
+
+    stmt = sql.SQL(
+        "UPDATE {TABLE} SET status = %s, message = %s, finished_at = now()"
+        " WHERE run_id = %s AND step_id = %s AND worker = %s"
+    ).format(TABLE=compile_table(table))
+    with conn.cursor() as cur:
+        cur.execute(stmt, (status, message, run_id, step_id, worker))
+    conn.commit()
+
+
+def release(conn, run_id: str, step_id: str, worker: str, table=DEFAULT_TABLE):
+    """未着手に戻す（リソースのロック待ちは試行回数に数えない）"""
+    from psycopg2 import sql
+
+    stmt = sql.SQL(
+        "UPDATE {TABLE} SET status = 'pending', message = 'locked',"
+        " attempts = attempts - 1"
+        " WHERE run_id = %s AND step_id = %s AND worker = %s"
+    ).format(TABLE=compile_table(table))
+    with conn.cursor() as cur:
+        cur.execute(stmt, (run_id, step_id, worker))
+    conn.commit()
+
+
+def lock_key(resource: str) -> int:
+    """リソースを勧告的ロックのキー (bigint) にする"""
+    digest = hashlib.blake2b(resource.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def try_lock(conn, resource: str) -> bool:
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_try_advisory_lock(%s)", (lock_key(resource),))
+        locked = cur.fetchone()[0]
+    conn.commit()
+    return locked
+
+
+def unlock(conn, resource: str):
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_unlock(%s)", (lock_key(resource),))
+    conn.commit()
+
+
+def resource_key(step_id: str, manifest: str) -> str:
+    """ステップが操作するリソースのキー（読めないマニフェストはステップ id）"""
+    try:
+        return StepDataExtension.from_stream(manifest).resource_key()
+    except Exception:
+        return step_id
+
+
+def apply_step(manifest: str, state: str = None):
+    """ステップを適用し (成功したか, メッセージ) を返す"""
+    try:
+        step = StepDataExtension.from_stream(manifest)
+        if state:
+            step = step.override(state=state)
+        step.apply()
+    except Exception as e:
+        return False, f"{str(e)}\n{traceback.format_exc()}"
+    return True, ""
+
+
+@contextmanager
+def open_conn(dsn: str):
+    """キューの操作やロックの保持に使う専用の接続（run_scope で閉じられないようにプールを使わない）"""
+    import psycopg2
+
+    with closing(psycopg2.connect(dsn=dsn)) as conn:
+        yield conn
+
+
+def work(
+    dsn: str,
+    run_id: str = "default",
+    worker: str = None,
+    batch_size: int = 10,
+    poll_interval: float = 1.0,
+    follow: bool = False,
+    table: str = DEFAULT_TABLE,
+    lease: float = DEFAULT_LEASE,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+):
+    """キューからステップを取り出して適用し、結果を記録する
+
+    follow=False なら取り出せるステップが無くなった時点で終わる。
+    他のワーカーが同じリソースをロックしている場合は、未着手に戻して後で取り出す。
+    取り出した分ごとに run_scope を開き直すので、カタログのスナップショットや一覧のキャッシュは
+    他のワーカーの変更を反映する。
+    """
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    counts = {"done": 0, "failed": 0, "requeued": 0}
+    start = monotonic()
+
+    # キューの操作と勧告的ロックの保持に一本ずつ使う
+    with open_conn(dsn) as conn, open_conn(dsn) as lock_conn:
+        while True:
+            claimed = claim(
+                conn, run_id, worker, batch_size, table, lease, max_attempts
+            )
+            if not claimed:
+                if not follow:
+                    break
+                sleep(poll_interval)
+                continue
+
+            requeued = 0
+            with run_scope():
+                for step_id, manifest, state in claimed:
+                    resource = resource_key(step_id, manifest)
+                    if not try_lock(lock_conn, resource):
+                        release(conn, run_id, step_id, worker, table)
+                        requeued += 1
+                        continue
+                    try:
+                        ok, msg = apply_step(manifest, state)
+                    finally:
+                        unlock(lock_conn, resource)
+                    status = "done" if ok else "failed"
+                    finish(conn, run_id, step_id, worker, status, msg, table)
+                    counts[status] += 1
+
+            counts["requeued"] += requeued
+            if requeued == len(claimed):
+                # ロック中のステップしか無いので、解放されるまで待つ
+                sleep(poll_interval)
+
+    elapsed = monotonic() - start
+    return counts, elapsed
@@ -1,24 +1,75 @@
-from . import modules as mo
+from importlib import import_module
+
 from .base import HasOperator
 
+ENTRY_POINT_GROUP = "rctl.operators"
+
 
 class Registry:
-    """Manifest と type をマッピングする"""
+    """Manifest と type をマッピングする
+
+    値はクラスか "module:attr" 形式のインポートパスで、パスは初めて使われた時にインポートする。
+    登録されていない type はエントリーポイント (group) から探すので、
+    サードパーティのパッケージは次のようにオペレーターを追加できる。
+
+        [project.entry-points."rctl.operators"]
+        mytype = "mypackage.operators:MyOperator"
+    """
 
-    def __init__(self, map: dict[str, HasOperator] = {}):
-        self._map = map
+    def __init__(
+        self,
+        map: dict[str, HasOperator | str] = {},
+        group: str | None = ENTRY_POINT_GROUP,
+    ):
+        self._map = dict(map)
+        self._group = group
+
+    def register(self, type: str, target: HasOperator | str):
+        self._map[type] = target
 
     def get_cls(self, type: str):
         t = self._map.get(type, None)
+        if t is None:
+            t = self._find_entry_point(type)
+            if t is None:
+                return None
+
+        if isinstance(t, str):
+            t = load_object(t)
+            self._map[type] = t
+
         return t
 
+    def _find_entry_point(self, type: str):
+        if not self._group:
+            return None
+
+        from importlib.metadata import entry_points
+
+        for ep in entry_points(group=self._group, name=type):
+            return ep.value
+
+        return None
+
+
+def load_object(path: str):
+    """ "module:attr" 形式のパスからオブジェクトをインポートする"""
+    module_name, _, attr = path.partition(":")
+    obj = import_module(module_name)
+    for name in attr.split(".") if attr else []:
+        obj = getattr(obj, name)
+    return obj
+
 
 _registry = Registry(
     {
-        "true": mo.TrueOperator,
-        "false": mo.TrueOperator,
-        "fsspec": mo.FsspecRootOperator,
-        "psycopg2": mo.Psycopg2SchemaOperator,
-        "boto3": mo.Boto3Controller,
+        "true": "rctl.modules.mock:TrueOperator",
+        "false": "rctl.modules.mock:FalseOperator",
+        "synthetic": "rctl.modules.mock:SyntheticOperator",
+        "fsspec": "rctl.modules._fsspec:FsspecRootOperator",
+        "psycopg2": "rctl.modules._psycopg2:Psycopg2Operator",
+        "psycopg": "rctl.modules._psycopg:PsycopgOperator",
+        "boto3": "rctl.modules._boto3:Boto3Controller",
+        "risingwave": "rctl.modules._risingwave:RisingwaveOperator",
     }
 )
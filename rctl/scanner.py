@@ -1,7 +1,10 @@
 import fnmatch
 import heapq
 import os
-from typing import Iterator, List, Optional, Tuple
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+STRATEGIES = ("bfs", "dfs", "name", "mtime", "bfs_name")
 
 
 def scan_files(
@@ -9,15 +12,25 @@ def scan_files(
     strategy: str = "bfs_name",
     include: List[str] | None = None,
     exclude: List[str] | None = None,
+    storage_options: dict | None = None,
 ) -> Iterator[str]:
     """指定したディレクトリを再帰的にスキャンし、ファイルを指定の順序で返す。
 
-    :param root_dir: スキャンするルートディレクトリ
+    :param root_dir: スキャンするルートディレクトリ、または fsspec の URL (s3://, memory:// など)
     :param strategy: ファイルの順序戦略 ('bfs', 'dfs', 'name', 'mtime', 'bfs_name')
     :param include: 含めるファイルのワイルドカードパターン
     :param exclude: 除外するファイルのワイルドカードパターン
-    :return: ファイルパスのイテレータ
+    :param storage_options: URL の場合にファイルシステムへ渡すオプション
+    :return: ファイルパス（URL の場合はプロトコル付きの URL）のイテレータ
     """
+    if strategy not in STRATEGIES:
+        raise ValueError(
+            "Invalid strategy. Choose from 'bfs', 'dfs', 'name', 'mtime', 'bfs_name'"
+        )
+
+    if is_url(root_dir):
+        return fs_scan(root_dir, strategy, include, exclude, storage_options)
+
     if strategy == "bfs":
         return bfs_scan(root_dir, include, exclude)
     elif strategy == "dfs":
@@ -26,12 +39,13 @@ def scan_files(
         return sorted_scan(root_dir, include, exclude)
     elif strategy == "mtime":
         return mtime_scan(root_dir, include, exclude)
-    elif strategy == "bfs_name":
-        return bfs_sorted_scan(root_dir, include, exclude)
     else:
-        raise ValueError(
-            "Invalid strategy. Choose from 'bfs', 'dfs', 'name', 'mtime', 'bfs_name'"
-        )
+        return bfs_sorted_scan(root_dir, include, exclude)
+
+
+def is_url(path: str) -> bool:
+    """fsspec のプロトコル付き URL かどうかを判定"""
+    return "://" in path
 
 
 def should_include(
@@ -134,6 +148,128 @@ def bfs_sorted_scan(
             queue.extend(sorted(dirs))
 
 
+def fs_scan(
+    url: str,
+    strategy: str,
+    include: List[str] | None,
+    exclude: List[str] | None,
+    storage_options: dict | None = None,
+) -> Iterator[str]:
+    """fsspec のファイルシステムをスキャン
+
+    ファイルごとに stat せず、fs.find(detail=True) の一覧だけで絞り込みと並び替えを行う。
+    """
+    import fsspec
+
+    fs, root = fsspec.core.url_to_fs(url, **(storage_options or {}))
+    root = root.rstrip("/")
+    files = [
+        info
+        for info in fs.find(root, detail=True).values()
+        if info.get("type", "file") == "file"
+        and should_include(info["name"], include, exclude)
+    ]
+    files.sort(key=_fs_sort_key(root, strategy))
+
+    for info in files:
+        yield fs.unstrip_protocol(info["name"])
+
+
+def _fs_sort_key(root: str, strategy: str):
+    """ローカルのスキャンと同じ順序になるソートキーを返す"""
+
+    def parts(info: dict) -> tuple[str, ...]:
+        name = info["name"]
+        if name.startswith(root):
+            name = name[len(root) :]
+        return tuple(x for x in name.split("/") if x)
+
+    if strategy in ("bfs", "bfs_name"):
+        # 浅い階層から、同じ階層はパスの辞書順
+        return lambda info: (len(parts(info)), parts(info))
+    elif strategy == "dfs":
+        # ディレクトリ内のファイルをサブディレクトリより先に返す
+        def dfs_key(info: dict):
+            p = parts(info)
+            return tuple((1, x) for x in p[:-1]) + ((0, p[-1]),)
+
+        return dfs_key
+    elif strategy == "name":
+        return lambda info: info["name"]
+    else:
+        return lambda info: (-get_mtime(info), info["name"])  # 最新のものを優先
+
+
+def get_mtime(info: dict) -> float:
+    """fsspec の info から更新時刻を取り出す（実装ごとにキーが異なる）"""
+    for key in ("mtime", "LastModified", "last_modified", "updated", "created"):
+        value = info.get(key, None)
+        if value is None:
+            continue
+        if isinstance(value, datetime):
+            return value.timestamp()
+        if isinstance(value, str):
+            try:
+                return datetime.fromisoformat(value).timestamp()
+            except ValueError:
+                continue
+        return float(value)
+    return 0.0
+
+
+def read_files(
+    paths: Iterable[str],
+    batch_size: int = 128,
+    max_concurrency: int = 32,
+    storage_options: dict | None = None,
+) -> Iterator[Tuple[str, bytes]]:
+    """ファイルの内容をスキャン順に返す
+
+    URL は batch_size 件ずつまとめて取得する。非同期ファイルシステム (s3 など) は
+    fs.cat に複数パスを渡して並行に、それ以外はスレッドで並行に読み込む。
+    storage_options は scan_files と同じく URL のファイルシステムへ渡す。
+    """
+    batch: List[str] = []
+    for path in paths:
+        if not is_url(path):
+            yield from cat_files(batch, max_concurrency, storage_options)
+            batch = []
+            with open(path, "rb") as f:
+                yield path, f.read()
+            continue
+
+        batch.append(path)
+        if len(batch) >= batch_size:
+            yield from cat_files(batch, max_concurrency, storage_options)
+            batch = []
+
+    yield from cat_files(batch, max_concurrency, storage_options)
+
+
+def cat_files(
+    urls: List[str], max_concurrency: int = 32, storage_options: dict | None = None
+) -> Iterator[Tuple[str, bytes]]:
+    """同じファイルシステム上の URL の内容を一括で取得する"""
+    if not urls:
+        return
+
+    import fsspec
+
+    fs, _ = fsspec.core.url_to_fs(urls[0], **(storage_options or {}))
+    paths = [fs._strip_protocol(url) for url in urls]
+
+    if fs.async_impl:
+        contents = fs.cat(paths, on_error="raise", batch_size=max_concurrency)
+        values = [contents[p] for p in paths]
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            values = list(executor.map(fs.cat_file, paths))
+
+    yield from zip(urls, values)
+
+
 # 使用例
 if __name__ == "__main__":
     root_directory = "./your_directory_here"
@@ -0,0 +1,165 @@
+from contextlib import contextmanager
+from itertools import islice
+
+import pytest
+
+
+class FakeCursor:
+    """FakeConnection のカーソル。実行結果の行は接続の handler (または rows) が返す"""
+
+    def __init__(self, conn, name=None):
+        self._conn = conn
+        self.name = name
+        self.itersize = 2000
+        self._rows = iter([])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        if self.name:
+            self._conn.closed_cursors.append(self.name)
+
+    def execute(self, stmt, params=None):
+        if self._conn.dead:
+            import psycopg2
+
+            raise psycopg2.OperationalError("server closed the connection")
+        self._conn.executed.append((stmt, params))
+        if self._conn.handler:
+            rows = self._conn.handler(stmt, params)
+        else:
+            rows = self._conn.rows
+        self._rows = iter(rows or [])
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def fetchmany(self, size):
+        self._conn.fetched += size
+        return list(islice(self._rows, size))
+
+    def __iter__(self):
+        for row in self._rows:
+            self._conn.fetched += 1
+            yield row
+
+    def copy_expert(self, stmt, file, size=8192):
+        while chunk := file.read(size):
+            self._conn.copied.append(chunk)
+        self._conn.executed.append((stmt, None))
+
+
+class FakeConnection:
+    """psycopg2 の接続の代わり
+
+    handler(stmt, params) を渡すと、実行した文ごとに結果の行を返せる（無ければ rows を返す）。
+    psycopg2 と同じく、with で入っている間にもう一度 with で入ると ProgrammingError になる。
+    """
+
+    autocommit = False
+
+    def __init__(self, rows=(), handler=None, **dbparams):
+        self.rows = rows
+        self.handler = handler
+        self.dbparams = dbparams
+        self.closed = 0
+        self.dead = False
+        self.entered = False
+        self.executed = []
+        self.commits = 0
+        self.fetched = 0
+        self.copied = []
+        self.cursor_names = []
+        self.closed_cursors = []
+        self.info = self
+
+    @property
+    def statements(self) -> list[str]:
+        """実行した文（文字列以外は repr）"""
+        return [x if isinstance(x, str) else repr(x) for x, _ in self.executed]
+
+    @property
+    def transaction_status(self):
+        from psycopg2 import extensions
+
+        return extensions.TRANSACTION_STATUS_IDLE
+
+    def cursor(self, name=None, cursor_factory=None):
+        self.cursor_names.append(name)
+        return FakeCursor(self, name)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self): ...
+
+    def close(self):
+        self.closed = 1
+
+    def __enter__(self):
+        if self.entered:
+            import psycopg2
+
+            raise psycopg2.ProgrammingError(
+                "the connection cannot be re-entered recursively"
+            )
+        self.entered = True
+        return self
+
+    def __exit__(self, exc_type, *args):
+        self.entered = False
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+
+class FakeDatabase:
+    """psycopg2.connect の代わりに FakeConnection を作る（handler は全接続で共有する）"""
+
+    def __init__(self):
+        self.connections: list[FakeConnection] = []
+        self.handler = None
+
+    def connect(self, *args, **kwargs):
+        conn = FakeConnection(handler=self.handle, **kwargs)
+        self.connections.append(conn)
+        return conn
+
+    def handle(self, stmt, params):
+        return self.handler(stmt, params) if self.handler else []
+
+
+@pytest.fixture
+def fake_conn():
+    """FakeConnection を作る関数"""
+    return FakeConnection
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """プールが作る接続を FakeConnection にする"""
+    import psycopg2.pool
+
+    db = FakeDatabase()
+    monkeypatch.setattr(psycopg2.pool.psycopg2, "connect", db.connect)
+    return db
+
+
+@pytest.fixture
+def patch_connect(monkeypatch):
+    """target (モジュールかオペレーター) の connect を、conn を貸すだけのものにする"""
+
+    def patch(target, conn):
+        @contextmanager
+        def connect(*args, **kwargs):
+            yield conn
+
+        monkeypatch.setattr(target, "connect", connect)
+        return conn
+
+    return patch
@@ -0,0 +1,45 @@
+import threading
+
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+
+from rctl.connectors import clients, get_client, run_scope, sessions  # noqa: E402
+
+KWARGS = {
+    "service_name": "s3",
+    "region_name": "us-east-1",
+    "aws_access_key_id": "test",
+    "aws_secret_access_key": "test",
+}
+
+
+def test_reuse():
+    with run_scope():
+        client = get_client(**KWARGS)
+        assert get_client(**dict(reversed(KWARGS.items()))) is client
+        assert get_client(**{**KWARGS, "region_name": "us-west-2"}) is not client
+
+        # 同じ認証情報ならサービスが違ってもセッションは一つ
+        get_client(**{**KWARGS, "service_name": "sts"})
+        assert len(sessions) == 2
+        assert len(clients) == 3
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(get_client(**KWARGS)))
+            for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert all(x is client for x in results)
+
+    assert len(clients) == 0
+
+
+def test_config_dict():
+    with run_scope():
+        client = get_client(**KWARGS, config={"retries": {"max_attempts": 2}})
+        assert client.meta.config.retries["total_max_attempts"] == 3
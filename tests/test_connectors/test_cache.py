@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+from rctl.connectors import ConnectorCache, filesystems, run_scope
+from rctl.modules._fsspec import FsspecDirOperator, FsspecFileOperator
+
+
+class Counter:
+    def __init__(self):
+        self.created = []
+        self.closed = []
+
+    def factory(self, *args, **kwargs):
+        time.sleep(0.01)
+        obj = (args, kwargs, len(self.created))
+        self.created.append(obj)
+        return obj
+
+    def close(self, obj):
+        self.closed.append(obj)
+
+
+def test_key_is_normalized():
+    counter = Counter()
+    cache = ConnectorCache(counter.factory, counter.close)
+    a = cache.get("s3", key="a", secret="b")
+    b = cache.get("s3", secret="b", key="a")
+    c = cache.get("s3", key="a", secret="c")
+
+    assert a is b
+    assert a is not c
+    assert len(cache) == 2
+
+
+def test_thread_safe():
+    counter = Counter()
+    cache = ConnectorCache(counter.factory, counter.close)
+    results = []
+
+    def get():
+        results.append(cache.get("memory"))
+
+    threads = [threading.Thread(target=get) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(counter.created) == 1
+    assert all(x is results[0] for x in results)
+
+
+def test_slow_factory_does_not_block_other_keys():
+    started = threading.Event()
+    release = threading.Event()
+
+    def factory(name):
+        if name == "slow":
+            started.set()
+            release.wait(5)
+        return name
+
+    cache = ConnectorCache(factory)
+    t = threading.Thread(target=cache.get, args=("slow",))
+    t.start()
+    started.wait(5)
+
+    # 生成中のキーがあっても、他のキーはすぐに取得できる
+    assert cache.get("fast") == "fast"
+    release.set()
+    t.join()
+    assert cache.get("slow") == "slow"
+
+
+def test_factory_error_is_retried():
+    calls = []
+
+    def factory(name):
+        calls.append(name)
+        if len(calls) == 1:
+            raise ConnectionError(name)
+        return name
+
+    cache = ConnectorCache(factory)
+    with pytest.raises(ConnectionError):
+        cache.get("a")
+    assert len(cache) == 0
+    assert cache.get("a") == "a"
+
+
+def test_evict_idle():
+    counter = Counter()
+    cache = ConnectorCache(counter.factory, counter.close, idle_timeout=0)
+    with cache.lease("leased") as leased:
+        cache.get("idle")
+        cache.evict_idle()
+        assert counter.closed == [counter.created[1]]
+        assert len(cache) == 1
+
+    cache.evict_idle()
+    assert counter.closed[-1] is leased
+    assert len(cache) == 0
+
+
+def test_run_scope_closes():
+    counter = Counter()
+    cache = ConnectorCache(counter.factory, counter.close)
+    with run_scope():
+        obj = cache.get("memory")
+        assert counter.closed == []
+
+    assert counter.closed == [obj]
+    assert len(cache) == 0
+
+
+def test_fsspec_operators_share_filesystem():
+    with run_scope():
+        fs1 = FsspecFileOperator(protocol="memory").get_filesystem()
+        fs2 = FsspecDirOperator(protocol="memory").get_filesystem()
+        assert fs1 is fs2
+        assert len(filesystems) == 1
+
+    assert len(filesystems) == 0
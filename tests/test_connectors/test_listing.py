@@ -0,0 +1,71 @@
+from rctl.connectors import filesystems, listings, run_scope
+from rctl.modules._fsspec import FsspecDirOperator, FsspecFileOperator
+
+ROOT = "/rctl-listing-test"
+
+
+def count_ls(monkeypatch):
+    fs = filesystems.get("memory")
+    calls = []
+    ls = fs.ls
+
+    def counting_ls(path, *args, **kwargs):
+        calls.append(path)
+        return ls(path, *args, **kwargs)
+
+    monkeypatch.setattr(fs, "ls", counting_ls)
+    return fs, calls
+
+
+def test_sibling_probes_cost_one_ls(monkeypatch):
+    with run_scope():
+        fs, calls = count_ls(monkeypatch)
+        fs.pipe({f"{ROOT}/dir/file{i}.txt": b"x" for i in range(50)})
+
+        op = FsspecFileOperator(protocol="memory")
+        for i in range(50):
+            assert op.exists(bucket=ROOT, path=f"dir/file{i}.txt")[0]
+        assert op.absent(bucket=ROOT, path="dir/missing.txt")[0]
+        assert calls == [f"{ROOT}/dir"]
+
+        ok, msg = FsspecDirOperator(protocol="memory").exists(bucket=ROOT, path="dir")
+        assert ok
+        assert calls == [f"{ROOT}/dir", ROOT]
+
+        fs.rm(ROOT, recursive=True)
+
+    assert len(listings) == 0
+
+
+def test_own_changes_invalidate(monkeypatch):
+    with run_scope():
+        fs, calls = count_ls(monkeypatch)
+        op = FsspecFileOperator(protocol="memory")
+        params = {"bucket": ROOT, "path": "new/dir/file.txt"}
+
+        assert op.absent(**params)[0]
+        assert op.create(**params)[0]
+        assert op.exists(**params)[0]
+        assert FsspecDirOperator(protocol="memory").exists(bucket=ROOT, path="new")[0]
+
+        assert op.delete(**params)[0]
+        assert op.absent(**params)[0]
+
+        fs.rm(ROOT, recursive=True)
+
+
+def test_listing_follows_filesystem():
+    with run_scope():
+        listing = listings.get("memory")
+        fs = filesystems.get("memory")
+        fs.pipe(f"{ROOT}/a.txt", b"a")
+        assert listing.exists(f"{ROOT}/a.txt")
+
+        # ファイルシステムが破棄されても、一覧は作り直されたものを使う
+        filesystems.close()
+        assert listing.isfile(f"{ROOT}/a.txt")
+        assert listing.exists(f"{ROOT}/b.txt") is False
+        assert len(filesystems) == 1
+        assert filesystems.get("memory") is not fs
+
+        fs.rm(ROOT, recursive=True)
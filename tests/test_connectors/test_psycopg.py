@@ -0,0 +1,163 @@
+import asyncio
+import sys
+import threading
+import types
+from contextlib import asynccontextmanager
+
+import pytest
+
+from rctl.connectors import run_async, run_scope
+
+
+def test_run_async():
+    async def current():
+        await asyncio.sleep(0)
+        return threading.current_thread().name
+
+    # どのスレッドから呼んでも同じバックグラウンドのイベントループで動く
+    assert run_async(current()) == "rctl-psycopg"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(run_async(current())))
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["rctl-psycopg"] * 4
+
+
+def test_plan_schemas():
+    from rctl.modules._schema import plan_schemas, schema_result
+
+    def plan(state, schemas, existing):
+        return plan_schemas(
+            state, schemas, existing, "create {}".format, "drop {}".format
+        )
+
+    assert plan("created", ["a", "b", "b"], {"a"}) == ["create b"]
+    assert plan("recreated", ["a", "b"], {"a"}) == ["drop a", "create a", "create b"]
+    assert plan("exists", ["a"], set()) == []
+    assert schema_result("absent", "a", False) == (True, "")
+
+
+class FakeAsyncCursor:
+    def __init__(self, rows):
+        self._rows = rows
+
+    async def fetchall(self):
+        return self._rows
+
+
+class FakeAsyncConnection:
+    def __init__(self, pool):
+        self._pool = pool
+        self.mode = ""
+
+    async def execute(self, stmt, params=None):
+        self._pool.executed.append((self.mode, stmt))
+        return FakeAsyncCursor(self._pool.handler(stmt, params))
+
+    @asynccontextmanager
+    async def transaction(self):
+        self.mode += "transaction "
+        yield
+
+    @asynccontextmanager
+    async def pipeline(self):
+        self.mode += "pipeline"
+        yield
+
+
+class FakeAsyncConnectionPool:
+    """psycopg_pool.AsyncConnectionPool の代わり（生成と操作はイベントループ上で行う）"""
+
+    pools = []
+
+    def __init__(self, conninfo, min_size, max_size, open=True):
+        self.conninfo = conninfo
+        self.max_size = max_size
+        self.executed = []
+        self.handler = None
+        self.threads = []
+        self.pools.append(self)
+
+    async def open(self):
+        self.threads.append(threading.current_thread().name)
+
+    async def close(self):
+        self.threads.append("closed")
+
+    @asynccontextmanager
+    async def connection(self):
+        yield FakeAsyncConnection(self)
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    """psycopg / psycopg_pool が無くても動くように、プールと SQL の組み立てを置き換える"""
+    from rctl.modules import _psycopg
+
+    conninfo = types.ModuleType("psycopg.conninfo")
+    conninfo.make_conninfo = lambda **kw: " ".join(f"{k}={v}" for k, v in kw.items())
+    psycopg = types.ModuleType("psycopg")
+    psycopg.conninfo = conninfo
+    psycopg_pool = types.ModuleType("psycopg_pool")
+    psycopg_pool.AsyncConnectionPool = FakeAsyncConnectionPool
+
+    monkeypatch.setitem(sys.modules, "psycopg", psycopg)
+    monkeypatch.setitem(sys.modules, "psycopg.conninfo", conninfo)
+    monkeypatch.setitem(sys.modules, "psycopg_pool", psycopg_pool)
+    monkeypatch.setattr(_psycopg, "compile_probe", lambda: "PROBE")
+    monkeypatch.setattr(_psycopg, "compile_create", "CREATE {}".format)
+    monkeypatch.setattr(_psycopg, "compile_drop", "DROP {}".format)
+    monkeypatch.setattr(FakeAsyncConnectionPool, "pools", [])
+    return FakeAsyncConnectionPool.pools
+
+
+def test_schema_operator(fake_pool):
+    from rctl.modules._psycopg import PsycopgSchemaOperator
+
+    existing = {"a"}
+
+    def handler(stmt, params):
+        if stmt.startswith("CREATE"):
+            existing.add(stmt.split()[-1])
+        elif stmt.startswith("DROP"):
+            existing.discard(stmt.split()[-1])
+        return [(x,) for x in params[0] if x in existing] if params else []
+
+    operator = PsycopgSchemaOperator(host="localhost", dbname="dev", user="admin")
+    with run_scope():
+        pool = operator.get_pool()
+        pool.handler = handler
+
+        results = operator.execute_batch(
+            "created", [{"schema": x} for x in ("a", "b", "c")]
+        )
+        assert results == [(True, "")] * 3
+
+        # 存在確認を一回行い、必要な DDL と再確認を一つのパイプラインで送る
+        assert pool.executed == [
+            ("", "PROBE"),
+            ("transaction pipeline", "CREATE b"),
+            ("transaction pipeline", "CREATE c"),
+            ("transaction pipeline", "PROBE"),
+        ]
+
+        assert operator.exists("b") == (True, "")
+        assert operator.delete("b") == (True, "Schema deleted.")
+        assert operator.absent("b") == (True, "")
+
+        # run の外からも、イベントループ上で非同期メソッドを重ねられる
+        async def gather():
+            return await asyncio.gather(operator.aexists("a"), operator.aabsent("z"))
+
+        assert run_async(gather()) == [(True, ""), (True, "")]
+
+    # プールはイベントループ上で一つだけ作られ、実行が終わると閉じる
+    assert fake_pool == [pool]
+    assert pool.threads == ["rctl-psycopg", "closed"]
+    assert "dbname=dev" in pool.conninfo
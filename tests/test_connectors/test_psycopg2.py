@@ -0,0 +1,110 @@
+import threading
+
+import psycopg2.pool
+import pytest
+
+from rctl.connectors import ConnectionPool, connect, pools, run_scope
+
+DBPARAMS = {"host": "localhost", "dbname": "dev", "user": "admin", "port": 5432}
+
+
+def test_reuse(fake_db):
+    connections = fake_db.connections
+    with run_scope():
+        for _ in range(3):
+            with connect(**DBPARAMS) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+
+        assert len(connections) == 1
+        assert len(pools) == 1
+
+    assert connections[0].closed
+    assert len(pools) == 0
+
+
+def test_max_size(fake_db):
+    connections = fake_db.connections
+    pool = ConnectionPool(maxconn=2, timeout=0.1, **DBPARAMS)
+    with pool.connection(), pool.connection():
+        with pytest.raises(psycopg2.pool.PoolError):
+            with pool.connection():
+                ...
+
+    results = []
+
+    def use():
+        with pool.connection() as conn:
+            results.append(conn)
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(results) == 8
+    assert len(connections) == 2
+    pool.closeall()
+
+
+def test_health_check(fake_db):
+    pool = ConnectionPool(maxconn=2, health_check_after=0, **DBPARAMS)
+    with pool.connection() as conn:
+        first = conn
+
+    # 切断された接続は取り出す時に破棄される
+    first.dead = True
+    with pool.connection() as conn:
+        assert conn is not first
+    assert first.closed
+
+    pool = ConnectionPool(maxconn=2, idle_timeout=0, **DBPARAMS)
+    with pool.connection() as conn:
+        first = conn
+    with pool.connection() as conn:
+        assert conn is not first
+    assert first.closed
+
+
+def test_schema_batch(fake_db):
+    from rctl.modules._psycopg2 import Psycopg2SchemaOperator
+
+    connections = fake_db.connections
+    existing = {"a"}
+
+    def handler(stmt, params):
+        if "CREATE SCHEMA" in repr(stmt):
+            existing.update(["b", "c"])
+        return [(x,) for x in params[0] if x in existing] if params else []
+
+    fake_db.handler = handler
+
+    operator = Psycopg2SchemaOperator(**DBPARAMS)
+    with run_scope():
+        results = operator.execute_batch(
+            "created", [{"schema": x} for x in ("a", "b", "c")]
+        )
+
+    assert results == [(True, "")] * 3
+    # 存在確認・DDL・再確認を一つの接続で行い、既存のスキーマには DDL を発行しない
+    assert len(connections) == 1
+    probe, ddl, reprobe = connections[0].statements
+    assert "Identifier('a')" not in ddl
+    assert "Identifier('b')" in ddl and "Identifier('c')" in ddl
+
+
+def test_connect_error(monkeypatch):
+    from rctl.modules._psycopg2 import Psycopg2SchemaOperator
+
+    def refuse(*args, **kwargs):
+        raise psycopg2.OperationalError("connection refused")
+
+    monkeypatch.setattr(psycopg2.pool.psycopg2, "connect", refuse)
+
+    # 接続できなければ例外ではなく (False, メッセージ) を返す
+    operator = Psycopg2SchemaOperator(**DBPARAMS)
+    with run_scope():
+        ok, msg = operator.exists("a")
+        assert not ok and "connection refused" in msg
+        assert operator.execute_batch("created", [{"schema": "a"}])[0][0] is False
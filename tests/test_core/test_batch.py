@@ -0,0 +1,70 @@
+import pytest
+
+from rctl.base import Operator
+from rctl.base2 import StepDataExtension
+from rctl.core import apply_steps
+from rctl.registry import _registry
+
+
+class BatchOperator(Operator):
+    supports_batch = True
+    calls = []
+
+    def __init__(self, url: str = ""):
+        self._url = url
+
+    def execute_batch(self, state, params_list):
+        self.calls.append((self._url, state, [x["name"] for x in params_list]))
+        return [(x["name"] != "ng", "") for x in params_list]
+
+    def absent(self, name):
+        # 一件だけのグループは通常の経路で適用される
+        self.calls.append((self._url, "absent", [name]))
+        return True, ""
+
+
+def make_step(name, state="created", url="a", type="batch"):
+    return StepDataExtension.from_dict(
+        {
+            "id": name,
+            "state": state,
+            "connector": {"url": url},
+            "module": {"type": type, "params": {"name": name}},
+        }
+    )
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    monkeypatch.setitem(_registry._map, "batch", BatchOperator)
+    monkeypatch.setattr(BatchOperator, "calls", [])
+    return BatchOperator.calls
+
+
+def test_group_consecutive(calls):
+    steps = [
+        make_step("s1"),
+        make_step("s2"),
+        make_step("s3", url="b"),
+        make_step("s4", url="b"),
+        make_step("s5", state="deleted", url="b"),
+        StepDataExtension.from_dict(
+            {"id": "t1", "state": "created", "module": {"type": "true"}}
+        ),
+        make_step("s6"),
+        make_step("s7"),
+    ]
+    apply_steps(steps)
+
+    assert calls == [
+        ("a", "created", ["s1", "s2"]),
+        ("b", "created", ["s3", "s4"]),
+        ("b", "absent", ["s5"]),
+        ("a", "created", ["s6", "s7"]),
+    ]
+
+
+def test_batch_failure(calls):
+    with pytest.raises(Exception, match="ng"):
+        apply_steps([make_step("s1"), make_step("ng")])
+    assert calls == [("a", "created", ["s1", "ng"])]
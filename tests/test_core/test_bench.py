@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from rctl.bench import bench, parse_latency, parse_per_method, percentile
+from rctl.modules.mock import per_method, sample_latency
+
+
+def test_sample_latency():
+    rng = random.Random(1)
+    assert sample_latency(None) == 0.0
+    assert sample_latency(0.5) == 0.5
+    assert sample_latency({"dist": "fixed", "mean": 0.2}) == 0.2
+    assert sample_latency({"dist": "normal", "mean": 0, "stddev": 1}, rng) >= 0
+
+    # 平均は mean に近く、最大値は平均よりずっと大きい
+    spec = {"dist": "longtail", "mean": 1.0, "alpha": 2.5}
+    samples = [sample_latency(spec, rng) for _ in range(20000)]
+    assert 0.9 < sum(samples) / len(samples) < 1.1
+    assert max(samples) > 5
+    assert min(samples) >= 0.6
+
+    with pytest.raises(ValueError):
+        sample_latency({"dist": "longtail", "mean": 1.0, "alpha": 1})
+
+
+def test_parse():
+    assert parse_latency("0.1") == {"dist": "fixed", "mean": 0.1}
+    assert parse_latency("normal:0.1,0.02") == {
+        "dist": "normal",
+        "mean": 0.1,
+        "stddev": 0.02,
+    }
+    failure_rate = parse_per_method(["0.1", "create=0.5"], float)
+    assert failure_rate == {"default": 0.1, "create": 0.5}
+    assert per_method(failure_rate, "create") == 0.5
+    assert per_method(failure_rate, "exists") == 0.1
+    assert per_method({"dist": "fixed", "mean": 1}, "create")["mean"] == 1
+    assert parse_per_method([]) is None
+
+
+def test_percentile():
+    latencies = [x / 100 for x in range(1, 101)]
+    assert percentile(latencies, 50) == pytest.approx(0.505)
+    assert percentile(latencies, 99) == pytest.approx(0.9901)
+    assert percentile([0.3], 95) == 0.3
+    assert percentile([], 95) == 0.0
+
+
+def test_bench():
+    reports = bench(
+        50,
+        concurrency=[4],
+        latency={"default": 0.001},
+        failure_rate={"create": 0.2},
+        seed=1,
+    )
+    assert [(r["executor"], r["concurrency"]) for r in reports] == [
+        ("serial", 1),
+        ("thread", 4),
+    ]
+    # seed を指定すると失敗するステップは実行方法によらず同じ
+    assert 0 < reports[0]["failed"] == reports[1]["failed"] < 50
+    for r in reports:
+        assert r["steps"] == 50
+        assert r["p50"] <= r["p95"] <= r["p99"]
+        assert r["p50"] >= 0.002
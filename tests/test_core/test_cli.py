@@ -0,0 +1,55 @@
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parents[2]
+
+# `rctl version` の累積インポート時間の上限（マイクロ秒）
+IMPORT_BUDGET_US = int(os.environ.get("RCTL_IMPORT_BUDGET_US", 300_000))
+
+# サブコマンドを実行するまでインポートしてはいけないモジュール
+HEAVY_MODULES = {
+    "boto3",
+    "botocore",
+    "psycopg2",
+    "fsspec",
+    "yaml",
+    "jinja2",
+    "hcl2",
+    "rctl.core",
+    "rctl.registry",
+}
+
+
+def run_importtime(*args: str):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "rctl", *args],
+        capture_output=True,
+        text=True,
+        cwd=ROOT_DIR,
+    )
+    assert result.returncode == 0, result.stderr
+
+    modules: dict[str, tuple[int, int]] = {}
+    for line in result.stderr.splitlines():
+        m = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)", line)
+        if m:
+            depth = len(m.group(3)) // 2
+            modules[m.group(4)] = (depth, int(m.group(2)))
+    return modules
+
+
+def test_version_import_budget():
+    modules = run_importtime("version")
+
+    assert not HEAVY_MODULES & set(modules)
+
+    cumulative = sum(us for depth, us in modules.values() if depth == 0)
+    assert cumulative < IMPORT_BUDGET_US, f"{cumulative}us > {IMPORT_BUDGET_US}us"
+
+
+def test_lazy_subcommand():
+    modules = run_importtime("resource", "--help")
+    assert "rctl.core" in modules
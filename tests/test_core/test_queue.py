@@ -0,0 +1,170 @@
+from contextlib import contextmanager
+
+from rctl import queue
+
+MANIFEST = """
+{name}:
+  state: created
+  module:
+    type: "{type}"
+"""
+
+
+def test_lock_key():
+    key = queue.lock_key("step1")
+    assert key == queue.lock_key("step1")
+    assert key != queue.lock_key("step2")
+    assert -(2**63) <= key < 2**63
+
+
+def test_apply_step():
+    assert queue.apply_step(MANIFEST.format(name="a", type="true")) == (True, "")
+    ok, msg = queue.apply_step(MANIFEST.format(name="a", type="false"))
+    assert not ok and "must be created" in msg
+
+
+def test_resource_key():
+    manifest = """
+{name}:
+  state: created
+  connector:
+    host: localhost
+  module:
+    type: psycopg2
+    params:
+      schema: {schema}
+      comment: {name}
+"""
+    a = queue.resource_key("a", manifest.format(name="a", schema="s1"))
+    b = queue.resource_key("b", manifest.format(name="b", schema="s1"))
+    c = queue.resource_key("c", manifest.format(name="c", schema="s2"))
+    # 別のステップでも対象が同じならロックのキーも同じ
+    assert a == b
+    assert a != c
+    assert queue.resource_key("d", "not: [a step") == "d"
+
+
+class FakeQueue:
+    """キューのテーブルと勧告的ロックを FakeConnection の handler で再現する"""
+
+    def __init__(self, steps, locked=(), max_attempts=3):
+        self.rows = {
+            step_id: {
+                "manifest": manifest,
+                "state": state,
+                "status": "pending",
+                "worker": None,
+                "attempts": 0,
+                "stale": False,
+            }
+            for step_id, manifest, state in steps
+        }
+        self.order = list(self.rows)
+        self.locked = {queue.lock_key(x) for x in locked}
+        self.max_attempts = max_attempts
+
+    def claimable(self, row):
+        if row["status"] == "pending":
+            return True
+        return row["status"] == "running" and row["stale"]
+
+    def handler(self, stmt, params):
+        text = repr(stmt)
+        if "RETURNING" in text:
+            claimed = [x for x in self.order if self.claimable(self.rows[x])]
+            claimed = claimed[: params["limit"]]
+            for step_id in claimed:
+                row = self.rows[step_id]
+                assert row["attempts"] < params["max_attempts"]
+                row.update(status="running", worker=params["worker"], stale=False)
+                row["attempts"] += 1
+            return [
+                (x, self.rows[x]["manifest"], self.rows[x]["state"]) for x in claimed
+            ]
+        elif "abandoned" in text:
+            for row in self.rows.values():
+                if row["stale"] and row["attempts"] >= params["max_attempts"]:
+                    row.update(status="failed", stale=False)
+            return []
+        elif "'locked'" in text:
+            run_id, step_id, worker = params
+            row = self.rows[step_id]
+            row.update(status="pending")
+            row["attempts"] -= 1
+            # 他のワーカーがロックを解放した後で取り出せるようにする
+            self.locked.clear()
+            self.order.remove(step_id)
+            self.order.append(step_id)
+            return []
+        elif "SET status" in text:
+            status, message, run_id, step_id, worker = params
+            if self.rows[step_id]["worker"] == worker:
+                self.rows[step_id]["status"] = status
+            return []
+        elif "pg_try_advisory_lock" in text:
+            return [(params[0] not in self.locked,)]
+        elif "pg_advisory_unlock" in text:
+            return [(True,)]
+        raise AssertionError(text)
+
+    @property
+    def statuses(self):
+        return {x: row["status"] for x, row in self.rows.items()}
+
+
+def test_work(monkeypatch, fake_db):
+    steps = [
+        ("a", MANIFEST.format(name="a", type="true"), None),
+        ("b", MANIFEST.format(name="b", type="false"), None),
+        ("c", MANIFEST.format(name="c", type="false"), "absent"),
+    ]
+    a = queue.resource_key(*steps[0][:2])
+    fake = FakeQueue(steps, locked={a})
+    fake_db.handler = fake.handler
+    monkeypatch.setattr(queue, "sleep", lambda x: None)
+
+    # 専用の接続で実際の claim / finish / ロックの SQL を実行する
+    counts, elapsed = queue.work("dbname=dev", batch_size=2)
+    assert counts == {"done": 1, "failed": 2, "requeued": 1}
+    assert fake.statuses == {"a": "done", "b": "failed", "c": "failed"}
+    # ロック待ちは試行回数に数えない
+    assert fake.rows["a"]["attempts"] == 1
+    # キューの接続とロックの接続の二本を使い、操作ごとにコミットして閉じる
+    assert len(fake_db.connections) == 2
+    assert all(x.commits > 1 and x.closed for x in fake_db.connections)
+
+
+def test_work_reclaims_stale(monkeypatch, fake_db):
+    steps = [
+        ("a", MANIFEST.format(name="a", type="true"), None),
+        ("b", MANIFEST.format(name="b", type="true"), None),
+    ]
+    fake = FakeQueue(steps)
+    # 落ちたワーカーが取り出したままの行
+    fake.rows["a"].update(status="running", worker="dead", attempts=1, stale=True)
+    fake.rows["b"].update(status="running", worker="dead", attempts=3, stale=True)
+    fake_db.handler = fake.handler
+
+    counts, elapsed = queue.work("dbname=dev", worker="w1")
+    assert counts == {"done": 1, "failed": 0, "requeued": 0}
+    assert fake.statuses == {"a": "done", "b": "failed"}
+    assert fake.rows["a"]["attempts"] == 2
+
+
+def test_work_scope_per_batch(monkeypatch, fake_db):
+    steps = [(x, MANIFEST.format(name=x, type="true"), None) for x in "abc"]
+    fake = FakeQueue(steps)
+    fake_db.handler = fake.handler
+    scopes = []
+
+    @contextmanager
+    def run_scope():
+        yield
+        scopes.append(sorted(x for x, y in fake.statuses.items() if y == "done"))
+
+    monkeypatch.setattr(queue, "run_scope", run_scope)
+
+    counts, elapsed = queue.work("dbname=dev", batch_size=2)
+    assert counts["done"] == 3
+    # 取り出した分ごとにキャッシュを閉じて作り直す
+    assert scopes == [["a", "b"], ["a", "b", "c"]]
@@ -0,0 +1,42 @@
+import subprocess
+import sys
+
+from rctl.modules.mock import FalseOperator, TrueOperator
+from rctl.registry import Registry, _registry
+
+
+def test_builtin_types():
+    assert _registry.get_cls("true") is TrueOperator
+    assert _registry.get_cls("false") is FalseOperator
+    assert _registry.get_cls("undefined") is None
+
+
+def test_import_on_first_use():
+    code = "\n".join(
+        [
+            "import sys",
+            "from rctl.registry import _registry",
+            "_registry.get_cls('true')",
+            "heavy = ('boto3', 'botocore', 'psycopg2', 'fsspec')",
+            "print(','.join(m for m in heavy if m in sys.modules))",
+        ]
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == ""
+
+
+def test_entry_point(tmp_path, monkeypatch):
+    dist = tmp_path / "rctl_plugin-0.1.dist-info"
+    dist.mkdir()
+    (dist / "METADATA").write_text("Name: rctl-plugin\nVersion: 0.1\n")
+    (dist / "entry_points.txt").write_text(
+        "[rctl.operators]\nplugin = rctl.modules.mock:FalseOperator\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    registry = Registry({"true": "rctl.modules.mock:TrueOperator"})
+    assert registry.get_cls("true") is TrueOperator
+    assert registry.get_cls("plugin") is FalseOperator
+    assert Registry({}, group=None).get_cls("plugin") is None
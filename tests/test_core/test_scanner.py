@@ -0,0 +1,111 @@
+import os
+
+import fsspec
+import pytest
+from fsspec.implementations.memory import MemoryFileSystem
+
+from rctl.scanner import read_files, scan_files
+
+TREE = {
+    "b.yml": b"b",
+    "a.yml": b"a",
+    "skip.txt": b"skip",
+    "x/c.yml": b"c",
+    "x/y/d.yml": b"d",
+    "w/e.yaml": b"e",
+}
+
+
+@pytest.fixture
+def memory_root():
+    fs = fsspec.filesystem("memory")
+    root = "/rctl-scanner-test"
+    fs.pipe({f"{root}/{k}": v for k, v in TREE.items()})
+    yield f"memory://{root}"
+    fs.rm(root, recursive=True)
+
+
+@pytest.fixture
+def local_root(tmp_path):
+    for k, v in TREE.items():
+        p = tmp_path / k
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_bytes(v)
+    return str(tmp_path)
+
+
+def relative(paths, root):
+    return [p[len(root) :].lstrip("/") for p in paths]
+
+
+@pytest.mark.parametrize("strategy", ["bfs", "bfs_name", "name"])
+def test_scan_url_same_order_as_local(strategy, memory_root, local_root):
+    include = ["*.yml", "*.yaml"]
+    local = scan_files(local_root, strategy=strategy, include=include)
+    remote = scan_files(memory_root, strategy=strategy, include=include)
+
+    assert relative(remote, memory_root) == relative(local, local_root)
+
+
+def test_scan_url_dfs(memory_root):
+    result = scan_files(memory_root, strategy="dfs", exclude=["*.txt"])
+    assert relative(result, memory_root) == [
+        "a.yml",
+        "b.yml",
+        "w/e.yaml",
+        "x/c.yml",
+        "x/y/d.yml",
+    ]
+
+
+def test_scan_invalid_strategy(memory_root):
+    with pytest.raises(ValueError):
+        scan_files(memory_root, strategy="unknown")
+
+
+def test_read_files(memory_root, local_root):
+    urls = list(scan_files(memory_root, include=["*.yml"]))
+    contents = dict(read_files(urls, batch_size=2))
+    assert list(contents) == urls
+    assert relative(contents, memory_root) == ["a.yml", "b.yml", "x/c.yml", "x/y/d.yml"]
+    assert list(contents.values()) == [b"a", b"b", b"c", b"d"]
+
+    paths = [os.path.join(local_root, "a.yml"), urls[1]]
+    assert [v for _, v in read_files(paths)] == [b"a", b"b"]
+
+
+class TokenFileSystem(MemoryFileSystem):
+    """token が無いと使えないリモートの代わり"""
+
+    protocol = "rctltoken"
+
+    def __init__(self, token=None, **kwargs):
+        if token != "secret":
+            raise PermissionError("token is required")
+        super().__init__(**kwargs)
+
+    @classmethod
+    def _strip_protocol(cls, path):
+        return super()._strip_protocol(path.replace("rctltoken://", "memory://"))
+
+
+def test_storage_options(memory_root, capsys):
+    from rctl.core import load_steps, show_shard_report
+
+    fsspec.register_implementation("rctltoken", TokenFileSystem, clobber=True)
+    url = memory_root.replace("memory://", "rctltoken://")
+    options = {"token": "secret"}
+
+    urls = list(scan_files(url, include=["*.yml"], storage_options=options))
+    contents = dict(read_files(urls, storage_options=options))
+    assert list(contents.values()) == [b"a", b"b", b"c", b"d"]
+    with pytest.raises(PermissionError):
+        list(read_files(urls))
+
+    fs = fsspec.filesystem("memory")
+    fs.pipe(f"{memory_root[len('memory://') :]}/m/step.yml", b"s1:\n  state: created\n")
+    steps = list(load_steps(from_dir=f"{url}/m", storage_options=options))
+    assert [x._step["id"] for x in steps] == ["s1"]
+
+    show_shard_report(from_dir=f"{url}/m", shard="1/2", storage_options=options)
+    assert "total: 1" in capsys.readouterr().out
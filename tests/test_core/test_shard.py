@@ -0,0 +1,47 @@
+import pytest
+
+from rctl.core import load_steps, parse_shard, shard_of, show_shard_report
+
+
+def test_parse_shard():
+    assert parse_shard("3/8") == (3, 8)
+    for shard in ("0/8", "9/8", "3", "a/b"):
+        with pytest.raises(ValueError):
+            parse_shard(shard)
+
+
+def test_shard_of():
+    ids = [f"step{i}" for i in range(10_000)]
+    shards = [shard_of(x, 8) for x in ids]
+    assert shards == [shard_of(x, 8) for x in ids]
+
+    # 均等に分かれる
+    for i in range(1, 9):
+        assert 0.9 < shards.count(i) / (len(ids) / 8) < 1.1
+
+    # シャードを増やしても移動するのは新しいシャードに割り当てられたものだけ
+    moved = [a != b for a, b in zip(shards, (shard_of(x, 9) for x in ids))]
+    assert 0.08 < sum(moved) / len(ids) < 0.14
+    assert all(shard_of(x, 9) == 9 for x, m in zip(ids, moved) if m)
+
+
+def test_load_steps(tmp_path, capsys):
+    for i in range(20):
+        (tmp_path / f"step{i}.yml").write_text(
+            f'step{i}:\n  state: created\n  module:\n    type: "true"\n'
+        )
+
+    ids = [
+        [x._step["id"] for x in load_steps(from_dir=str(tmp_path), shard=f"{i}/3")]
+        for i in (1, 2, 3)
+    ]
+    assert sorted(sum(ids, [])) == sorted(f"step{i}" for i in range(20))
+
+    show_shard_report(from_dir=str(tmp_path), shard="1/3")
+    out = capsys.readouterr().out
+    assert f"1/3: {len(ids[0])}" in out
+    assert "total: 20" in out
+
+    # シャード数が無ければ何も分からないので失敗する
+    with pytest.raises(ValueError):
+        show_shard_report(from_dir=str(tmp_path))
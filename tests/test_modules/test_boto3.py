@@ -0,0 +1,162 @@
+import json
+
+import pytest
+
+pytest.importorskip("boto3")
+
+from botocore.stub import Stubber  # noqa: E402
+
+from rctl.base import execute  # noqa: E402
+from rctl.connectors import get_client, run_scope  # noqa: E402
+from rctl.modules._boto3 import (  # noqa: E402
+    PolicyController,
+    desired_policy,
+    normalize_policy,
+)
+
+KWARGS = {
+    "service_name": "s3",
+    "region_name": "us-east-1",
+    "aws_access_key_id": "test",
+    "aws_secret_access_key": "test",
+}
+
+# S3 が返す形式（一要素のリストは文字列、{"AWS": ["*"]} は "*" になる）
+CURRENT = {
+    "Version": "2012-10-17",
+    "Statement": [
+        {
+            "Effect": "Allow",
+            "Principal": "*",
+            "Action": [
+                "s3:ListMultipartUploadParts",
+                "s3:GetObject",
+                "s3:DeleteObject",
+                "s3:AbortMultipartUpload",
+                "s3:PutObject",
+            ],
+            "Resource": "arn:aws:s3:::b1/*",
+        },
+        {
+            "Effect": "Allow",
+            "Principal": {"AWS": "*"},
+            "Action": [
+                "s3:ListBucketMultipartUploads",
+                "s3:ListBucket",
+                "s3:GetBucketLocation",
+            ],
+            "Resource": "arn:aws:s3:::b1",
+        },
+    ],
+}
+
+
+def test_normalize_policy():
+    assert normalize_policy(CURRENT) == desired_policy("s3", "b1", "public")
+    assert normalize_policy(CURRENT) != desired_policy("s3", "b2", "public")
+    assert normalize_policy(CURRENT) != desired_policy("s3", "b1", "private")
+
+
+def test_reapply_without_write():
+    with run_scope():
+        stubber = Stubber(get_client(**KWARGS))
+        for bucket in ("b1", "b1"):
+            stubber.add_response(
+                "get_bucket_policy",
+                {"Policy": json.dumps(CURRENT)},
+                {"Bucket": bucket},
+            )
+
+        operator = PolicyController(**KWARGS)
+        params = {"bucket_name": "b1", "policy_name": "public"}
+        with stubber:
+            # 同じポリシーなら読み込みだけで、put_bucket_policy は呼ばない
+            assert execute(operator, "created", params)[0]
+            assert not operator.absent(**params)[0]
+        stubber.assert_no_pending_responses()
+
+
+def test_policy_absent(monkeypatch):
+    calls = []
+
+    def get_policy(self, bucket_name):
+        calls.append(bucket_name)
+        return False, "NoSuchBucketPolicy"
+
+    monkeypatch.setattr(PolicyController, "get_policy", get_policy)
+    operator = PolicyController(**KWARGS)
+    assert operator.absent(bucket_name="b", policy_name="public") == (True, None)
+    assert calls == ["b"]
+
+
+def test_bucket_waiter(monkeypatch):
+    from rctl.base import ResourceController
+
+    with run_scope():
+        stubber = Stubber(get_client(**KWARGS))
+        bucket = {"Bucket": "b1"}
+        stubber.add_client_error(
+            "head_bucket", "404", http_status_code=404, expected_params=bucket
+        )
+        stubber.add_response("create_bucket", {}, bucket)
+        # waiter (bucket_exists) は存在するまで head_bucket を繰り返す
+        stubber.add_client_error(
+            "head_bucket", "404", http_status_code=404, expected_params=bucket
+        )
+        ok = {"ResponseMetadata": {"HTTPStatusCode": 200}}
+        stubber.add_response("head_bucket", ok, bucket)
+        stubber.add_response("head_bucket", ok, bucket)
+
+        operator = PolicyController.get_operator("bucket")(
+            **KWARGS, waiter_delay=0, waiter_max_attempts=3
+        )
+        # waiter があれば wait_time は使わない
+        monkeypatch.setattr(ResourceController, "__init__", init_without_wait)
+        with stubber:
+            assert execute(operator, "created", {"bucket_name": "b1"}) == (True, "")
+        stubber.assert_no_pending_responses()
+
+    assert operator.get_waiter("exists") is None
+
+
+def init_without_wait(self, resource, wait_time):
+    self._resource = resource
+    self._wait_time = 3600
+
+
+def test_objects_plan(tmp_path):
+    import hashlib
+
+    from rctl.modules._boto3 import ObjectsController, file_etag
+
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "a.txt").write_bytes(b"a" * 100)
+    (tmp_path / "sub" / "b.txt").write_bytes(b"b" * 100)
+
+    md5 = hashlib.md5(b"a" * 100)
+    assert file_etag(tmp_path / "a.txt", 100, 1000, 10) == md5.hexdigest()
+    # パートサイズは s3transfer と同じく最小 5MiB に切り上げるので 1 パートになる
+    multipart = hashlib.md5(md5.digest()).hexdigest() + "-1"
+    assert file_etag(tmp_path / "a.txt", 100, 10, 10) == multipart
+
+    with run_scope():
+        stubber = Stubber(get_client(**KWARGS))
+        contents = [
+            {"Key": "p/a.txt", "Size": 100, "ETag": f'"{md5.hexdigest()}"'},
+            {"Key": "p/sub/b.txt", "Size": 100, "ETag": f'"{md5.hexdigest()}"'},
+        ]
+        stubber.add_response(
+            "list_objects_v2",
+            {"Contents": contents, "IsTruncated": False},
+            {"Bucket": "b1", "Prefix": "p/"},
+        )
+        with stubber:
+            controller = ObjectsController(**KWARGS)
+            uploads, skipped = controller.plan(
+                "b1", str(tmp_path), "p/", 8 * 1024 * 1024, 8 * 1024 * 1024
+            )
+        stubber.assert_no_pending_responses()
+
+    # a.txt は同じ内容なので転送しない
+    assert [x[0] for x in uploads] == ["p/sub/b.txt"]
+    assert skipped == 1
@@ -0,0 +1,241 @@
+import os
+from tempfile import TemporaryDirectory
+
+import fsspec
+import pytest
+from fsspec.implementations.asyn_wrapper import AsyncFileSystemWrapper
+
+from rctl.connectors import close_all, filesystems, run_scope
+from rctl.modules._fsspec import (
+    FsspecFileOperator,
+    FsspecFilesOperator,
+    FsspecTreeOperator,
+    bulk_exists,
+    bulk_info,
+    bulk_pipe,
+    multipart_etag,
+    plan_sync,
+    same_file,
+)
+
+SOURCE = "/rctl-tree-source"
+
+
+@pytest.fixture
+def source():
+    fs = fsspec.filesystem("memory")
+    fs.pipe(
+        {
+            f"{SOURCE}/a.yml": b"a",
+            f"{SOURCE}/conf/b.yml": b"bb",
+            f"{SOURCE}/conf/deep/c.yml": b"ccc",
+        }
+    )
+    yield fs, f"memory://{SOURCE}"
+    fs.rm(SOURCE, recursive=True)
+
+
+def test_tree(source, monkeypatch):
+    src_fs, url = source
+
+    with TemporaryDirectory() as td, run_scope():
+        op = FsspecTreeOperator(protocol="local").to_executor()
+        params = {"source": url, "bucket": td, "path": "tree", "prune": True}
+
+        assert not op.exists(**params)
+        assert op.absent(**params)
+        assert op.created(**params)
+        assert op.exists(**params)
+        with open(f"{td}/tree/conf/deep/c.yml") as f:
+            assert f.read() == "ccc"
+
+        # 変更のないツリーは書き込まない（識別子の無いローカルは md5 で比べる）
+        fs = filesystems.get("local")
+        opened = []
+        fs_open = fs.open
+        fs.open = lambda path, mode="rb", **kwargs: (
+            opened.append(mode) or fs_open(path, mode, **kwargs)
+        )
+        assert op.created(**params)
+        assert "wb" not in opened
+        del fs.open
+
+        src_fs.pipe(f"{SOURCE}/conf/b.yml", b"changed")
+        with open(f"{td}/tree/extra.yml", "w") as f:
+            f.write("extra")
+        assert not op.exists(**params)
+        assert op.created(**params)
+        assert op.exists(**params)
+        with open(f"{td}/tree/conf/b.yml") as f:
+            assert f.read() == "changed"
+        assert not fs.exists(f"{td}/tree/extra.yml")
+
+        assert op.deleted(**params)
+        assert op.absent(**params)
+
+
+def test_plan_sync_same_size():
+    fs = fsspec.filesystem("memory")
+    fs.pipe({"/rctl-sync/src/a.txt": b"aa", "/rctl-sync/dst/a.txt": b"bb"})
+    try:
+        # 識別子が無くても、サイズが同じで内容の違うファイルはコピーする
+        args = (fs, "/rctl-sync/src", fs, "/rctl-sync/dst")
+        assert plan_sync(*args, checksum=False) == (["a.txt"], [])
+        fs.pipe("/rctl-sync/dst/a.txt", b"aa")
+        assert plan_sync(*args, checksum=False) == ([], [])
+    finally:
+        fs.rm("/rctl-sync", recursive=True)
+
+
+class Unreadable:
+    """読み込まれたら失敗するファイルシステム（大きいオブジェクトのダウンロードの代わり）"""
+
+    def open(self, *args, **kwargs):
+        raise AssertionError("downloaded")
+
+
+def test_same_file_multipart():
+    fs = fsspec.filesystem("memory")
+    fs.pipe("/rctl-multipart/a.bin", b"abcdefghij")
+    try:
+        src = fs.info("/rctl-multipart/a.bin")
+        etag = multipart_etag(fs, src["name"], 4)
+        assert etag.endswith("-3")
+
+        # 同じパートの大きさで計算した ETag と比べ、コピー先は読み込まない
+        dst = {"name": "b.bin", "size": 10, "ETag": f'"{etag}"'}
+        assert same_file(fs, src, Unreadable(), dst, False, chunk_size=4)
+        fs.pipe("/rctl-multipart/a.bin", b"abcdefghiJ")
+        assert not same_file(fs, src, Unreadable(), dst, False, chunk_size=4)
+
+        # パートの分け方が分からなければ、checksum を指定した時だけ読み込む
+        dst["ETag"] = "0123-7"
+        assert not same_file(fs, src, Unreadable(), dst, False, chunk_size=4)
+        with pytest.raises(AssertionError, match="downloaded"):
+            same_file(fs, src, Unreadable(), dst, True, chunk_size=4)
+    finally:
+        fs.rm("/rctl-multipart", recursive=True)
+
+
+def test_file_content(monkeypatch):
+    with TemporaryDirectory() as td, run_scope():
+        op = FsspecFileOperator(protocol="local").to_executor()
+        params = {"bucket": td, "path": "conf/app.yml", "content": "v1"}
+
+        assert op.created(**params)
+        assert op.exists(**params)
+        assert op.exists(bucket=td, path="conf/app.yml")
+
+        # 書き込んだ内容のダイジェストは覚えているので、確認で読み込まない
+        fs = filesystems.get("local")
+        with monkeypatch.context() as m:
+            m.setattr(fs, "open", None)
+            assert op.created(**params)
+
+        params["content"] = "v2"
+        assert not op.exists(**params)
+        assert op.created(**params)
+        assert op.exists(**params)
+        assert fs.ls(f"{td}/conf", detail=False) == [f"{td}/conf/app.yml"]
+        with open(f"{td}/conf/app.yml") as f:
+            assert f.read() == "v2"
+
+        # 外部で同じサイズの内容に書き換えられた場合も検知する
+        with open(f"{td}/conf/app.yml", "w") as f:
+            f.write("v3")
+        close_all()  # 次の実行
+        assert not op.exists(**params)
+        assert op.created(**params)
+        with open(f"{td}/conf/app.yml") as f:
+            assert f.read() == "v2"
+
+
+def test_file_source(source, monkeypatch):
+    src_fs, url = source
+    calls = []
+    copy_file_range = os.copy_file_range
+
+    def counting_copy_file_range(src, dst, count, *args):
+        calls.append(count)
+        return copy_file_range(src, dst, count, *args)
+
+    monkeypatch.setattr(os, "copy_file_range", counting_copy_file_range)
+
+    with TemporaryDirectory() as td, run_scope():
+        op = FsspecFileOperator(protocol="local").to_executor()
+        params = {"bucket": td, "path": "a.yml", "source": f"{url}/conf/b.yml"}
+        assert not op.exists(**params)
+        assert op.created(**params)
+        assert op.exists(**params)
+        assert op.exists(**params, checksum=True)
+
+        # 同じサイズの内容に変わったソースも検知する
+        src_fs.pipe(f"{SOURCE}/conf/b.yml", b"BB")
+        assert not op.exists(**params)
+        assert op.created(**params)
+        with open(f"{td}/a.yml") as f:
+            assert f.read() == "BB"
+
+        data = os.urandom(3 * 1024 + 1)
+        with open(f"{td}/large.bin", "wb") as f:
+            f.write(data)
+
+        params = {"bucket": td, "path": "copy.bin", "source": f"{td}/large.bin"}
+        assert op.created(**params, chunk_size=1024)
+        with open(f"{td}/copy.bin", "rb") as f:
+            assert f.read() == data
+        assert calls == [1024, 1024, 1024, 1]
+        assert sorted(os.listdir(td)) == ["a.yml", "copy.bin", "large.bin"]
+
+
+def test_file_chunk_size(source, monkeypatch):
+    from rctl.modules import _fsspec
+
+    _, url = source
+    monkeypatch.setattr(_fsspec, "OBJECT_STORE_PROTOCOLS", {"memory"})
+    with run_scope():
+        op = FsspecFileOperator(protocol="memory")
+        params = {"bucket": "/rctl-chunk", "path": "a.yml", "source": f"{url}/a.yml"}
+        # マルチパートのパートの最小サイズ (5MiB) 未満は書き込む前に拒否する
+        with pytest.raises(ValueError):
+            op.create(**params, chunk_size=1024)
+        assert op.absent(**params) == (True, "")
+        assert op.create(**params) == (True, "")
+        assert op.delete(**params) == (True, "")
+
+
+def test_bulk_async():
+    fs = AsyncFileSystemWrapper(fsspec.filesystem("memory"))
+    root = "/rctl-bulk-test"
+    items = [(f"{root}/dir{i % 3}/file{i}.txt", str(i).encode()) for i in range(20)]
+
+    assert not any(bulk_exists(fs, [p for p, _ in items]))
+    bulk_pipe(fs, items, max_concurrency=4)
+    assert all(bulk_exists(fs, [p for p, _ in items]))
+    assert [x["size"] for x in bulk_info(fs, [p for p, _ in items])] == [
+        len(data) for _, data in items
+    ]
+    assert bulk_info(fs, [f"{root}/missing"]) == [None]
+
+    fs.rm(root, recursive=True)
+
+
+def test_files():
+    with TemporaryDirectory() as td, run_scope():
+        op = FsspecFilesOperator(protocol="local").to_executor()
+        files = {f"dir{i % 3}/file{i}.txt": str(i) for i in range(20)}
+        params = {"bucket": td, "files": files}
+
+        assert not op.exists(**params)
+        assert op.absent(**params)
+        assert op.created(**params)
+        assert op.exists(**params)
+
+        files["dir0/file0.txt"] = "changed"
+        assert not op.exists(**params)
+        assert op.created(**params)
+        with open(f"{td}/dir0/file0.txt") as f:
+            assert f.read() == "changed"
+
+        assert op.deleted(**params)
+        assert op.absent(**params)
@@ -0,0 +1,72 @@
+import io
+
+import fsspec
+
+from rctl.modules import _psycopg2
+from rctl.modules._psycopg2 import (
+    NdjsonCsvStream,
+    Psycopg2Operator,
+    ndjson_to_csv,
+    seed_token,
+)
+
+
+def test_ndjson_stream():
+    f = io.BytesIO(
+        b'{"id": 1, "name": "a,b", "tags": ["x"]}\n\n{"id": 2, "flag": true}\n'
+    )
+    stream = io.BufferedReader(NdjsonCsvStream(f, ["id", "name", "tags", "flag"]))
+    assert stream.read() == b'"1","a,b","[""x""]",\r\n"2",,,"true"\r\n'
+
+
+def test_ndjson_stream_chunks():
+    f = io.BytesIO(b"".join(b'{"id": %d}\n' % i for i in range(1000)))
+    stream = NdjsonCsvStream(f, ["id"])
+    chunks = iter(lambda: stream.read(7), b"")
+    assert b"".join(chunks) == b"".join(b'"%d"\r\n' % i for i in range(1000))
+
+
+def test_ndjson_empty_string():
+    # 空文字は引用符で囲み、null だけを引用符の無い空（COPY で NULL）にする
+    assert ndjson_to_csv(b'{"a": "", "b": null}', ["a", "b"]) == b'"",\r\n'
+
+
+def test_table_data(monkeypatch, fake_conn, patch_connect):
+    fs = fsspec.filesystem("memory")
+    fs.pipe_file("/rctl-seed/users.csv", b"id,name\n1,a\n2,b\n")
+    stored = [None]
+
+    def handler(stmt, params):
+        if "COMMENT ON TABLE" in repr(stmt):
+            stored[0] = params[0] if params else None
+        return [(stored[0],)]
+
+    conn = patch_connect(_psycopg2, fake_conn(handler=handler))
+    monkeypatch.setattr(
+        "psycopg2.sql.Composed.as_string", lambda self, context: repr(self)
+    )
+    operator = Psycopg2Operator.get_operator("table_data")(
+        host="localhost", dbname="dev", user="admin"
+    )
+    params = {"table": "ref.users", "source": "memory://rctl-seed/users.csv"}
+
+    assert not operator.exists(**params)[0]
+    assert operator.create(**params, chunk_size=4)[0]
+    assert b"".join(conn.copied) == b"id,name\n1,a\n2,b\n"
+    assert len(conn.copied) > 1
+
+    # 一時テーブルに COPY してから、同じトランザクションで入れ替える
+    create, copy, swap, comment = conn.statements[1:]
+    assert "CREATE TEMP TABLE" in create
+    assert "COPY" in copy and "rctl_seed_stage" in copy
+    assert "TRUNCATE" in swap and "INSERT INTO" in swap
+    assert "COMMENT ON TABLE" in comment
+
+    # 内容が変わらなければ投入済みとみなし、変われば投入し直す
+    assert operator.exists(**params) == (True, "")
+    assert stored[0] == seed_token(**params)
+    fs.pipe_file("/rctl-seed/users.csv", b"id,name\n1,a\n")
+    assert not operator.exists(**params)[0]
+
+    assert operator.delete(**params)[0]
+    assert operator.absent(**params) == (True, "")
@@ -0,0 +1,323 @@
+import asyncio
+import time
+
+import pytest
+
+from rctl.base import Operator
+from rctl.connectors import run_scope
+from rctl.modules._risingwave import (
+    RisingwaveOperator,
+    RisingwaveSourceOperator,
+    RisingwaveSyncOperator,
+)
+
+
+@pytest.fixture
+def make_operator(fake_conn, patch_connect):
+    def make(rows=(), handler=None, **kwargs):
+        operator = RisingwaveOperator(
+            host="localhost", dbname="dev", user="root", **kwargs
+        )
+        conn = patch_connect(operator, fake_conn(rows, handler))
+        return operator, conn
+
+    return make
+
+
+def test_all_streams(make_operator):
+    operator, conn = make_operator([{"id": i} for i in range(10_000)], itersize=100)
+    rows = operator.all("SELECT * FROM t")
+    # 名前付きカーソル（サーバーサイドカーソル）で読む
+    assert all(conn.cursor_names)
+
+    assert next(rows) == {"id": 0}
+    assert conn.fetched == 1
+    rows.close()
+    assert len(conn.closed_cursors) == 1
+
+
+def test_single_row_helpers(make_operator):
+    operator, conn = make_operator([{"id": i} for i in range(10_000)])
+    assert operator.first_or_none("SELECT * FROM t") == {"id": 0}
+    assert operator.row_exists("SELECT * FROM t")
+    assert conn.fetched == 2
+
+    operator, conn = make_operator([])
+    assert operator.first_or_none("SELECT * FROM t") is None
+    assert operator.one_or_none("SELECT * FROM t") is None
+    assert not operator.row_exists("SELECT * FROM t")
+
+
+def test_catalog_snapshot(monkeypatch):
+    rows = [
+        {"kind": "source", "schema_name": "public", "name": "Src"},
+        {"kind": "sink", "schema_name": "public", "name": "snk"},
+        {"kind": "schema", "schema_name": "public", "name": "public"},
+    ]
+    loaded, executed = [], []
+    monkeypatch.setattr(
+        RisingwaveOperator, "all", lambda self, stmt: loaded.append(stmt) or rows
+    )
+    monkeypatch.setattr(
+        RisingwaveOperator,
+        "execute",
+        lambda self, stmt: executed.append(stmt) or (True, ""),
+    )
+
+    with run_scope():
+        source = RisingwaveSourceOperator(host="localhost", dbname="dev", user="root")
+        sink = RisingwaveSyncOperator(host="localhost", dbname="dev", user="root")
+        assert source.exists("src") == (True, "")
+        assert source.absent("snk") == (True, "")
+        assert sink.exists("SNK") == (True, "")
+
+        # 自分の DDL はスナップショットに反映され、読み直さない
+        assert sink.delete("snk") == (True, "")
+        assert sink.absent("snk") == (True, "")
+        assert source.create("src2", {"connector": "datagen"}) == (True, "")
+        assert source.exists("src2") == (True, "")
+        assert len(loaded) == 1
+
+    assert "DROP SINK IF EXISTS snk" in repr(executed[0])
+
+    # 実行が終わるとスナップショットは破棄される
+    with run_scope():
+        source.exists("src")
+    assert len(loaded) == 2
+
+
+def subscription_handler(rows):
+    """DECLARE ... SUBSCRIPTION CURSOR と FETCH を再現する"""
+    pending = []
+
+    def handler(stmt, params):
+        text = repr(stmt)
+        if "DECLARE" in text:
+            # SINCE は指定した時刻の行を含む
+            since = stmt.seq[-1].wrapped if "SINCE" in text else 0
+            pending[:] = [x for x in rows if x["rw_timestamp"] >= since]
+        elif "FETCH" in text:
+            size = stmt.seq[1].wrapped
+            result = pending[:size]
+            del pending[:size]
+            return result
+        return []
+
+    return handler
+
+
+ROWS = [
+    {"id": 0, "rw_timestamp": 100},
+    {"id": 1, "rw_timestamp": 100},
+    {"id": 2, "rw_timestamp": 200},
+    {"id": 3, "rw_timestamp": 200},
+    {"id": 4, "rw_timestamp": 200},
+    {"id": 5, "rw_timestamp": 300},
+]
+
+
+def test_consume_resume(make_operator):
+    operator, conn = make_operator(handler=subscription_handler(ROWS))
+    checkpoint = "memory://rctl-test/consumer.json"
+    kwargs = {"batch_size": 3, "checkpoint": checkpoint}
+
+    consumed = []
+    for row in operator.consume("sub", **kwargs):
+        consumed.append(row["id"])
+        if len(consumed) == 4:
+            break
+    assert consumed == [0, 1, 2, 3]
+    assert any("CLOSE" in x for x in conn.statements)
+
+    # 読み終えたバッチ（0, 1, 2）の続きから読み、途中のバッチは再送される
+    consumed = [row["id"] for row in operator.consume("sub", **kwargs)]
+    assert consumed == [3, 4, 5]
+    assert [row["id"] for row in operator.consume("sub", **kwargs)] == []
+
+
+def test_consume_async(make_operator):
+    operator, conn = make_operator(handler=subscription_handler(ROWS))
+
+    async def consume():
+        return [row["id"] async for row in operator.consume("sub", batch_size=4)]
+
+    assert asyncio.run(consume()) == [0, 1, 2, 3, 4, 5]
+    assert conn.autocommit is False
+
+
+def test_materialized_view_background(monkeypatch, fake_conn, patch_connect):
+    from rctl.modules import _risingwave
+
+    operator = RisingwaveOperator.get_operator("materialized_view")(
+        host="localhost", dbname="dev", user="root"
+    )
+    conn = patch_connect(operator, fake_conn())
+    progress = ["10.00%", "55.00%", None]
+    monkeypatch.setattr(
+        operator,
+        "first_or_none",
+        lambda stmt, params: {"progress": progress[0]} if progress[0] else None,
+    )
+    monkeypatch.setattr(RisingwaveOperator, "all", lambda self, stmt: [])
+    slept = []
+
+    def fake_sleep(delay):
+        slept.append(delay)
+        progress.pop(0)
+
+    monkeypatch.setattr(_risingwave, "sleep", fake_sleep)
+
+    with run_scope():
+        # wait=False なら DDL を発行してすぐに戻り、バックフィル中も存在するとみなす
+        ok, msg = operator.create("mv", "SELECT 1", wait=False)
+        assert ok
+        assert operator.exists("mv", wait=False) == (
+            True,
+            "Backfilling public.mv: 10.00%",
+        )
+        assert not operator.exists("mv")[0]
+
+        assert operator.create("mv", "SELECT 1") == (True, "Created.")
+        assert slept == [0.5, 1.0]
+        assert operator.exists("mv") == (True, "")
+
+    assert conn.statements[0] == "SET BACKGROUND_DDL = true"
+    assert "CREATE MATERIALIZED VIEW IF NOT EXISTS mv AS SELECT 1" in conn.statements[1]
+    assert conn.statements[2] == "SET BACKGROUND_DDL = false"
+    assert conn.autocommit is False
+
+    # 借りた時の autocommit に戻す
+    conn.autocommit = True
+    with run_scope():
+        progress[:] = [None]
+        assert operator.create("mv2", "SELECT 1") == (True, "Created.")
+    assert conn.autocommit is True
+
+
+PIPELINE = [
+    {"kind": "sync", "name": "snk", "_from": "mv_total", "with_option": {}},
+    {"kind": "source", "name": "src", "with_option": {}},
+    {"kind": "table", "name": "orders", "definition": "(id int) FROM src TABLE 'o'"},
+    {"kind": "table", "name": "users", "definition": "(id int) FROM src TABLE 'u'"},
+    {
+        "kind": "materialized_view",
+        "name": "mv_total",
+        "query": "SELECT * FROM public.orders o JOIN Users u ON o.id = u.id",
+    },
+]
+
+
+def test_pipeline_dag():
+    from rctl.modules._risingwave import make_pipeline_dag
+
+    dag = make_pipeline_dag(PIPELINE)
+    assert set(dag.edges) == {
+        ("src", "orders"),
+        ("src", "users"),
+        ("orders", "mv_total"),
+        ("users", "mv_total"),
+        ("mv_total", "snk"),
+    }
+
+    with pytest.raises(ValueError):
+        make_pipeline_dag(
+            [
+                {"kind": "view", "name": "a", "query": "SELECT * FROM b"},
+                {"kind": "view", "name": "b", "query": "SELECT * FROM a"},
+            ]
+        )
+
+
+def test_find_references():
+    from rctl.modules._risingwave import find_references
+
+    query = (
+        "SELECT EXTRACT(YEAR FROM ts), SUBSTRING(s FROM 1 FOR 2), TRIM(BOTH FROM s)"
+        ' FROM public.orders o JOIN "Users" u ON o.id = u.id'
+        " WHERE o.id IN (SELECT id FROM banned)"
+        " AND COALESCE((SELECT 1 FROM flags), 0) = 1"
+    )
+    # 関数の引数の FROM は参照ではない（引数の中のサブクエリは参照）
+    assert list(find_references(query)) == ["orders", "Users", "banned", "flags"]
+    assert list(find_references("SELECT 'FROM x' FROM (a JOIN b ON true)")) == [
+        "a",
+        "b",
+    ]
+
+
+def test_pipeline_width(monkeypatch):
+    from rctl.modules._risingwave import dag_width, make_pipeline_dag
+
+    assert dag_width(make_pipeline_dag(PIPELINE)) == 2
+
+    # 幅の広いパイプラインはプールの大きさではなく DAG の幅だけ並行する
+    wide = [{"kind": "source", "name": "src", "with_option": {}}] + [
+        {"kind": "table", "name": f"t{i}", "definition": "(id int) FROM src"}
+        for i in range(20)
+    ]
+    assert dag_width(make_pipeline_dag(wide)) == 20
+
+    log = {"order": [], "created": set()}
+    pool_sizes = set()
+
+    def get_sibling(self, type, pool_size=None):
+        pool_sizes.add(pool_size)
+        return SlowOperator(log)
+
+    monkeypatch.setattr(RisingwaveOperator, "get_sibling", get_sibling)
+    operator = RisingwaveOperator.get_operator("pipeline")(
+        host="localhost", dbname="dev", user="root", pool_size=4
+    )
+    start = time.monotonic()
+    assert operator.create(wide) == (True, "")
+    assert time.monotonic() - start < 0.45
+    assert pool_sizes == {20}
+
+
+class SlowOperator(Operator):
+    def __init__(self, log):
+        self._log = log
+
+    def exists(self, name, **kwargs):
+        return name in self._log["created"], ""
+
+    def absent(self, name, **kwargs):
+        return name not in self._log["created"], ""
+
+    def create(self, name, **kwargs):
+        time.sleep(0.1)
+        self._log["order"].append(name)
+        self._log["created"].add(name)
+        return True, ""
+
+    def delete(self, name, **kwargs):
+        self._log["order"].append(name)
+        self._log["created"].discard(name)
+        return True, ""
+
+
+def test_pipeline_parallel(monkeypatch):
+    log = {"order": [], "created": set()}
+    monkeypatch.setattr(
+        RisingwaveOperator,
+        "get_sibling",
+        lambda self, type, pool_size=None: SlowOperator(log),
+    )
+    operator = RisingwaveOperator.get_operator("pipeline")(
+        host="localhost", dbname="dev", user="root"
+    )
+
+    start = time.monotonic()
+    assert operator.create(PIPELINE) == (True, "")
+    # orders と users は並行して作成されるので、合計ではなくクリティカルパス分の時間になる
+    assert time.monotonic() - start < 0.45
+    assert log["order"][0] == "src"
+    assert set(log["order"][1:3]) == {"orders", "users"}
+    assert log["order"][3:] == ["mv_total", "snk"]
+    assert operator.exists(PIPELINE) == (True, "")
+
+    log["order"].clear()
+    assert operator.delete(PIPELINE) == (True, "")
+    assert log["order"][:2] == ["snk", "mv_total"]
+    assert log["order"][-1] == "src"
+    assert operator.absent(PIPELINE) == (True, "")